@@ -0,0 +1,276 @@
+"""Load driver: realistic VoiceData/Vitals traffic at a fixed concurrency, plus the report."""
+import re
+import time
+import random
+import asyncio
+import httpx
+
+# What patients actually say, weighted toward the common "where is" and orientation questions
+UTTERANCES = (
+    "Where are my keys?",
+    "Where did I put my glasses?",
+    "I put my keys in the kitchen drawer",
+    "I left my glasses on the nightstand",
+    "Have you seen my wallet?",
+    "What day is it today?",
+    "Is Sarah coming to visit today?",
+    "My daughter Sarah called this morning",
+    "Did I take my pills?",
+    "I took my pills after breakfast",
+    "Where am I?",
+    "I can't find my phone",
+    "Tom is picking me up at three",
+    "What was I doing just now?",
+    "I'm going to make some tea",
+    "Who is Maria?",
+    "I don't know where I am and I'm scared",
+    "When is lunch?",
+)
+SPOKEN = (
+    "Good morning, it's time for your walk.",
+    "Sarah will be here at four o'clock.",
+    "Remember to drink some water.",
+)
+DEFAULT_MIX = {"listen": 8, "speak": 1, "is_there": 1}
+PATHS = {"listen": "/listen", "speak": "/speak", "is_there": "/is-there"}
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def parse_mix(spec: str) -> dict:
+    """'listen=8,speak=1,is_there=1' -> weights (unknown endpoints rejected)."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip().replace("-", "_")
+        if name not in PATHS:
+            raise ValueError(f"unknown endpoint {name!r} (choose from {', '.join(PATHS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def vitals(rng: random.Random, stress_rate: float) -> dict:
+    stressed = rng.random() < stress_rate
+    return {
+        "heart_rate": rng.randint(95, 130) if stressed else rng.randint(58, 90),
+        "breathing_rate": rng.randint(20, 28) if stressed else rng.randint(12, 18),
+        "movement_score": rng.randint(40, 100) if stressed else rng.randint(0, 40),
+        "stress_detected": stressed,
+    }
+
+
+def request_body(endpoint: str, rng: random.Random, stress_rate: float, vitals_rate: float):
+    if endpoint == "listen":
+        body = {"text": rng.choice(UTTERANCES)}
+        if rng.random() < vitals_rate:
+            body["vitals"] = vitals(rng, stress_rate)
+        return body
+    if endpoint == "speak":
+        return {"text": rng.choice(SPOKEN)}
+    return None
+
+
+class Sample:
+    __slots__ = ("endpoint", "status", "seconds", "first_byte", "bytes", "error")
+
+    def __init__(self, endpoint, status, seconds, first_byte, size, error=None):
+        self.endpoint = endpoint
+        self.status = status
+        self.seconds = seconds
+        self.first_byte = first_byte
+        self.bytes = size
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 300
+
+
+async def send_one(client: httpx.AsyncClient, endpoint: str, body) -> Sample:
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    try:
+        async with client.stream("POST", PATHS[endpoint], json=body) as response:
+            async for chunk in response.aiter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                size += len(chunk)
+        elapsed = time.perf_counter() - start
+        return Sample(endpoint, response.status_code, elapsed, first_byte or elapsed, size)
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        return Sample(endpoint, 0, elapsed, elapsed, size, error=type(e).__name__)
+
+
+async def drive(base_url: str, concurrency: int, duration: float = 30.0, total: int = None, mix: dict = None,
+                stress_rate: float = 0.1, vitals_rate: float = 0.7, seed: int = 1, timeout: float = 60.0):
+    """Closed-loop load: `concurrency` workers send back-to-back requests until
+    `duration` seconds pass (or `total` requests are sent). Returns (samples, elapsed)."""
+    mix = mix or DEFAULT_MIX
+    endpoints, weights = zip(*mix.items())
+    rng = random.Random(seed)
+    samples = []
+    sent = 0
+    deadline = time.perf_counter() + duration
+
+    def next_request():
+        nonlocal sent
+        if (total is not None and sent >= total) or (total is None and time.perf_counter() >= deadline):
+            return None
+        sent += 1
+        endpoint = rng.choices(endpoints, weights)[0]
+        return endpoint, request_body(endpoint, rng, stress_rate, vitals_rate)
+
+    async def worker(client):
+        while True:
+            job = next_request()
+            if job is None:
+                return
+            samples.append(await send_one(client, *job))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return samples, elapsed
+
+
+def percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _quantiles(values: list) -> dict:
+    ordered = sorted(values)
+    return {f"p{int(q * 100)}": round(percentile(ordered, q), 4) for q in QUANTILES}
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    """Per-endpoint and overall counts, error rate, throughput and latency percentiles."""
+    groups = {"all": samples}
+    for sample in samples:
+        groups.setdefault(sample.endpoint, []).append(sample)
+    report = {}
+    for name, group in groups.items():
+        ok = [s for s in group if s.ok]
+        errors = {}
+        for s in group:
+            if not s.ok:
+                key = s.error or str(s.status)
+                errors[key] = errors.get(key, 0) + 1
+        report[name] = {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "error_kinds": errors,
+            "rps": round(len(group) / elapsed, 2) if elapsed else 0.0,
+            "latency": _quantiles([s.seconds for s in ok]),
+            "first_byte": _quantiles([s.first_byte for s in ok]),
+            "mean_bytes": int(sum(s.bytes for s in ok) / len(ok)) if ok else 0,
+        }
+    return report
+
+
+_STAGE_SAMPLE = re.compile(
+    r'^presage_stage_recent_seconds\{stage="(?P<stage>[^"]+)",quantile="(?P<q>[0-9.]+)"\} (?P<value>\S+)$'
+)
+_STAGE_COUNT = re.compile(r'^presage_stage_seconds_count\{stage="(?P<stage>[^"]+)"\} (?P<value>\S+)$')
+
+
+def stage_percentiles(metrics_text: str) -> dict:
+    """{stage: {"count", "p50", "p95", "p99"}} from the server's /metrics output."""
+    stages = {}
+    for line in metrics_text.splitlines():
+        match = _STAGE_SAMPLE.match(line)
+        if match:
+            key = f"p{int(round(float(match['q']) * 100))}"
+            stages.setdefault(match["stage"], {})[key] = round(float(match["value"]), 4)
+            continue
+        match = _STAGE_COUNT.match(line)
+        if match:
+            stages.setdefault(match["stage"], {})["count"] = int(float(match["value"]))
+    return stages
+
+
+def compare(current: dict, baseline: dict, tolerance: float, floor: float = 0.005) -> list:
+    """p95 regressions beyond `tolerance` (0.2 = 20% slower) against a saved run.
+
+    Differences under `floor` seconds are ignored so sub-millisecond stages don't flap.
+    """
+    regressions = []
+    for section in ("endpoints", "stages"):
+        for name, now in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not before:
+                continue
+            now_p95 = now["latency"]["p95"] if section == "endpoints" else now.get("p95")
+            before_p95 = before["latency"]["p95"] if section == "endpoints" else before.get("p95")
+            if now_p95 is None or before_p95 is None:
+                continue
+            if now_p95 - before_p95 > floor and now_p95 > before_p95 * (1 + tolerance):
+                regressions.append(f"{section[:-1]} {name}: p95 {before_p95 * 1000:.1f}ms -> {now_p95 * 1000:.1f}ms")
+        if section == "endpoints":
+            for name, now in current.get(section, {}).items():
+                before = baseline.get(section, {}).get(name)
+                if before and now["requests"] and before["requests"]:
+                    now_rate = now["errors"] / now["requests"]
+                    before_rate = before["errors"] / before["requests"]
+                    if now_rate > before_rate + 0.01:
+                        regressions.append(f"endpoint {name}: error rate {before_rate:.1%} -> {now_rate:.1%}")
+    return regressions
+
+
+def _ms(value) -> str:
+    return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print("=" * 78)
+    print(", ".join(f"{k} {v}" for k, v in config.items() if k != "profile") + f", {report['elapsed']:.1f}s")
+    print("=" * 78)
+    print(f"{'endpoint':<10} {'reqs':>6} {'err':>5} {'rps':>7}   {'p50':>8} {'p95':>8} {'p99':>8}   "
+          f"{'ttfb p50':>8} {'ttfb p95':>8}  (ms)")
+    for name, row in report["endpoints"].items():
+        lat, fb = row["latency"], row["first_byte"]
+        print(f"{name:<10} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7.1f}   "
+              f"{_ms(lat.get('p50'))} {_ms(lat.get('p95'))} {_ms(lat.get('p99'))}   "
+              f"{_ms(fb.get('p50'))} {_ms(fb.get('p95'))}")
+        if row["error_kinds"]:
+            print(f"{'':<10} errors: {row['error_kinds']}")
+    if report.get("stages"):
+        print("-" * 78)
+        print(f"{'stage':<24} {'count':>7}   {'p50':>8} {'p95':>8} {'p99':>8}  (ms, server side)")
+        for name, row in sorted(report["stages"].items()):
+            print(f"{name:<24} {row.get('count', 0):>7}   {_ms(row.get('p50'))} {_ms(row.get('p95'))} "
+                  f"{_ms(row.get('p99'))}")
+
+
+
+def _change(before, after) -> str:
+    """'  812.0 ->   901.3 (+11%)' in ms for one percentile of two reports."""
+    if after is None:
+        return f"{'-':>26}"
+    if before is None:
+        return f"{'new':>8} -> {after * 1000:7.1f}       "
+    pct = f"({(after - before) / before:+.0%})" if before else ""
+    return f"{before * 1000:8.1f} -> {after * 1000:7.1f} {pct:>6}"
+
+
+def print_diff(before: dict, after: dict):
+    """p50/p95/p99 of two reports side by side (e.g. two builds replaying one capture)."""
+    print("-" * 98)
+    print(f"{'':<20} {'p50 (ms)':^26}  {'p95 (ms)':^26}  {'p99 (ms)':^26}")
+    for section in ("endpoints", "stages"):
+        if not before.get(section):
+            continue  # e.g. a capture has no server-side stage timings
+        rows = after.get(section, {})
+        for name in sorted(rows):
+            old = before.get(section, {}).get(name, {})
+            new = rows[name]
+            if section == "endpoints":
+                old, new = old.get("latency", {}), new["latency"]
+            print(f"{name:<20} " + "  ".join(_change(old.get(q), new.get(q)) for q in ("p50", "p95", "p99")))
+        if section == "endpoints":
+            print("-" * 98)
@@ -0,0 +1,148 @@
+"""Replay captured iPhone traffic against the server and diff latency profiles.
+
+    CAPTURE_ENABLED=true python main.py                       # records captures/requests.jsonl
+    python -m bench.replay captures/requests.jsonl* --speed 10 --save before.json
+    python -m bench.replay captures/requests.jsonl* --speed 10 --baseline before.json
+    python -m bench.replay --diff before.json after.json
+
+Requests are sent at their recorded arrival offsets divided by --speed
+(1 = original pace, 0 = as fast as --concurrency allows). Idle stretches
+longer than --max-gap are shortened. The server and stand-in upstreams
+are started as in bench.run unless --url is given. With --compare-capture the
+replay is also diffed against the latencies recorded at capture time.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import httpx
+from bench.load import PATHS, Sample, print_diff, print_report, send_one, summarize
+from bench.run import add_stack_arguments, check_baseline, fetch_stages, save_report, start_stack, stop_stack
+from bench.upstreams import UpstreamProfile
+
+_ENDPOINTS = {path: name for name, path in PATHS.items()}
+
+
+def load_capture(paths: list) -> list:
+    """Captured records for the replayable endpoints, oldest first (rotated files may be mixed in)."""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a live capture
+                if record.get("endpoint") in _ENDPOINTS and record.get("ts") is not None:
+                    records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def schedule(records: list, speed: float, max_gap: float) -> list:
+    """[(offset_seconds, endpoint_name, body)] with gaps capped and time scaled by `speed`."""
+    plan = []
+    offset = 0.0
+    previous = None
+    for record in records:
+        if previous is not None and speed > 0:
+            offset += min(record["ts"] - previous, max_gap) / speed
+        previous = record["ts"]
+        plan.append((offset, _ENDPOINTS[record["endpoint"]], record.get("body")))
+    return plan
+
+
+async def replay(base_url: str, plan: list, concurrency: int, timeout: float = 60.0):
+    """Open-loop replay: each request starts at its offset (or when a slot frees up)."""
+    slots = asyncio.Semaphore(concurrency)
+    samples = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def send(client, endpoint, body):
+        async with slots:
+            samples.append(await send_one(client, endpoint, body))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        tasks = []
+        for offset, endpoint, body in plan:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(client, endpoint, body)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return samples, elapsed
+
+
+def captured_profile(records: list) -> dict:
+    """The latencies the server reported while the traffic was being captured."""
+    samples = [
+        Sample(_ENDPOINTS[r["endpoint"]], r.get("status") or 0, r["latency_ms"] / 1000,
+               (r.get("first_byte_ms") or r["latency_ms"]) / 1000, 0)
+        for r in records if r.get("latency_ms") is not None
+    ]
+    span = records[-1]["ts"] - records[0]["ts"] if len(records) > 1 else 0.0
+    return {"endpoints": summarize(samples, span), "stages": {}}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="*", help="capture files (e.g. captures/requests.jsonl*)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 = no pacing")
+    parser.add_argument("--max-gap", type=float, default=5.0, help="longest pause kept between requests (s)")
+    parser.add_argument("--concurrency", type=int, default=32, help="most requests in flight")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+    parser.add_argument("--save", help="write the report as JSON")
+    parser.add_argument("--baseline", help="diff against a saved report and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown (0.2 = 20%%)")
+    parser.add_argument("--compare-capture", action="store_true",
+                        help="also diff against the latencies recorded in the capture")
+    parser.add_argument("--diff", nargs=2, metavar=("BEFORE", "AFTER"), help="only diff two saved reports")
+    add_stack_arguments(parser)
+    args = parser.parse_args()
+
+    if args.diff:
+        reports = []
+        for path in args.diff:
+            with open(path) as f:
+                reports.append(json.load(f))
+        print_diff(*reports)
+        return 0
+    if not args.captures:
+        parser.error("give capture files to replay (or --diff BEFORE AFTER)")
+
+    records = load_capture(args.captures)[:args.limit]
+    if not records:
+        print("❌ No replayable requests in the capture")
+        return 1
+    plan = schedule(records, args.speed, args.max_gap)
+    print(f"▶️  Replaying {len(plan)} requests over ~{plan[-1][0]:.1f}s (speed {args.speed}, max gap {args.max_gap}s)")
+
+    base_url, processes = start_stack(args)
+    try:
+        samples, elapsed = asyncio.run(replay(base_url, plan, args.concurrency))
+        stages = fetch_stages(base_url)
+    finally:
+        stop_stack(processes)
+
+    report = {
+        "config": {"capture": len(records), "speed": args.speed, "concurrency": args.concurrency, "llm": args.llm,
+                   "profile": {name: getattr(args, name) for name in vars(UpstreamProfile())}},
+        "elapsed": round(elapsed, 3),
+        "endpoints": summarize(samples, elapsed),
+        "stages": stages,
+    }
+    print_report(report)
+    if args.compare_capture:
+        print("Captured (before) vs replayed (after):")
+        print_diff(captured_profile(records), report)
+    save_report(report, args.save)
+    if args.baseline:
+        return check_baseline(report, args.baseline, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""End-to-end benchmark: stand-in upstreams + the real server + a load driver.
+
+    pip install -r bench/requirements.txt
+    python -m bench.run --concurrency 16 --duration 30 --save bench/baseline.json
+    python -m bench.run --concurrency 16 --duration 30 --baseline bench/baseline.json
+
+Starts bench.upstreams and bench.serve as subprocesses (no real ElevenLabs,
+Ollama, Cohere or MongoDB is touched), drives /listen, /speak and /is-there,
+then prints end-to-end percentiles per endpoint and per-stage percentiles
+scraped from /metrics. With --baseline it exits 1 when a p95 or the error
+rate regressed. Feature flags (SENTENCE_PIPELINING, TTS_CACHE_ENABLED, ...)
+are read from the environment as usual, so runs can compare configurations.
+Pass --url to drive an already running server instead.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import httpx
+from bench.load import (
+    DEFAULT_MIX, compare, drive, parse_mix, print_diff, print_report, stage_percentiles, summarize,
+)
+from bench.upstreams import UpstreamProfile, add_profile_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def _start(args: list, env: dict, ready_url: str) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m"] + args, cwd=ROOT, env=env)
+    try:
+        _wait_ready(ready_url, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process
+
+
+def _server_env(args, upstream_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "ELEVENLABS_BASE_URL": upstream_url,
+        "ELEVENLABS_API_KEY": "bench",
+        "OLLAMA_BASE_URL": upstream_url,
+        "COHERE_BASE_URL": upstream_url,
+        "USE_COHERE": "true" if args.llm == "cohere" else "false",
+        "BENCH_MONGO": args.mongo,
+        # Keep every sample so the stage percentiles cover the whole run
+        "METRICS_WINDOW": env.get("METRICS_WINDOW", "1000000"),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "warning"),
+    })
+    if args.llm == "cohere":
+        env["COHERE_API_KEY"] = "bench"
+    if args.mongo == "memory":
+        # Never let a .env MONGO_URI point the benchmark at a real database
+        env["MONGO_URI"] = "mongodb://bench-in-memory:27017"
+    return env
+
+
+def _profile_args(args) -> list:
+    out = []
+    for name in vars(UpstreamProfile()):
+        out += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    return out
+
+
+def add_stack_arguments(parser: argparse.ArgumentParser):
+    """Options for the server + stand-in upstreams started by `start_stack`."""
+    parser.add_argument("--llm", choices=("ollama", "cohere"), default="ollama")
+    parser.add_argument("--mongo", choices=("memory", "uri"), default="memory",
+                        help="memory: mongomock in the server process; uri: use MONGO_URI")
+    parser.add_argument("--url", help="benchmark a server that is already running instead")
+    parser.add_argument("--server-port", type=int, default=8100)
+    parser.add_argument("--upstream-port", type=int, default=9100)
+    add_profile_arguments(parser)
+
+
+def start_stack(args):
+    """(base_url, processes) - starts stand-ins and the server unless --url was given."""
+    if args.url:
+        return args.url, []
+    processes = []
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    processes.append(_start(
+        ["bench.upstreams", "--port", str(args.upstream_port)] + _profile_args(args),
+        dict(os.environ), f"{upstream_url}/stats",
+    ))
+    base_url = f"http://127.0.0.1:{args.server_port}"
+    try:
+        processes.append(_start(
+            ["bench.serve", "--port", str(args.server_port)], _server_env(args, upstream_url), f"{base_url}/",
+        ))
+    except Exception:
+        stop_stack(processes)
+        raise
+    return base_url, processes
+
+
+def stop_stack(processes: list):
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def fetch_stages(base_url: str) -> dict:
+    try:
+        return stage_percentiles(httpx.get(f"{base_url}/metrics", timeout=10.0).text)
+    except httpx.HTTPError as e:
+        print(f"⚠️  Could not read /metrics: {e}")
+        return {}
+
+
+def check_baseline(report: dict, baseline_path: str, tolerance: float) -> int:
+    """Print the profile diff against a saved report; 1 if anything regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print_diff(baseline, report)
+    regressions = compare(report, baseline, tolerance)
+    if regressions:
+        print("❌ Regressions against baseline:")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print("✅ No regressions against baseline")
+    return 0
+
+
+def save_report(report: dict, path: str):
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {path}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--stress-rate", type=float, default=0.1, help="share of vitals with stress_detected")
+    parser.add_argument("--vitals-rate", type=float, default=0.7, help="share of /listen calls sending vitals")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the report as JSON")
+    parser.add_argument("--baseline", help="compare against a saved report and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown (0.2 = 20%%)")
+    add_stack_arguments(parser)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    base_url, processes = start_stack(args)
+    try:
+        samples, elapsed = asyncio.run(drive(
+            base_url, args.concurrency, duration=args.duration, total=args.requests, mix=mix,
+            stress_rate=args.stress_rate, vitals_rate=args.vitals_rate, seed=args.seed,
+        ))
+        stages = fetch_stages(base_url)
+    finally:
+        stop_stack(processes)
+
+    report = {
+        "config": {"concurrency": args.concurrency, "mix": mix, "llm": args.llm,
+                   "profile": {name: getattr(args, name) for name in vars(UpstreamProfile())}},
+        "elapsed": round(elapsed, 3),
+        "endpoints": summarize(samples, elapsed),
+        "stages": stages,
+    }
+    print_report(report)
+    save_report(report, args.save)
+    if args.baseline:
+        return check_baseline(report, args.baseline, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
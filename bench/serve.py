@@ -0,0 +1,32 @@
+"""Run the API server for benchmarking, optionally on an in-memory MongoDB.
+
+    BENCH_MONGO=memory python -m bench.serve --port 8100
+
+With BENCH_MONGO=memory, pymongo's client is swapped for mongomock before
+db.py is imported (pip install -r bench/requirements.txt). Any other value
+uses MONGO_URI as usual, e.g. a throwaway local mongod.
+"""
+import os
+import sys
+import argparse
+import uvicorn
+
+BENCH_MONGO = os.getenv("BENCH_MONGO", "memory").lower()
+
+
+def load_app():
+    if BENCH_MONGO == "memory":
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from main import app
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(load_app(), host=args.host, port=args.port, log_level="warning", access_log=False)
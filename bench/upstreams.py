@@ -0,0 +1,215 @@
+"""Local stand-ins for ElevenLabs, Ollama and Cohere with configurable latency.
+
+One app serves all three APIs (their paths don't overlap), so the server under
+test only needs ELEVENLABS_BASE_URL, OLLAMA_BASE_URL and COHERE_BASE_URL
+pointed at it. Run directly or let bench/run.py start it:
+
+    python -m bench.upstreams --port 9100 --llm-latency 0.4 --tts-latency 0.25
+"""
+import os
+import re
+import json
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+class UpstreamProfile:
+    """Latency and payload knobs. Times are seconds; jitter is a +/- fraction."""
+
+    def __init__(self, llm_latency: float = 0.4, llm_token_delay: float = 0.02, llm_jitter: float = 0.2,
+                 tts_latency: float = 0.25, tts_bytes_per_char: int = 1000, tts_chunk_bytes: int = 4096,
+                 tts_chunk_delay: float = 0.02, tts_jitter: float = 0.2, embed_dim: int = 768,
+                 error_rate: float = 0.0):
+        self.llm_latency = llm_latency
+        self.llm_token_delay = llm_token_delay
+        self.llm_jitter = llm_jitter
+        self.tts_latency = tts_latency
+        self.tts_bytes_per_char = tts_bytes_per_char
+        self.tts_chunk_bytes = tts_chunk_bytes
+        self.tts_chunk_delay = tts_chunk_delay
+        self.tts_jitter = tts_jitter
+        self.embed_dim = embed_dim
+        self.error_rate = error_rate
+
+    def jittered(self, seconds: float, jitter: float) -> float:
+        return max(0.0, seconds * (1 + random.uniform(-jitter, jitter)))
+
+
+_ITEMS = ("keys", "glasses", "wallet", "phone", "pills", "remote", "purse", "hat", "book")
+_PLACES = ("kitchen", "drawer", "nightstand", "table", "bedroom", "coat pocket", "bathroom", "car")
+_PEOPLE = ("Sarah", "Tom", "Maria", "David", "Anna")
+_REPLIES = (
+    "Your keys are in the kitchen drawer. You put them there this morning.",
+    "Sarah is coming to visit this afternoon. She called yesterday.",
+    "It's Tuesday today. You had lunch a little while ago.",
+    "You're at home and you're safe. Let's take a slow breath together.",
+    "You took your pills after breakfast. The next dose is this evening.",
+)
+
+
+def _extraction(prompt: str) -> dict:
+    """Plausible extraction fields for the message at the end of the prompt."""
+    said = re.findall(r'(?:Message:|said:)\s*"?([^"\n]*)', prompt)
+    message = (said[-1] if said else prompt).lower()
+    info = {"intent": "help" if "?" in message or "where" in message else "note"}
+    items = [i for i in _ITEMS if i.rstrip("s") in message]
+    places = [p for p in _PLACES if p in message]
+    people = [p for p in _PEOPLE if p.lower() in message]
+    if items:
+        info["items"] = items
+    if places:
+        info["location"] = places[0]
+    if people:
+        info["people"] = people
+    if '"extracted"' in prompt and '"reply"' in prompt:
+        # Combined extract-and-reply prompt
+        return {"extracted": info, "reply": random.choice(_REPLIES)}
+    return info
+
+
+def _wants_json(prompt: str, body: dict) -> bool:
+    return bool(body.get("format") or body.get("response_format")) or bool(re.search(r"\bJSON\b", prompt))
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"\S+\s*", text)
+
+
+def create_app(profile: UpstreamProfile) -> FastAPI:
+    app = FastAPI()
+    stats = {"tts": 0, "tts_bytes": 0, "ollama": 0, "cohere": 0, "embed": 0, "errors": 0}
+
+    def failing() -> bool:
+        if profile.error_rate and random.random() < profile.error_rate:
+            stats["errors"] += 1
+            return True
+        return False
+
+    def llm_text(prompt: str, body: dict) -> str:
+        if _wants_json(prompt, body):
+            return json.dumps(_extraction(prompt))
+        return random.choice(_REPLIES)
+
+    async def think(text: str):
+        # Prompt evaluation plus generation time for the whole answer
+        delay = profile.llm_latency + profile.llm_token_delay * len(_tokens(text))
+        await asyncio.sleep(profile.jittered(delay, profile.llm_jitter))
+
+    @app.get("/stats")
+    def upstream_stats():
+        return stats
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def tts(voice_id: str, request: Request):
+        body = await request.json()
+        stats["tts"] += 1
+        await asyncio.sleep(profile.jittered(profile.tts_latency, profile.tts_jitter))
+        if failing():
+            return JSONResponse({"detail": {"status": "stand_in_error"}}, status_code=503)
+        audio = os.urandom(max(1024, len(body.get("text", "")) * profile.tts_bytes_per_char))
+        stats["tts_bytes"] += len(audio)
+        return Response(content=audio, media_type="audio/mpeg")
+
+    @app.post("/v1/text-to-speech/{voice_id}/stream")
+    async def tts_stream(voice_id: str, request: Request):
+        body = await request.json()
+        stats["tts"] += 1
+        await asyncio.sleep(profile.jittered(profile.tts_latency, profile.tts_jitter))
+        if failing():
+            return JSONResponse({"detail": {"status": "stand_in_error"}}, status_code=503)
+        size = max(1024, len(body.get("text", "")) * profile.tts_bytes_per_char)
+        stats["tts_bytes"] += size
+
+        async def chunks():
+            sent = 0
+            while sent < size:
+                n = min(profile.tts_chunk_bytes, size - sent)
+                yield os.urandom(n)
+                sent += n
+                await asyncio.sleep(profile.tts_chunk_delay)
+
+        return StreamingResponse(chunks(), media_type="audio/mpeg")
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request):
+        body = await request.json()
+        stats["ollama"] += 1
+        prompt = body.get("prompt", "")
+        if not prompt:
+            # Model load / warm-up request
+            return {"model": body.get("model"), "response": "", "done": True}
+        if failing():
+            return JSONResponse({"error": "stand-in error"}, status_code=500)
+        text = llm_text(prompt, body)
+        context = [random.randint(1, 32000) for _ in range(8)]
+        if not body.get("stream"):
+            await think(text)
+            return {"model": body.get("model"), "response": text, "done": True, "context": context}
+
+        async def lines():
+            await asyncio.sleep(profile.jittered(profile.llm_latency, profile.llm_jitter))
+            for token in _tokens(text):
+                yield json.dumps({"response": token, "done": False}) + "\n"
+                await asyncio.sleep(profile.llm_token_delay)
+            yield json.dumps({"response": "", "done": True, "context": context}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def ollama_embed(request: Request):
+        body = await request.json()
+        stats["embed"] += 1
+        texts = body.get("input") or []
+        texts = [texts] if isinstance(texts, str) else texts
+        await asyncio.sleep(profile.jittered(profile.llm_latency / 10, profile.llm_jitter))
+        return {"embeddings": [[random.gauss(0, 1) for _ in range(profile.embed_dim)] for _ in texts]}
+
+    @app.post("/v1/chat")
+    async def cohere_chat(request: Request):
+        body = await request.json()
+        stats["cohere"] += 1
+        if failing():
+            return JSONResponse({"message": "stand-in error"}, status_code=500)
+        prompt = body.get("message", "")
+        text = llm_text(prompt, body)
+        if not body.get("stream"):
+            await think(text)
+            return {"text": text, "generation_id": "bench", "finish_reason": "COMPLETE"}
+
+        async def events():
+            await asyncio.sleep(profile.jittered(profile.llm_latency, profile.llm_jitter))
+            yield json.dumps({"event_type": "stream-start", "generation_id": "bench", "is_finished": False}) + "\n"
+            for token in _tokens(text):
+                yield json.dumps({"event_type": "text-generation", "text": token, "is_finished": False}) + "\n"
+                await asyncio.sleep(profile.llm_token_delay)
+            yield json.dumps({
+                "event_type": "stream-end", "finish_reason": "COMPLETE", "is_finished": True,
+                "response": {"text": text, "generation_id": "bench"},
+            }) + "\n"
+
+        return StreamingResponse(events(), media_type="application/stream+json")
+
+    return app
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    defaults = UpstreamProfile()
+    for name, value in vars(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+
+
+def profile_from_args(args) -> UpstreamProfile:
+    return UpstreamProfile(**{name: getattr(args, name) for name in vars(UpstreamProfile())})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(profile_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from logger import log, request_id
+
+load_dotenv()
+
+# Opt-in recording of what the iPhone app sends, for replay with bench/replay.py.
+# Each request to a captured endpoint becomes one JSON line: arrival time,
+# endpoint, body (text + vitals), status and latency. The file rotates like a
+# log (requests.jsonl -> requests.jsonl.1 ...). Bodies are patient speech:
+# keep captures off shared machines.
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "captures/requests.jsonl")
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(10 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.getenv("CAPTURE_BACKUPS", "5"))
+CAPTURE_ENDPOINTS = [p.strip() for p in os.getenv("CAPTURE_ENDPOINTS", "/listen,/speak,/is-there").split(",") if p.strip()]
+
+
+class TrafficCapture:
+    """Appends request records to a size-rotated JSONL file from one background thread."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int, endpoints: list):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.endpoints = set(endpoints)
+        self._file = None
+        self._size = 0
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.rotations = 0
+        self.failures = 0
+
+    def record(self, endpoint: str, method: str, body: bytes, arrived: float, status, latency: float,
+               first_byte: float, rid: str):
+        """Queue one request for writing (never blocks the request on disk I/O)."""
+        try:
+            parsed = json.loads(body) if body else None
+        except ValueError:
+            parsed = body.decode("utf-8", "replace")[:2000]
+        line = json.dumps({
+            "ts": round(arrived, 3),
+            "endpoint": endpoint,
+            "method": method,
+            "body": parsed,
+            "status": status,
+            "latency_ms": round(latency * 1000, 1),
+            "first_byte_ms": round(first_byte * 1000, 1) if first_byte is not None else None,
+            "rid": rid,
+        }, ensure_ascii=False) + "\n"
+        self._writer.submit(self._write, line.encode("utf-8"))
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def _write(self, data: bytes):
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                if self._size and self._size + len(data) > self.max_bytes:
+                    self._rotate()
+                    self._open()
+                self._file.write(data)
+                self._file.flush()
+                self._size += len(data)
+                self.captured += 1
+            except Exception as e:
+                self.failures += 1
+                log.warning("capture", f"⚠️  Could not write traffic capture: {e}")
+
+    def close(self):
+        """Finish queued writes and close the file (call at shutdown)."""
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        return {"captured": self.captured, "rotations": self.rotations, "failures": self.failures}
+
+
+class CaptureMiddleware:
+    """ASGI middleware that tees request bodies of captured endpoints into a TrafficCapture.
+
+    The body is copied as the app reads it, so nothing is buffered or re-sent.
+    """
+
+    def __init__(self, app, capture: TrafficCapture):
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.capture.endpoints:
+            await self.app(scope, receive, send)
+            return
+        arrived = time.time()
+        start = time.perf_counter()
+        chunks = []
+        status = None
+        first_byte = None
+
+        async def capturing_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def capturing_send(message):
+            nonlocal status, first_byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and first_byte is None:
+                first_byte = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, capturing_receive, capturing_send)
+        finally:
+            self.capture.record(scope["path"], scope["method"], b"".join(chunks), arrived, status,
+                                time.perf_counter() - start, first_byte, request_id.get())
+
+
+traffic_capture = None
+if CAPTURE_ENABLED:
+    traffic_capture = TrafficCapture(CAPTURE_PATH, CAPTURE_MAX_BYTES, CAPTURE_BACKUPS, CAPTURE_ENDPOINTS)
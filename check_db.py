@@ -43,7 +43,7 @@ try:
         print(f"\n📝 Recent events for user '{DEFAULT_USER}':")
         print("-" * 60)
         
-        recent_events = get_context_for_user(DEFAULT_USER, limit=10)
+        recent_events = get_context_for_user(DEFAULT_USER, limit=10, fields=None)
         if recent_events:
             for i, event in enumerate(recent_events, 1):
                 print(f"\n{i}. Event at {event.get('ts')}")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Ensure the events indexes exist and verify the hot queries use them"""
+import os
+from dotenv import load_dotenv
+from db import ensure_indexes, index_report, events
+
+try:
+    load_dotenv()
+except Exception:
+    pass
+
+DEFAULT_USER = os.getenv("PRESAGE_USER", "alice")
+
+print("=" * 60)
+print("Ensuring indexes on presage_db.events...")
+print("=" * 60)
+
+ensure_indexes()
+
+print(f"\n📇 Indexes on events:")
+for name, spec in events.index_information().items():
+    print(f"   - {name}: {spec.get('key')}")
+
+print(f"\n🔍 Query plans (user: {DEFAULT_USER}):")
+print("-" * 60)
+
+all_good = True
+for row in index_report(DEFAULT_USER):
+    ok = bool(row["indexes"]) and not row["collscan"] and not row["in_memory_sort"]
+    all_good = all_good and ok
+    print(f"\n{'✅' if ok else '❌'} {row['query']}")
+    print(f"   Index used: {', '.join(row['indexes']) or 'NONE (collection scan)'}")
+    if row["in_memory_sort"]:
+        print(f"   ⚠️  Sort is done in memory")
+    print(f"   Keys examined: {row['keys_examined']}  Docs examined: {row['docs_examined']}  Returned: {row['returned']}")
+
+print()
+print("✅ All hot queries are index-backed" if all_good else "⚠️  Some hot queries are not index-backed")
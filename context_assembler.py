@@ -0,0 +1,149 @@
+import os
+import asyncio
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from logger import log
+
+load_dotenv()
+
+# Prompts are built from a rolling per-user summary plus as many recent turns
+# as fit a token budget, so their size stays flat however long the history gets.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "250"))   # recent history lines
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "120"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "80"))     # retrieved older memories
+# Rolling summaries cost one extra LLM call every SUMMARY_REFRESH_EVERY events
+ROLLING_SUMMARY = os.getenv("ROLLING_SUMMARY", "false").lower() == "true"
+SUMMARY_REFRESH_EVERY = int(os.getenv("SUMMARY_REFRESH_EVERY", "10"))
+# Most events folded into the summary per refresh (bounds the refresh prompt too)
+SUMMARY_MAX_EVENTS = int(os.getenv("SUMMARY_MAX_EVENTS", "40"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) - good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def clip_to_budget(text: str, budget: int) -> str:
+    """`text` cut at a word boundary to fit `budget` tokens."""
+    if not text or estimate_tokens(text) <= budget:
+        return text or ""
+    clipped = text[:budget * 4].rsplit(" ", 1)[0]
+    return clipped.rstrip(",;: ") + "…"
+
+
+def fit_lines(lines: list, budget: int) -> list:
+    """Leading `lines` (most important first) that fit in `budget` tokens.
+
+    The first line is always kept, clipped if it alone is over budget.
+    """
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1  # + newline
+        if used + cost > budget:
+            if not kept:
+                kept.append(clip_to_budget(line, budget))
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def time_ago(timestamp) -> str:
+    """'just now', 'N minutes ago', 'N hours ago' or 'N days ago' for a naive UTC time."""
+    time_diff = datetime.utcnow() - timestamp
+    if time_diff.days > 0:
+        return f"{time_diff.days} day{'s' if time_diff.days != 1 else ''} ago"
+    if time_diff.seconds < 60:
+        return "just now"
+    if time_diff.seconds < 3600:
+        mins = time_diff.seconds // 60
+        return f"{mins} minute{'s' if mins != 1 else ''} ago"
+    hours = time_diff.seconds // 3600
+    return f"{hours} hour{'s' if hours != 1 else ''} ago"
+
+
+class RollingSummaries:
+    """In-memory view of the `summaries` collection plus the refresh schedule."""
+
+    def __init__(self, refresh_every: int, max_events: int):
+        self.refresh_every = refresh_every
+        self.max_events = max_events
+        self._summaries = {}   # user -> {"summary", "through_ts"}
+        self._since = {}       # user -> events saved since the last refresh
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.failures = 0
+
+    def load(self, user: str):
+        """Read the stored summary for `user` (blocking; call once at startup)."""
+        from db import get_summary
+        try:
+            doc = get_summary(user)
+        except Exception as e:
+            log.warning("summary", f"⚠️  Could not load rolling summary for {user}: {e}")
+            return
+        if doc:
+            with self._lock:
+                self._summaries.setdefault(user, {"summary": doc["summary"], "through_ts": doc.get("through_ts")})
+            log.info("summary", f"📝 Rolling summary loaded for {user}")
+
+    def get(self, user: str) -> str:
+        with self._lock:
+            entry = self._summaries.get(user)
+        return entry["summary"] if entry else ""
+
+    def note_event(self, user: str) -> bool:
+        """Count a saved event; True when a refresh is due (and not already running)."""
+        with self._lock:
+            self._since[user] = self._since.get(user, 0) + 1
+            return self._since[user] >= self.refresh_every and user not in self._refreshing
+
+    async def refresh(self, user: str, summarize):
+        """Fold events newer than the summary into it, oldest first, `max_events` per LLM call.
+
+        `summarize(previous, events)` is an async LLM call returning the new
+        summary text, or None if generation failed. The watermark is saved
+        after every page, so a failure only repeats the page that failed.
+        """
+        from db import events_after, save_summary
+        with self._lock:
+            if user in self._refreshing:
+                return
+            self._refreshing.add(user)
+            entry = self._summaries.get(user) or {"summary": "", "through_ts": None}
+            self._since[user] = 0
+        try:
+            while True:
+                new_events = await asyncio.to_thread(events_after, user, entry["through_ts"], self.max_events)
+                if not new_events:
+                    return
+                summary = await summarize(entry["summary"], new_events)
+                if not summary:
+                    self.failures += 1
+                    return
+                entry = {"summary": summary, "through_ts": new_events[-1]["ts"]}
+                await asyncio.to_thread(save_summary, user, summary, entry["through_ts"])
+                with self._lock:
+                    self._summaries[user] = entry
+                self.refreshes += 1
+                log.info("summary", f"📝 Rolling summary for {user} updated with {len(new_events)} event(s)")
+                if len(new_events) < self.max_events:
+                    return
+        except Exception as e:
+            self.failures += 1
+            log.warning("summary", f"⚠️  Rolling summary refresh failed for {user}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(user)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._summaries), "refreshes": self.refreshes, "failures": self.failures}
+
+
+rolling_summaries = None
+if ROLLING_SUMMARY:
+    rolling_summaries = RollingSummaries(SUMMARY_REFRESH_EVERY, SUMMARY_MAX_EVENTS)
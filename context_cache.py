@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+
+
+class RecentContextCache:
+    """Per-user ring buffer of the most recent events, newest last.
+
+    A user's buffer is only served once it has been filled from MongoDB
+    ("warm"); after that, writes from this process are appended in place so
+    reads never need a round trip. Writes made elsewhere (the dashboard's
+    edit/delete routes) must call `invalidate`.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._buffers = {}  # user -> deque of {"info", "ts"}
+        # Bumped on every change so a slow cold load can't overwrite newer state
+        self._generations = {}
+        self._epoch = 0  # bumped by invalidate-all
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, user: str) -> tuple:
+        with self._lock:
+            return (self._epoch, self._generations.get(user, 0))
+
+    def get(self, user: str, limit: int):
+        """Newest-first list of up to `limit` events, or None if the user is cold."""
+        with self._lock:
+            buffer = self._buffers.get(user)
+            if buffer is None or limit > self.size:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(reversed(buffer))[:limit]
+
+    def fill(self, user: str, events_newest_first: list, generation: tuple):
+        """Warm `user` from a MongoDB read started at `generation`."""
+        with self._lock:
+            if (self._epoch, self._generations.get(user, 0)) != generation:
+                return  # something changed while we were reading - stay cold
+            self._buffers[user] = deque(reversed(events_newest_first[:self.size]), maxlen=self.size)
+
+    def append(self, user: str, event: dict):
+        """Record an event this process just wrote."""
+        with self._lock:
+            self._generations[user] = self._generations.get(user, 0) + 1
+            buffer = self._buffers.get(user)
+            if buffer is not None:
+                buffer.append(event)
+
+    def invalidate(self, user: str = None):
+        """Drop one user's buffer, or every buffer when `user` is None."""
+        with self._lock:
+            if user is None:
+                self._buffers.clear()
+                self._epoch += 1
+                return
+            self._buffers.pop(user, None)
+            self._generations[user] = self._generations.get(user, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "users": len(self._buffers)}
@@ -1,7 +1,31 @@
 import os
 from datetime import datetime
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING
 from dotenv import load_dotenv
+from bson import ObjectId
+from context_cache import RecentContextCache
+from memory_index import memory_index
+from item_index import item_index
+from metrics import timed
+from logger import log
+from event_writer import (
+    EventWriter,
+    EVENT_WRITE_BEHIND,
+    EVENT_BATCH_SIZE,
+    EVENT_FLUSH_INTERVAL,
+    EVENT_QUEUE_MAX,
+    EVENT_SPILL_PATH,
+    write_concern,
+)
+from event_journal import (
+    EventJournal,
+    JournalReplayer,
+    EVENT_JOURNAL,
+    EVENT_JOURNAL_PATH,
+    EVENT_JOURNAL_SYNC,
+    EVENT_JOURNAL_BATCH,
+    EVENT_JOURNAL_REPLAY_INTERVAL,
+)
 
 load_dotenv()  # Load environment variables from .env file
 
@@ -11,15 +35,108 @@ client = MongoClient(MONGO_URI, tlsAllowInvalidCertificates=True)
 db = client.get_database("presage_db")
 events = db.get_collection("events")
 
+# Indexes behind every query the app and scripts run against `events`.
+# (user, ts desc) serves get_context_for_user and the dashboard's timeline.
+EVENT_INDEXES = [
+    IndexModel([("user", ASCENDING), ("ts", DESCENDING)], name="user_ts"),
+    IndexModel([("info.stress_detected", ASCENDING), ("ts", DESCENDING)], name="stress_detected_ts"),
+    IndexModel([("info.original_message", ASCENDING)], name="original_message"),
+    # Only turns saved raw under deadline pressure carry the flag
+    IndexModel([("info.needs_enrichment", ASCENDING)], name="needs_enrichment", sparse=True),
+]
+
+# name -> (filter, sort) for the hot queries index_report checks
+HOT_QUERIES = {
+    "context_for_user": (lambda user: {"user": user}, [("ts", DESCENDING)]),
+    "stress_events": (lambda user: {"info.stress_detected": True}, [("ts", DESCENDING)]),
+    "missing_original_message": (lambda user: {"info.original_message": {"$exists": False}}, None),
+    "needs_enrichment": (lambda user: {"info.needs_enrichment": True}, None),
+}
+
+# Attempts before a raw-saved event is left as it is
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "3"))
+
+
+def ensure_indexes() -> list:
+    """Create any missing EVENT_INDEXES (no-op for existing ones). Safe to call at every startup."""
+    try:
+        names = events.create_indexes(EVENT_INDEXES)
+        log.info("db", f"✅ MongoDB indexes ensured: {names}")
+        return names
+    except Exception as e:
+        log.warning("db", f"⚠️  Could not ensure MongoDB indexes: {e}")
+        return []
+
+
+def _plan_stages(plan: dict) -> list:
+    """Flatten an explain() plan tree into [(stage, indexName)]."""
+    stages = [(plan.get("stage"), plan.get("indexName"))]
+    children = plan.get("inputStages") or ([plan["inputStage"]] if "inputStage" in plan else [])
+    for child in children:
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def index_report(user: str) -> list:
+    """Explain each HOT_QUERIES entry and report whether it is index-backed."""
+    report = []
+    for name, (make_filter, sort) in HOT_QUERIES.items():
+        cursor = events.find(make_filter(user)).limit(5)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.explain()
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        # Newer servers nest the classic plan under queryPlan
+        stages = _plan_stages(winning.get("queryPlan", winning))
+        stats = explain.get("executionStats", {})
+        report.append({
+            "query": name,
+            "indexes": [index for stage, index in stages if stage == "IXSCAN"],
+            "collscan": any(stage == "COLLSCAN" for stage, _ in stages),
+            "in_memory_sort": any(stage == "SORT" for stage, _ in stages),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "returned": stats.get("nReturned"),
+        })
+    return report
+
+def _remember_saved(user: str, doc: dict):
+    """Keep the in-process views of the events collection in step with a save."""
+    recent_context.append(user, _context_entry(doc))
+    if memory_index is not None:
+        memory_index.add(doc)
+    if item_index is not None:
+        item_index.add(doc)
+
+
+@timed("db.save_event")
 def save_event(user: str, info: dict) -> None:
-    """Save an event to the database. Raises exception if write fails."""
+    """Save an event to the database. Raises exception if write fails.
+
+    In journal mode the event is committed to the local journal and replayed
+    into MongoDB in the background. In write-behind mode it is queued instead.
+    Either way the pre-assigned _id is returned at once; a direct insert is
+    only used if the journal write fails or the queue is full.
+    """
     try:
-        doc = {"user": user, "info": info, "ts": datetime.utcnow()}
+        doc = {"_id": ObjectId(), "user": user, "info": info, "ts": datetime.utcnow()}
+        if event_journal is not None:
+            try:
+                event_journal.append(doc)
+                journal_replayer.notify()
+                _remember_saved(user, doc)
+                return doc["_id"]
+            except Exception as e:
+                log.warning("db", f"⚠️  Journal write failed, writing to MongoDB directly: {e}")
+        elif event_writer is not None and event_writer.submit(doc):
+            _remember_saved(user, doc)
+            return doc["_id"]
         result = events.insert_one(doc)
-        print(f"✅ Database write successful - ID: {result.inserted_id}")
+        log.debug("db", f"✅ Database write successful - ID: {result.inserted_id}")
+        _remember_saved(user, doc)
         return result.inserted_id
     except Exception as e:
-        print(f"❌ Database write failed: {e}")
+        log.error("db", f"❌ Database write failed: {e}")
         raise  # Re-raise so caller knows it failed
 
 # def get_context_for_user(user: str, limit: int = 20) -> list:
@@ -56,18 +173,183 @@ def save_event(user: str, info: dict) -> None:
 #     db = client.get_database("presage_db")
 #     events = db.get_collection("events")
 
-def get_context_for_user(user: str, limit: int = 2000) -> list:
+# History fields generate_assistance actually reads; projecting to these keeps
+# each context read to a few hundred bytes regardless of what extraction stored.
+CONTEXT_FIELDS = ("info.raw", "info.notes", "info.original_message", "info.stress_detected", "ts")
+CONTEXT_WINDOW = 5
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "20"))
+
+# Per-user ring buffer of recent events, kept coherent by save_event
+recent_context = RecentContextCache(max(CONTEXT_CACHE_SIZE, CONTEXT_WINDOW))
+
+# Local journal takes precedence over the in-memory write-behind queue
+event_journal = None
+journal_replayer = None
+event_writer = None
+if EVENT_JOURNAL:
+    event_journal = EventJournal(EVENT_JOURNAL_PATH, EVENT_JOURNAL_SYNC)
+    journal_replayer = JournalReplayer(
+        event_journal,
+        events.with_options(write_concern=write_concern()),
+        batch_size=EVENT_JOURNAL_BATCH,
+        interval=EVENT_JOURNAL_REPLAY_INTERVAL,
+    )
+elif EVENT_WRITE_BEHIND:
+    event_writer = EventWriter(
+        events.with_options(write_concern=write_concern()),
+        batch_size=EVENT_BATCH_SIZE,
+        flush_interval=EVENT_FLUSH_INTERVAL,
+        max_queue=EVENT_QUEUE_MAX,
+        spill_path=EVENT_SPILL_PATH,
+    )
+
+
+def _context_entry(doc: dict) -> dict:
+    """Shape a stored event like a CONTEXT_FIELDS-projected read."""
+    info = doc.get("info") or {}
+    keys = [field.split(".", 1)[1] for field in CONTEXT_FIELDS if field.startswith("info.")]
+    return {"info": {k: info[k] for k in keys if k in info}, "ts": doc.get("ts")}
+
+
+def _projection(fields, with_id: bool = False):
+    if fields is None:
+        return None  # whole documents
+    projection = {field: 1 for field in fields}
+    if not with_id:
+        projection["_id"] = 0
+    return projection
+
+
+def _find_recent(user: str, limit: int, fields, with_id: bool = False):
+    return (
+        events.find({"user": user}, _projection(fields, with_id))
+        .sort("ts", -1)
+        .limit(limit)
+        .batch_size(max(limit, 1))
+    )
+
+
+def iter_context_for_user(user: str, limit: int = CONTEXT_WINDOW, fields=CONTEXT_FIELDS):
+    """
+    Lazily yield the most recent `limit` events for `user`, newest first.
+    `fields` is a projection (dotted paths); pass None for whole `info` documents.
+    """
+    for d in _find_recent(user, limit, fields):
+        yield {
+            "info": d.get("info", {}),
+            "ts": d.get("ts"),
+        }
+
+
+@timed("db.get_context")
+def get_context_for_user(user: str, limit: int = CONTEXT_WINDOW, fields=CONTEXT_FIELDS) -> list:
     """
     Return the most recent `limit` events for `user`, newest first.
-    Assumes `events` is a valid pymongo Collection created elsewhere.
+    Default-projection reads are served from the in-process recent_context
+    buffer once it is warm; the first read for a user loads it from MongoDB.
     """
-    cursor = events.find({"user": user}).sort("ts", -1).limit(limit)
+    if fields != CONTEXT_FIELDS or limit > recent_context.size:
+        return list(iter_context_for_user(user, limit=limit, fields=fields))
+
+    cached = recent_context.get(user, limit)
+    if cached is not None:
+        return cached
+
+    generation = recent_context.generation(user)
+    # Snapshot pending events before reading MongoDB: a batch flushed in
+    # between then shows up in the read instead of falling through the gap.
+    pending = _pending_events(user)
+    docs = list(_find_recent(user, recent_context.size, fields, with_id=True))
+    if pending:
+        seen = {d["_id"] for d in docs}
+        docs += [d for d in pending if d["_id"] not in seen]
+        docs.sort(key=lambda d: (d["ts"], d["_id"]), reverse=True)
+    loaded = [_context_entry(d) for d in docs[:recent_context.size]]
+    recent_context.fill(user, loaded, generation)
+    return loaded[:limit]
+
+
+def _pending_events(user: str) -> list:
+    """Events saved by this process that may not be in MongoDB yet."""
+    if event_journal is not None:
+        return event_journal.pending(user)
+    if event_writer is not None:
+        return event_writer.pending(user)
+    return []
+
+
+def start_persistence():
+    """Start the journal replayer or write-behind flusher, whichever is enabled."""
+    if journal_replayer is not None:
+        journal_replayer.start()
+    if event_writer is not None:
+        event_writer.start()
+
+
+def stop_persistence():
+    """Drain pending events and stop background persistence - call on shutdown."""
+    if journal_replayer is not None:
+        journal_replayer.stop()
+    if event_writer is not None:
+        event_writer.stop()
+
+
+def close_persistence():
+    """Release the journal file - call after stop_persistence on shutdown."""
+    if event_journal is not None:
+        event_journal.close()
+
+
+# One rolling summary document per user (_id = user), kept next to events
+summaries = db.get_collection("summaries")
+
+
+def get_summary(user: str):
+    """{"summary", "through_ts", "updated"} for `user`, or None."""
+    return summaries.find_one({"_id": user})
+
+
+def save_summary(user: str, summary: str, through_ts):
+    summaries.replace_one(
+        {"_id": user},
+        {"_id": user, "summary": summary, "through_ts": through_ts, "updated": datetime.utcnow()},
+        upsert=True,
+    )
+
+
+def events_after(user: str, ts, limit: int) -> list:
+    """The oldest `limit` events for `user` after `ts` (None = ever), oldest first.
+
+    Oldest first so a caller can page forward by passing the last ts back in.
+    """
+    query = {"user": user}
+    if ts is not None:
+        query["ts"] = {"$gt": ts}
+    docs = events.find(query, _projection(CONTEXT_FIELDS)).sort("ts", 1).limit(limit)
+    return [{"info": d.get("info", {}), "ts": d.get("ts")} for d in docs]
+
+
+def events_needing_enrichment(limit: int) -> list:
+    """Events saved without extraction (the /listen deadline ran short), oldest first."""
+    query = {"info.needs_enrichment": True, "enrich_attempts": {"$not": {"$gte": ENRICH_MAX_ATTEMPTS}}}
+    return list(events.find(query).sort("ts", 1).limit(limit))
+
+
+def enrich_event(doc: dict, info: dict = None):
+    """Store the extraction for a raw-saved event; info=None only counts a failed attempt."""
+    update = {"$inc": {"enrich_attempts": 1}}
+    if info is not None:
+        info = {k: v for k, v in info.items() if k != "needs_enrichment"}
+        update["$set"] = {f"info.{k}": v for k, v in info.items()}
+        update["$unset"] = {"info.needs_enrichment": ""}
+    events.update_one({"_id": doc["_id"]}, update)
+    if info is not None:
+        # Entries are de-duplicated per item by _id, so the newly extracted items are added once
+        if item_index is not None:
+            item_index.add({"_id": doc["_id"], "user": doc.get("user"), "info": dict(doc.get("info") or {}, **info), "ts": doc.get("ts")})
+        recent_context.invalidate(doc.get("user"))
 
-    out = []
-    for d in cursor:
-        out.append({
-            "info": d.get("info"),
-            "ts": d.get("ts"),
-        })
 
-    return out
+def invalidate_context(user: str = None):
+    """Forget cached recent context after writes made outside this process."""
+    recent_context.invalidate(user)
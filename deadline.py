@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from logger import log
+from metrics import degradations
+
+load_dotenv()
+
+# End-to-end latency budget for a /listen turn. Each stage asks how much time
+# is left and degrades instead of overrunning: extraction is skipped (the raw
+# text is saved for later enrichment), the reply falls back to the keyword
+# phrases, and TTS falls back to pre-warmed cached audio.
+#   LISTEN_BUDGET          - seconds per /listen turn (0 = no deadline)
+#   DEADLINE_TTS_RESERVE   - seconds kept back for speech synthesis
+#   DEADLINE_REPLY_RESERVE - seconds kept back for reply generation while extracting
+#   DEADLINE_MIN_STAGE     - a stage with less than this left is skipped outright
+#   DEADLINE_READ_SLICE    - seconds for the (normally cached) context and memory reads,
+#                            which are not charged against the reserves
+LISTEN_BUDGET = float(os.getenv("LISTEN_BUDGET", "0"))
+DEADLINE_TTS_RESERVE = float(os.getenv("DEADLINE_TTS_RESERVE", "1.5"))
+DEADLINE_REPLY_RESERVE = float(os.getenv("DEADLINE_REPLY_RESERVE", "2.5"))
+DEADLINE_MIN_STAGE = float(os.getenv("DEADLINE_MIN_STAGE", "0.3"))
+DEADLINE_READ_SLICE = float(os.getenv("DEADLINE_READ_SLICE", "0.5"))
+
+class Budget:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.degraded = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+_budget = contextvars.ContextVar("request_budget", default=None)
+
+
+@contextmanager
+def request_budget(seconds: float):
+    """Give the enclosed request `seconds` end to end (no deadline if <= 0). Yields the Budget or None."""
+    budget = Budget(seconds) if seconds > 0 else None
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def current_budget():
+    """The Budget of the request being handled, or None."""
+    return _budget.get()
+
+
+def time_left(reserve: float = 0.0):
+    """Seconds this stage may take - what is left minus `reserve` for later stages.
+
+    None when the request has no deadline.
+    """
+    budget = _budget.get()
+    if budget is None:
+        return None
+    return max(0.0, budget.remaining() - reserve)
+
+
+def read_timeout():
+    """Timeout for a cheap read: a fixed DEADLINE_READ_SLICE (capped by what is left), None without a deadline."""
+    left = time_left()
+    return None if left is None else min(left, DEADLINE_READ_SLICE)
+
+
+def too_late(timeout) -> bool:
+    """True when a stage given `timeout` (from time_left) shouldn't even start."""
+    return timeout is not None and timeout < DEADLINE_MIN_STAGE
+
+
+async def within(awaitable, timeout):
+    """Await with `timeout` (None = unbounded); raises asyncio.TimeoutError when it runs out."""
+    if timeout is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout)
+
+
+def degrade(stage: str, reason: str, budget: Budget = None):
+    """Record that `stage` was skipped or replaced because of the deadline."""
+    budget = budget or _budget.get()
+    degradations.inc(stage=stage, reason=reason)
+    if budget is not None:
+        budget.degraded.append(f"{stage}:{reason}")
+        log.warning("deadline", f"⏳ Degraded {stage} ({reason}), {budget.remaining():.2f}s of {budget.seconds:.1f}s left")
+    else:
+        log.warning("deadline", f"⏳ Degraded {stage} ({reason})")
+
+
+def annotate(response, budget: Budget):
+    """Tell the client which stages were degraded (X-Degraded header)."""
+    if budget is not None and budget.degraded and hasattr(response, "headers"):
+        response.headers["X-Degraded"] = ",".join(budget.degraded)
+    return response
@@ -0,0 +1,244 @@
+import os
+import time
+import sqlite3
+import threading
+from bson import json_util
+from pymongo.errors import BulkWriteError, DocumentTooLarge, InvalidDocument
+from dotenv import load_dotenv
+from logger import log
+from event_writer import insert_batch, DUPLICATE_KEY
+
+load_dotenv()
+
+# Local write-ahead journal: every event is committed to a SQLite file first
+# (consistent local-disk latency), then a background replayer drains it into
+# MongoDB. Replays are idempotent because events carry their own _id.
+EVENT_JOURNAL = os.getenv("EVENT_JOURNAL", "false").lower() == "true"
+EVENT_JOURNAL_PATH = os.getenv("EVENT_JOURNAL_PATH", "event_journal.db")
+# NORMAL survives process crashes; FULL also survives power loss at some latency cost
+EVENT_JOURNAL_SYNC = os.getenv("EVENT_JOURNAL_SYNC", "NORMAL").upper()
+EVENT_JOURNAL_BATCH = int(os.getenv("EVENT_JOURNAL_BATCH", "100"))
+EVENT_JOURNAL_REPLAY_INTERVAL = float(os.getenv("EVENT_JOURNAL_REPLAY_INTERVAL", "1.0"))
+EVENT_JOURNAL_MAX_BACKOFF = float(os.getenv("EVENT_JOURNAL_MAX_BACKOFF", "30"))
+# A document MongoDB rejects this many times moves to the dead_letter table
+# instead of blocking the head of the journal forever
+EVENT_JOURNAL_MAX_ATTEMPTS = int(os.getenv("EVENT_JOURNAL_MAX_ATTEMPTS", "5"))
+
+# Rejected by MongoDB or the driver for what the document is, not because the
+# server is unreachable - retrying the same bytes will not help
+DOCUMENT_ERRORS = (DocumentTooLarge, InvalidDocument)
+
+
+class EventJournal:
+    def __init__(self, path: str, synchronous: str = "NORMAL"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"PRAGMA synchronous={synchronous}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " id TEXT UNIQUE NOT NULL,"
+                " user TEXT NOT NULL,"
+                " doc TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS journal_user ON journal(user)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(journal)")}
+            if "attempts" not in columns:
+                self._conn.execute("ALTER TABLE journal ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                " id TEXT PRIMARY KEY,"
+                " user TEXT NOT NULL,"
+                " doc TEXT NOT NULL,"
+                " error TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL,"
+                " failed_at REAL NOT NULL)"
+            )
+
+    def append(self, doc: dict):
+        """Durably record a document (with _id already set). Raises on disk errors."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO journal (id, user, doc) VALUES (?, ?, ?)",
+                (str(doc["_id"]), doc.get("user", ""), json_util.dumps(doc)),
+            )
+
+    def oldest(self, limit: int) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc FROM journal ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [json_util.loads(row[0]) for row in rows]
+
+    def pending(self, user: str) -> list:
+        """Journaled events for `user` that have not reached MongoDB yet."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc FROM journal WHERE user = ? ORDER BY seq", (user,)
+            ).fetchall()
+        return [json_util.loads(row[0]) for row in rows]
+
+    def remove(self, docs: list):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM journal WHERE id = ?", [(str(doc["_id"]),) for doc in docs]
+            )
+
+    def reject(self, docs: list, error: str, max_attempts: int) -> int:
+        """Count a failed attempt for each doc; move those out of attempts to dead_letter.
+
+        Returns how many were dead-lettered.
+        """
+        ids = [(str(doc["_id"]),) for doc in docs]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("UPDATE journal SET attempts = attempts + 1 WHERE id = ?", ids)
+                moved = self._conn.execute(
+                    f"SELECT COUNT(*) FROM journal WHERE attempts >= ? AND id IN ({','.join('?' * len(ids))})",
+                    (max_attempts, *(i for (i,) in ids)),
+                ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dead_letter (id, user, doc, error, attempts, failed_at)"
+                    " SELECT id, user, doc, ?, attempts, ? FROM journal WHERE id = ? AND attempts >= ?",
+                    [(error, time.time(), i, max_attempts) for (i,) in ids],
+                )
+                self._conn.executemany(
+                    "DELETE FROM journal WHERE id = ? AND attempts >= ?", [(i, max_attempts) for (i,) in ids]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return moved
+
+    def backlog(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def dead_letters(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalReplayer:
+    """Background thread that drains the journal into a MongoDB collection."""
+
+    def __init__(self, journal: EventJournal, collection, batch_size: int, interval: float):
+        self.journal = journal
+        self.collection = collection
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.replayed = 0
+        self.failures = 0
+        self.rejected = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal-replayer", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wake the replayer early after an append."""
+        self._wake.set()
+
+    def replay_once(self) -> int:
+        """Push one batch to MongoDB. Returns how many journal entries were drained.
+
+        Connection errors propagate (the whole batch is retried later); documents
+        MongoDB rejects are retried up to EVENT_JOURNAL_MAX_ATTEMPTS times each
+        and then moved to dead_letter, so one bad event can't stall the rest.
+        """
+        docs = self.journal.oldest(self.batch_size)
+        if not docs:
+            return 0
+        try:
+            insert_batch(self.collection, docs)
+        except BulkWriteError as e:
+            # The server answered: unordered insert stored everything except writeErrors
+            errors = {err["index"]: err.get("errmsg", "") for err in e.details.get("writeErrors", [])
+                      if err.get("code") != DUPLICATE_KEY}
+            if not errors or e.details.get("writeConcernErrors"):
+                raise
+            rejected = [docs[i] for i in errors]
+            stored = [doc for i, doc in enumerate(docs) if i not in errors]
+            return self._drained(stored) + self._reject(rejected, "; ".join(set(errors.values())))
+        except DOCUMENT_ERRORS:
+            # Raised client-side before anything was sent - find the culprit(s) one by one
+            return self._replay_each(docs)
+        return self._drained(docs)
+
+    def _replay_each(self, docs: list) -> int:
+        drained = 0
+        for doc in docs:
+            try:
+                insert_batch(self.collection, [doc])
+            except (BulkWriteError, *DOCUMENT_ERRORS) as e:
+                drained += self._reject([doc], str(e))
+                continue
+            drained += self._drained([doc])
+        return drained
+
+    def _drained(self, docs: list) -> int:
+        self.journal.remove(docs)
+        self.replayed += len(docs)
+        return len(docs)
+
+    def _reject(self, docs: list, error: str) -> int:
+        self.rejected += len(docs)
+        moved = self.journal.reject(docs, error, EVENT_JOURNAL_MAX_ATTEMPTS)
+        if moved:
+            self.dead_lettered += moved
+            log.error("db", f"❌ {moved} journaled event(s) rejected {EVENT_JOURNAL_MAX_ATTEMPTS} times, moved to dead_letter: {error}")
+        else:
+            log.warning("db", f"⚠️  MongoDB rejected {len(docs)} journaled event(s), will retry: {error}")
+        return moved
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stop.is_set():
+            try:
+                drained = self.replay_once()
+                backoff = self.interval
+                if drained == self.batch_size:
+                    continue  # more waiting - keep going
+            except Exception as e:
+                self.failures += 1
+                backoff = min(backoff * 2, EVENT_JOURNAL_MAX_BACKOFF)
+                log.warning("db", f"⚠️  Journal replay failed, {self.journal.backlog()} event(s) kept locally; retrying in {backoff:.0f}s: {e}")
+            self._wake.wait(backoff)
+            self._wake.clear()
+
+    def stop(self, timeout: float = 10):
+        """Stop the thread and make one last drain attempt; anything left replays on next start."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            while self.replay_once():
+                pass
+        except Exception as e:
+            log.warning("db", f"⚠️  Final journal replay failed: {e}")
+        log.info("db", f"📓 Journal replayer stopped - {self.replayed} replayed, {self.journal.backlog()} left for next start")
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self.journal.backlog(),
+            "replayed": self.replayed,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "dead_letter": self.journal.dead_letters(),
+        }
@@ -0,0 +1,219 @@
+import os
+import time
+import queue
+import threading
+from bson import json_util
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+from dotenv import load_dotenv
+from logger import log
+
+load_dotenv()
+
+# Write-behind persistence: save_event enqueues and returns immediately; a
+# background thread flushes batches with insert_many by size or time.
+EVENT_WRITE_BEHIND = os.getenv("EVENT_WRITE_BEHIND", "false").lower() == "true"
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "50"))
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "0.5"))  # seconds
+EVENT_QUEUE_MAX = int(os.getenv("EVENT_QUEUE_MAX", "1000"))
+EVENT_WRITE_RETRIES = int(os.getenv("EVENT_WRITE_RETRIES", "3"))
+# Batches that still fail after the retries go to a local spill file and are
+# re-sent every EVENT_SPILL_RETRY_INTERVAL seconds (and at startup)
+EVENT_SPILL_PATH = os.getenv("EVENT_SPILL_PATH", "event_spill.jsonl")
+EVENT_SPILL_RETRY_INTERVAL = float(os.getenv("EVENT_SPILL_RETRY_INTERVAL", "30"))
+# Write concern for batched inserts: w is a number or "majority"; j requests journal acks
+EVENT_WRITE_CONCERN_W = os.getenv("EVENT_WRITE_CONCERN_W", "1")
+EVENT_WRITE_CONCERN_J = os.getenv("EVENT_WRITE_CONCERN_J", "false").lower() == "true"
+
+DUPLICATE_KEY = 11000
+
+
+def write_concern() -> WriteConcern:
+    w = int(EVENT_WRITE_CONCERN_W) if EVENT_WRITE_CONCERN_W.isdigit() else EVENT_WRITE_CONCERN_W
+    return WriteConcern(w=w, j=EVENT_WRITE_CONCERN_J or None)
+
+
+def insert_batch(collection, docs: list) -> int:
+    """Insert docs that carry their own _id; re-inserting one already stored is a no-op.
+
+    Returns the number of newly inserted documents. Raises on any error other
+    than duplicate keys, so callers can retry the whole batch safely.
+    """
+    if not docs:
+        return 0
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY for err in errors) or e.details.get("writeConcernErrors"):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+class EventWriter:
+    def __init__(self, collection, batch_size: int, flush_interval: float, max_queue: int, spill_path: str = None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}  # _id -> doc, until MongoDB acknowledges it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.spilled = 0
+        self.recovered = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, doc: dict) -> bool:
+        """Queue a document (with _id already set). False if the queue is full."""
+        with self._lock:
+            self._pending[doc["_id"]] = doc
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            with self._lock:
+                self._pending.pop(doc["_id"], None)
+            return False
+        return True
+
+    def pending(self, user: str) -> list:
+        """Queued-but-unacknowledged documents for `user`."""
+        with self._lock:
+            return [doc for doc in self._pending.values() if doc.get("user") == user]
+
+    def _next_batch(self, first_wait: float) -> list:
+        try:
+            batch = [self._queue.get(timeout=first_wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        for attempt in range(1, EVENT_WRITE_RETRIES + 1):
+            try:
+                insert_batch(self.collection, batch)
+                self.written += len(batch)
+                self.batches += 1
+                break
+            except Exception as e:
+                log.error("db", f"❌ Batched event write failed (attempt {attempt}/{EVENT_WRITE_RETRIES}): {e}")
+                if attempt < EVENT_WRITE_RETRIES:
+                    time.sleep(min(0.2 * 2 ** attempt, 5))
+        else:
+            self._spill(batch)
+        with self._lock:
+            for doc in batch:
+                self._pending.pop(doc["_id"], None)
+
+    def _spill(self, docs: list):
+        """Keep a batch MongoDB wouldn't take on local disk for replay_spill."""
+        if not self.spill_path:
+            self.failed += len(docs)
+            return
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.writelines(json_util.dumps(doc) + "\n" for doc in docs)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            self.failed += len(docs)
+            log.error("db", f"❌ Could not spill {len(docs)} event(s) to {self.spill_path} - they are lost: {e}")
+            return
+        self.spilled += len(docs)
+        log.warning("db", f"💾 MongoDB unavailable - {len(docs)} event(s) spilled to {self.spill_path}")
+
+    def replay_spill(self) -> int:
+        """Re-send spilled events; whatever still fails is spilled again. Returns how many got through."""
+        if not self.spill_path:
+            return 0
+        replaying = self.spill_path + ".replaying"
+        if not os.path.exists(replaying):
+            if not os.path.exists(self.spill_path):
+                return 0
+            os.replace(self.spill_path, replaying)
+        docs = []
+        with open(replaying, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    docs.append(json_util.loads(line))
+                except ValueError:
+                    continue  # torn last line from a crash mid-spill
+        recovered = 0
+        for i in range(0, len(docs), self.batch_size):
+            try:
+                insert_batch(self.collection, docs[i:i + self.batch_size])
+            except Exception as e:
+                log.warning("db", f"⚠️  Spilled events still can't be written ({len(docs) - recovered} left): {e}")
+                self._spill(docs[i:])
+                break
+            recovered += len(docs[i:i + self.batch_size])
+        os.remove(replaying)
+        if recovered:
+            self.recovered += recovered
+            log.info("db", f"✅ {recovered} spilled event(s) written to MongoDB")
+        return recovered
+
+    def _replay_spill_logged(self):
+        try:
+            self.replay_spill()
+        except Exception as e:
+            log.warning("db", f"⚠️  Could not replay spilled events: {e}")
+
+    def _run(self):
+        next_spill_replay = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() >= next_spill_replay:
+                self._replay_spill_logged()
+                next_spill_replay = time.monotonic() + EVENT_SPILL_RETRY_INTERVAL
+            batch = self._next_batch(self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Write everything queued right now on the calling thread."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self, timeout: float = 10):
+        """Stop the background thread and flush whatever is left (call on shutdown)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        log.info("db", f"💾 Event writer stopped - {self.written} written in {self.batches} batches, {self.spilled} spilled, {self.failed} failed")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+            "spilled": self.spilled,
+            "recovered": self.recovered,
+        }
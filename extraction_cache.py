@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from logger import log
+
+load_dotenv()
+
+# Memoizes extract_important_info by normalized message text. Patients repeat
+# the same sentences many times a day, so most repeats skip the LLM entirely.
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "1000"))
+EXTRACTION_CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", str(24 * 3600)))  # seconds
+# Optional persistence: "none", "file" (JSON lines) or "mongo" (extraction_cache collection)
+EXTRACTION_CACHE_BACKEND = os.getenv("EXTRACTION_CACHE_BACKEND", "none").lower()
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.jsonl")
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a message."""
+    text = unicodedata.normalize("NFKC", text).lower().replace("’", "'")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class FileBacking:
+    """Append-only JSON lines file; the newest line for a key wins on load."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self, limit: int) -> list:
+        if not os.path.exists(self.path):
+            return []
+        entries = OrderedDict()
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                entries.pop(entry["key"], None)
+                entries[entry["key"]] = (entry["created"], entry["value"])
+        kept = [(k, created, value) for k, (created, value) in entries.items()][-limit:]
+        if lines > 2 * len(kept) + 100:
+            self._compact(kept)
+        return kept
+
+    def _compact(self, kept: list):
+        """Rewrite the file with only the live entries."""
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for key, created, value in kept:
+                    f.write(json.dumps({"key": key, "created": created, "value": value}) + "\n")
+            os.replace(tmp_path, self.path)
+
+    def save(self, key: str, created: float, value: dict):
+        line = json.dumps({"key": key, "created": created, "value": value})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class MongoBacking:
+    """extraction_cache collection next to events, expired by a TTL index."""
+
+    def __init__(self, ttl: float):
+        from db import db  # imported lazily so the cache module doesn't need Mongo otherwise
+        from pymongo import IndexModel
+        self.collection = db.get_collection("extraction_cache")
+        self.ttl = ttl
+        self._indexes = [IndexModel("created", expireAfterSeconds=int(ttl), name="created_ttl")]
+
+    def load(self, limit: int) -> list:
+        self.collection.create_indexes(self._indexes)
+        docs = self.collection.find().sort("created", -1).limit(limit)
+        return [
+            (d["_id"], d["created"].replace(tzinfo=timezone.utc).timestamp(), d["value"])
+            for d in reversed(list(docs))
+        ]
+
+    def save(self, key: str, created: float, value: dict):
+        self.collection.replace_one(
+            {"_id": key},
+            {"_id": key, "created": datetime.fromtimestamp(created, timezone.utc), "value": value},
+            upsert=True,
+        )
+
+
+class ExtractionCache:
+    def __init__(self, max_entries: int, ttl: float, backing=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backing = backing
+        self._entries = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        # Persistence happens off the request path
+        self._writer = ThreadPoolExecutor(max_workers=1) if backing else None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def load(self):
+        """Warm memory from the persistent backing (call once at startup)."""
+        if self.backing is None:
+            return
+        try:
+            loaded = self.backing.load(self.max_entries)
+        except Exception as e:
+            log.warning("extraction", f"⚠️  Could not load extraction cache: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, created, value in loaded:
+                if now - created < self.ttl and key not in self._entries:
+                    self._entries[key] = (created, value)
+            self._trim()
+        log.info("extraction", f"✅ Extraction cache loaded {len(loaded)} entries")
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, message: str):
+        """Cached extraction for `message` (without `raw`), or None."""
+        key = normalize_message(message)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created, value = entry
+            if time.time() - created >= self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(json.dumps(value))  # callers mutate the result
+
+    def put(self, message: str, extracted: dict):
+        key = normalize_message(message)
+        if not key:
+            return
+        value = {k: v for k, v in extracted.items() if k != "raw"}
+        created = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (created, value)
+            self._trim()
+        if self._writer is not None:
+            self._writer.submit(self._persist, key, created, value)
+
+    def _persist(self, key: str, created: float, value: dict):
+        try:
+            self.backing.save(key, created, value)
+        except Exception as e:
+            log.warning("extraction", f"⚠️  Could not persist extraction cache entry: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "expired": self.expired, "entries": len(self._entries)}
+
+
+def _make_backing():
+    if EXTRACTION_CACHE_BACKEND == "file":
+        return FileBacking(EXTRACTION_CACHE_PATH)
+    if EXTRACTION_CACHE_BACKEND == "mongo":
+        return MongoBacking(EXTRACTION_CACHE_TTL)
+    return None
+
+
+extraction_cache = None
+if EXTRACTION_CACHE_ENABLED:
+    extraction_cache = ExtractionCache(EXTRACTION_CACHE_SIZE, EXTRACTION_CACHE_TTL, _make_backing())
@@ -1,9 +1,27 @@
 import os
 import json
 import re
-import requests
+import httpx
+from datetime import datetime
 import cohere
 from dotenv import load_dotenv
+from http_client import get_client, get_async_client
+from extraction_cache import extraction_cache
+import rule_extractor
+from rule_extractor import RULE_EXTRACTOR_MODE, RULE_EXTRACTOR_THRESHOLD
+from json_extract import find_json_object, json_stats
+from ollama_session import OLLAMA_SESSION_MODE, ollama_sessions, session_key
+from context_assembler import (
+    CONTEXT_TOKEN_BUDGET,
+    MEMORY_TOKEN_BUDGET,
+    SUMMARY_TOKEN_BUDGET,
+    clip_to_budget,
+    fit_lines,
+    time_ago,
+)
+from llm_backends import LLM_FALLBACK, Backend, LLMError, concurrency_for, llm_router
+from metrics import errors, fallbacks, timed
+from logger import log
 
 load_dotenv()
 
@@ -11,149 +29,272 @@ load_dotenv()
 USE_COHERE = os.getenv("USE_COHERE", "false").lower() == "true"
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 COHERE_MODEL = "command-a-03-2025"  # Current available model
+# Override to point at a proxy or a local stand-in (see bench/); None uses Cohere's API
+COHERE_BASE_URL = os.getenv("COHERE_BASE_URL") or None
+# Backend tried first; LLM_FALLBACK (see llm_backends) can add a second one
+LLM_PRIMARY = "cohere" if USE_COHERE else "ollama"
 
 # Ollama configuration (fallback)
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma:2b")
+# How long Ollama keeps the model loaded after a request ("" leaves Ollama's default)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# One prompt returns both the extraction and the spoken reply (falls back to two calls)
+COMBINED_LLM_CALL = os.getenv("COMBINED_LLM_CALL", "false").lower() == "true"
+# Ask the backends for native JSON output (Ollama `format`, Cohere `response_format`)
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
 
 # Initialize Cohere client
 cohere_client = None
-if USE_COHERE and COHERE_API_KEY:
-    cohere_client = cohere.Client(COHERE_API_KEY)
-    print(f"✅ Cohere client initialized (model: {COHERE_MODEL})")
-else:
-    print(f"⚠️  Using Ollama fallback (USE_COHERE={USE_COHERE})")
+cohere_async_client = None
+if COHERE_API_KEY and "cohere" in (LLM_PRIMARY, LLM_FALLBACK):
+    cohere_client = cohere.Client(COHERE_API_KEY, base_url=COHERE_BASE_URL, httpx_client=get_client("cohere"))
+    cohere_async_client = cohere.AsyncClient(
+        COHERE_API_KEY, base_url=COHERE_BASE_URL, httpx_client=get_async_client("cohere")
+    )
+    log.info("llm", f"✅ Cohere client initialized (model: {COHERE_MODEL})")
+if not USE_COHERE:
+    log.warning("llm", f"⚠️  Using Ollama fallback (USE_COHERE={USE_COHERE})")
 
 
-def _call_cohere(prompt: str, max_tokens: int = 256, return_json: bool = False) -> str:
-    """Call Cohere API. Returns text response.
-    
-    Args:
-        prompt: The prompt to send to Cohere
-        max_tokens: Maximum tokens in response
-        return_json: If True, tries to extract JSON from response. If False, returns plain text.
-    """
-    try:
-        if not cohere_client:
-            return "Cohere client not initialized. Check your API key."
-        
-        response = cohere_client.chat(
-            model=COHERE_MODEL,
-            message=prompt,
-            max_tokens=max_tokens,
-            temperature=0.7,
-        )
-        
-        text = response.text.strip()
-        
-        if return_json:
-            # Try to extract JSON from the response
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
-            if json_match:
-                try:
-                    parsed = json.loads(json_match.group())
-                    return json.dumps(parsed)
-                except json.JSONDecodeError:
-                    pass
-        
-        return text
-        
-    except Exception as e:
-        print(f"❌ Cohere API error: {e}")
-        if return_json:
-            return json.dumps({"error": str(e), "raw": prompt})
-        return "I encountered an error while processing your request. Please try again."
+# Canned replies used when generation fails. They are fixed per user, so the
+# server pre-warms their audio at startup (see fallback_phrases).
+FALLBACK_REPLIES = {
+    "family": "That's wonderful, {user_name}. Family is so important. Tell me more about them!",
+    "keys": "Let's find those keys together, {user_name}. Have you checked your usual spots?",
+    "lost": "Don't worry, {user_name}. We'll figure this out together. Where did you last see it?",
+    "default": "I'm listening, {user_name}. How can I help you today?",
+    "empty": "I'm here to help you, {user_name}.",
+}
 
 
-def _call_ollama(prompt: str, max_tokens: int = 256, return_json: bool = False) -> str:
-    """Call local Ollama server. Returns text response.
-    
-    Args:
-        prompt: The prompt to send to Ollama
-        max_tokens: Maximum tokens in response
-        return_json: If True, tries to extract JSON from response. If False, returns plain text.
+def fallback_phrases(user_name: str) -> list:
+    """All canned fallback replies rendered for `user_name`."""
+    return [template.format(user_name=user_name) for template in FALLBACK_REPLIES.values()]
+
+
+def _extract_json(text: str) -> str:
+    """Pull the first JSON object out of a model response.
+
+    Returns the re-serialized object, or the original text if none parses.
     """
+    # With JSON mode on the whole response is normally the object already
     try:
-        url = f"{OLLAMA_BASE_URL}/api/generate"
-        
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "num_predict": max_tokens,
-                "temperature": 0.7,
-            }
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            json_stats.incr("native")
+            return json.dumps(parsed)
+    except json.JSONDecodeError:
+        pass
+    parsed = find_json_object(text)
+    if parsed is not None:
+        json_stats.incr("scanned")
+        return json.dumps(parsed)
+    json_stats.incr("failed")
+    return text
+
+
+def _cohere_json_args(return_json: bool) -> dict:
+    """Extra chat() arguments that ask Cohere for a bare JSON object."""
+    if return_json and LLM_JSON_MODE:
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _cohere_generate(prompt: str, max_tokens: int = 256, return_json: bool = False) -> str:
+    """Call Cohere API. Returns the response text; raises on any failure."""
+    if not cohere_client:
+        raise LLMError("Cohere client not initialized. Check your API key.")
+    response = cohere_client.chat(
+        model=COHERE_MODEL,
+        message=prompt,
+        max_tokens=max_tokens,
+        temperature=0.7,
+        **_cohere_json_args(return_json),
+    )
+    return response.text.strip()
+
+
+async def _cohere_generate_async(prompt: str, max_tokens: int = 256, return_json: bool = False) -> str:
+    """Async twin of `_cohere_generate` using Cohere's AsyncClient."""
+    if not cohere_async_client:
+        raise LLMError("Cohere client not initialized. Check your API key.")
+    response = await cohere_async_client.chat(
+        model=COHERE_MODEL,
+        message=prompt,
+        max_tokens=max_tokens,
+        temperature=0.7,
+        **_cohere_json_args(return_json),
+    )
+    return response.text.strip()
+
+
+def _ollama_payload(prompt: str, max_tokens: int, return_json: bool = False, context=None) -> dict:
+    """Build the /api/generate request body shared by the sync and async callers."""
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": False,
+        "options": {
+            "num_predict": max_tokens,
+            "temperature": 0.7,
         }
-        
-        response = requests.post(url, json=payload, timeout=60)
-        
-        if response.status_code != 200:
-            error_msg = f"Ollama API error: {response.status_code} - {response.text}"
-            print(f"❌ {error_msg}")
-            if return_json:
-                return json.dumps({"error": error_msg, "raw": prompt})
-            return "I'm having trouble connecting right now. Please try again in a moment."
-        
-        result = response.json()
-        
-        if "response" not in result:
-            error_msg = "Ollama response missing 'response' field"
-            print(f"⚠️  {error_msg}")
-            if return_json:
-                return json.dumps({"error": error_msg, "raw": prompt})
-            return "I couldn't generate a response. Please try again."
-        
-        text = result["response"].strip()
-        
-        if return_json:
-            # Try to extract JSON from the response
-            # Look for JSON object in the text
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
-            if json_match:
-                try:
-                    parsed = json.loads(json_match.group())
-                    return json.dumps(parsed)
-                except json.JSONDecodeError:
-                    pass
-        
-        return text
-        
-    except requests.exceptions.ConnectionError:
-        error_msg = "Cannot connect to Ollama server. Is it running?"
-        print(f"❌ {error_msg}")
-        print(f"💡 Make sure Ollama is running: ollama serve")
-        print(f"💡 Or check OLLAMA_BASE_URL in .env (current: {OLLAMA_BASE_URL})")
-        if return_json:
-            return json.dumps({"error": error_msg, "raw": prompt})
-        return "I'm having trouble connecting right now. Please try again in a moment."
-    except requests.exceptions.Timeout:
-        error_msg = "Ollama request timed out"
-        print(f"❌ {error_msg}")
-        if return_json:
-            return json.dumps({"error": error_msg, "raw": prompt})
+    }
+    if OLLAMA_KEEP_ALIVE:
+        payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+    if return_json and LLM_JSON_MODE:
+        # Constrains decoding to valid JSON
+        payload["format"] = "json"
+    if context:
+        # Already-evaluated tokens of a session's previous turns; only `prompt` is new work
+        payload["context"] = context
+    return payload
+
+
+def _ollama_text(response) -> str:
+    """Response text of an /api/generate call; raises if Ollama didn't produce one."""
+    if response.status_code != 200:
+        raise LLMError(f"Ollama API error: {response.status_code} - {response.text}")
+    result = response.json()
+    if "response" not in result:
+        raise LLMError("Ollama response missing 'response' field")
+    return result["response"].strip()
+
+
+def _ollama_generate(prompt: str, max_tokens: int = 256, return_json: bool = False, context=None):
+    """Call local Ollama server. Returns the response text; raises on any failure.
+
+    With `context` (a session's tokens, [] for a new one) returns (text, new context).
+    """
+    url = f"{OLLAMA_BASE_URL}/api/generate"
+    response = get_client("ollama").post(url, json=_ollama_payload(prompt, max_tokens, return_json, context))
+    text = _ollama_text(response)
+    return text if context is None else (text, response.json().get("context"))
+
+
+async def _ollama_generate_async(prompt: str, max_tokens: int = 256, return_json: bool = False, context=None):
+    """Async twin of `_ollama_generate` - awaits the HTTP call instead of blocking a worker thread."""
+    url = f"{OLLAMA_BASE_URL}/api/generate"
+    response = await get_async_client("ollama").post(url, json=_ollama_payload(prompt, max_tokens, return_json, context))
+    text = _ollama_text(response)
+    return text if context is None else (text, response.json().get("context"))
+
+
+def _llm_failure(e: Exception, prompt: str, return_json: bool) -> str:
+    """What the caller gets once every backend has failed."""
+    log.error("llm", f"❌ No LLM backend could answer: {e!r}")
+    errors.inc(stage="llm")
+    if isinstance(e, httpx.ConnectError) and not USE_COHERE:
+        log.error("llm", f"💡 Make sure Ollama is running (ollama serve) or check OLLAMA_BASE_URL (current: {OLLAMA_BASE_URL})")
+    if return_json:
+        return json.dumps({"error": str(e) or type(e).__name__, "raw": prompt})
+    if isinstance(e, httpx.TimeoutException):
         return "The request took too long. Please try again."
-    except Exception as e:
-        print(f"❌ Ollama API error: {e}")
-        if return_json:
-            return json.dumps({"error": str(e), "raw": prompt})
-        return f"I encountered an error while processing your request: {str(e)}"
+    return "I'm having trouble connecting right now. Please try again in a moment."
 
 
+@timed("llm")
 def _call_llm(prompt: str, max_tokens: int = 256, return_json: bool = False) -> str:
-    """Unified LLM caller - routes to Cohere or Ollama based on USE_COHERE flag."""
-    if USE_COHERE:
-        return _call_cohere(prompt, max_tokens, return_json)
-    else:
-        return _call_ollama(prompt, max_tokens, return_json)
+    """Unified LLM caller - goes through the backend registry (limits, failover, coalescing)."""
+    try:
+        text = llm_router.call(prompt, max_tokens, return_json)
+    except Exception as e:
+        return _llm_failure(e, prompt, return_json)
+    return _extract_json(text) if return_json else text
 
 
-def extract_important_info(message: str) -> dict:
-    """Ask the model to extract important fields from a free-form message.
+@timed("llm")
+async def _call_llm_async(prompt: str, max_tokens: int = 256, return_json: bool = False) -> str:
+    """Async unified LLM caller - same routing as `_call_llm`, plus hedging if enabled."""
+    try:
+        text = await llm_router.acall(prompt, max_tokens, return_json)
+    except Exception as e:
+        return _llm_failure(e, prompt, return_json)
+    return _extract_json(text) if return_json else text
 
-    Returns a dict with extracted fields when possible; always returns a dict.
+
+async def _stream_ollama(prompt: str, max_tokens: int = 256, context=None, on_context=None):
+    """Yield response tokens from Ollama as they are generated.
+
+    With `context`, `on_context` gets the session's new context at the end.
     """
-    prompt = (
+    on_done = None if on_context is None else (lambda chunk: on_context(chunk.get("context")))
+    async for token in _stream_ollama_payload(_ollama_payload(prompt, max_tokens, context=context), on_done):
+        yield token
+
+
+async def _stream_ollama_payload(payload: dict, on_done=None):
+    """Stream a prepared /api/generate body; `on_done` gets the final chunk."""
+    url = f"{OLLAMA_BASE_URL}/api/generate"
+    payload = dict(payload, stream=True)
+    async with get_async_client("ollama").stream("POST", url, json=payload) as response:
+        if response.status_code != 200:
+            await response.aread()
+            raise LLMError(f"Ollama API error: {response.status_code} - {response.text}")
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                if on_done is not None:
+                    on_done(chunk)
+                break
+
+
+async def _stream_cohere(prompt: str, max_tokens: int = 256):
+    """Yield response tokens from Cohere's chat stream."""
+    if not cohere_async_client:
+        raise LLMError("Cohere client not initialized. Check your API key.")
+    async for event in cohere_async_client.chat_stream(
+        model=COHERE_MODEL,
+        message=prompt,
+        max_tokens=max_tokens,
+        temperature=0.7,
+    ):
+        if event.event_type == "text-generation":
+            yield event.text
+
+
+async def _stream_llm(prompt: str, max_tokens: int = 256):
+    """Unified token stream - same routing as `_call_llm`. Raises on backend errors."""
+    async for token in llm_router.astream(prompt, max_tokens):
+        yield token
+
+
+llm_router.register(Backend(
+    "ollama", _ollama_generate, _ollama_generate_async, _stream_ollama, concurrency_for("ollama"), sessions=True,
+))
+llm_router.register(Backend(
+    "cohere", _cohere_generate, _cohere_generate_async, _stream_cohere, concurrency_for("cohere"),
+))
+llm_router.set_order([LLM_PRIMARY, LLM_FALLBACK])
+
+
+# End of sentence: terminal punctuation, optional closing quote/bracket, then whitespace
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
+
+
+async def _split_sentences(tokens):
+    """Regroup a token stream into complete sentences."""
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        while True:
+            match = _SENTENCE_END.search(buffer)
+            if not match:
+                break
+            sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def _build_extraction_prompt(message: str) -> str:
+    return (
         "Extract key information from this message into JSON format.\n"
         "Fields to extract (if present):\n"
         "- intent: what they need (help, reminder, information, etc)\n"
@@ -164,17 +305,19 @@ def extract_important_info(message: str) -> dict:
         "- items: objects they're looking for or need\n"
         "- emotion: how they seem to be feeling\n"
         "- notes: brief summary\n\n"
-        f"Message: {message}\n\n"
-        "Return ONLY valid JSON, no other text."
+        "Return ONLY valid JSON, no other text.\n\n"
+        f"Message: {message}"
     )
-    
-    text = _call_llm(prompt, max_tokens=300, return_json=True)
 
+
+def _parse_extraction(text: str, message: str) -> dict:
+    """Turn the model's extraction output into the event `info` dict."""
     try:
         parsed = json.loads(text)
         if isinstance(parsed, dict):
             # If Ollama returned an error, don't return it - use fallback instead
             if "error" in parsed:
+                json_stats.incr("fallback")
                 return {
                     "raw": message,
                     "intent": "note"
@@ -188,30 +331,97 @@ def extract_important_info(message: str) -> dict:
         pass
 
     # Fallback: return minimal structure (safe, no error keys)
+    json_stats.incr("fallback")
     return {
         "raw": message,
         "intent": "note"
     }
 
 
-def generate_assistance(user_name: str, context_info: dict) -> str:
-    """Produce a short, calm assistance message using context_info.
+def _cached_extraction(message: str):
+    if extraction_cache is None:
+        return None
+    cached = extraction_cache.get(message)
+    if cached is not None:
+        cached["raw"] = message
+        log.info("extraction", "⚡ Extraction served from cache")
+    return cached
 
-    The prompt is intentionally small: the app should later use a low-latency model.
+
+def _remember_extraction(message: str, extracted: dict):
+    # Only cache real model output, never the minimal fallback
+    if extraction_cache is not None and extracted != {"raw": message, "intent": "note"}:
+        extraction_cache.put(message, extracted)
+
+
+def _fast_path_extraction(message: str):
+    """Rule-based extraction when RULE_EXTRACTOR_MODE=on and the rules are confident."""
+    if RULE_EXTRACTOR_MODE != "on":
+        return None
+    fields, confidence = rule_extractor.extract(message)
+    if confidence < RULE_EXTRACTOR_THRESHOLD:
+        return None
+    log.info("extraction", f"⚡ Rule-based extraction (confidence {confidence:.2f})")
+    fields["raw"] = message
+    return fields
+
+
+def _shadow_compare(message: str, extracted: dict):
+    """In shadow mode, score the rules against the LLM's extraction."""
+    if RULE_EXTRACTOR_MODE == "shadow" and extracted != {"raw": message, "intent": "note"}:
+        fields, confidence = rule_extractor.extract(message)
+        rule_extractor.agreement.record(fields, confidence, extracted, RULE_EXTRACTOR_THRESHOLD)
+
+
+def extract_important_info(message: str) -> dict:
+    """Ask the model to extract important fields from a free-form message.
+
+    Returns a dict with extracted fields when possible; always returns a dict.
+    Repeated messages are answered from the extraction cache, and confident
+    rule-based matches skip the model when RULE_EXTRACTOR_MODE=on.
     """
-    # Get current message and extracted info for context
-    current_msg = context_info.get("current_message", "")
-    extracted = context_info.get("extracted", {})
-    recent_events = context_info.get("recent_events", [])
-    stress_detected = context_info.get("stress_detected", False)
-    vitals = context_info.get("vitals", {})
-    
+    cached = _cached_extraction(message) or _fast_path_extraction(message)
+    if cached is not None:
+        return cached
+    text = _call_llm(_build_extraction_prompt(message), max_tokens=300, return_json=True)
+    extracted = _parse_extraction(text, message)
+    _remember_extraction(message, extracted)
+    _shadow_compare(message, extracted)
+    return extracted
+
+
+def quick_extraction(message: str):
+    """Extraction available without a model call (cache or confident rules), or None."""
+    return _cached_extraction(message) or _fast_path_extraction(message)
+
+
+async def extract_important_info_async(message: str) -> dict:
+    """Async version of `extract_important_info` for the /listen pipeline."""
+    cached = quick_extraction(message)
+    if cached is not None:
+        return cached
+    return await extract_with_model_async(message)
+
+
+async def extract_with_model_async(message: str) -> dict:
+    """The model call of `extract_important_info_async`, for callers that already tried quick_extraction."""
+    text = await _call_llm_async(_build_extraction_prompt(message), max_tokens=300, return_json=True)
+    extracted = _parse_extraction(text, message)
+    _remember_extraction(message, extracted)
+    _shadow_compare(message, extracted)
+    return extracted
+
+
+def is_active_stress(context_info: dict) -> bool:
+    """True when the reply should use the calming dementia-episode prompt."""
     # Check if this is an ACTIVE stress alert (not just aftermath)
     # Stress mode should only activate for ALERT messages with vital signs
+    current_msg = context_info.get("current_message", "")
     is_alert_message = current_msg.upper().startswith("ALERT:")
-    active_stress = stress_detected and is_alert_message
-    
-    # Build context summary from current extraction
+    return bool(context_info.get("stress_detected", False)) and is_alert_message
+
+
+def _extraction_summary(extracted: dict) -> str:
     context_parts = []
     if extracted.get("concern"):
         context_parts.append(f"Concern: {extracted['concern']}")
@@ -221,12 +431,46 @@ def generate_assistance(user_name: str, context_info: dict) -> str:
         context_parts.append(f"Location: {extracted['location']}")
     if extracted.get("people"):
         context_parts.append(f"People: {extracted['people']}")
+    return ", ".join(context_parts) if context_parts else "general request"
+
+
+def _memory_lines(context_info: dict) -> list:
+    """Retrieved older memories (see memory_index) not already in the recent history."""
+    recent = {
+        e.get("info", {}).get("raw") or e.get("info", {}).get("notes") or e.get("info", {}).get("original_message", "")
+        for e in context_info.get("recent_events", [])
+    }
+    lines = []
+    for event in context_info.get("memories", []):
+        raw_msg = event.get("info", {}).get("raw", "")
+        if not raw_msg or raw_msg in recent:
+            continue
+        when = time_ago(event["ts"]) if event.get("ts") else "earlier"
+        stress_marker = " [STRESS EPISODE]" if event.get("info", {}).get("stress_detected") else ""
+        lines.append(f"[{when}{stress_marker}] {raw_msg}")
+    return fit_lines(lines, MEMORY_TOKEN_BUDGET) if lines else []
+
+
+def _build_assistance_prompt(user_name: str, context_info: dict) -> str:
+    """Build the reply prompt from context_info.
+
+    The prompt is intentionally small: the app should later use a low-latency model.
+    """
+    # Get current message and extracted info for context
+    current_msg = context_info.get("current_message", "")
+    extracted = context_info.get("extracted", {})
+    recent_events = context_info.get("recent_events", [])
+    stress_detected = context_info.get("stress_detected", False)
+    vitals = context_info.get("vitals", {})
     
-    context_str = ", ".join(context_parts) if context_parts else "general request"
+    active_stress = is_active_stress(context_info)
+    
+    # Build context summary from current extraction
+    context_str = _extraction_summary(extracted)
     
     # Build conversation history from last 5 messages with timestamps
     history_messages = []
-    for event in recent_events[:5]:  # Get last 5 messages
+    for event in recent_events:  # newest first; trimmed to the token budget below
         info = event.get("info", {})
         timestamp = event.get("ts")
         raw_msg = info.get("raw") or info.get("notes") or info.get("original_message", "")
@@ -234,33 +478,25 @@ def generate_assistance(user_name: str, context_info: dict) -> str:
         if raw_msg:
             # Format timestamp for readability
             if timestamp:
-                from datetime import datetime
-                # Calculate how long ago
-                time_diff = datetime.utcnow() - timestamp
-                if time_diff.seconds < 60:
-                    time_ago = "just now"
-                elif time_diff.seconds < 3600:
-                    mins = time_diff.seconds // 60
-                    time_ago = f"{mins} minute{'s' if mins != 1 else ''} ago"
-                elif time_diff.days == 0:
-                    hours = time_diff.seconds // 3600
-                    time_ago = f"{hours} hour{'s' if hours != 1 else ''} ago"
-                else:
-                    time_ago = f"{time_diff.days} day{'s' if time_diff.days != 1 else ''} ago"
+                when = time_ago(timestamp)
                 
                 # Check if this was a stress/dementia episode
                 was_stress = info.get("stress_detected", False)
                 stress_marker = " [STRESS EPISODE]" if was_stress else ""
                 
-                history_messages.append(f"[{time_ago}{stress_marker}] {raw_msg}")
+                history_messages.append(f"[{when}{stress_marker}] {raw_msg}")
             else:
                 history_messages.append(f"- {raw_msg}")
     
+    history_messages = fit_lines(history_messages, CONTEXT_TOKEN_BUDGET)
     history_str = "\n".join(history_messages) if history_messages else ""
+    # Rolling summary of everything older (see context_assembler)
+    summary = clip_to_budget(context_info.get("summary", ""), SUMMARY_TOKEN_BUDGET)
+    memories_str = "\n".join(_memory_lines(context_info))
     
-    # Print history for debugging
-    if history_str:
-        print(f"📚 History being sent to model:\n{history_str}\n")
+    # History dump for debugging (LOG_LEVELS=history=debug)
+    if history_str and log.wants("history"):
+        log.debug("history", f"📚 History being sent to model:\n{history_str}")
     
     # Adjust prompt based on ACTIVE stress/dementia episode detection
     if active_stress:
@@ -272,8 +508,12 @@ def generate_assistance(user_name: str, context_info: dict) -> str:
             f"Their vitals show they are highly stressed and confused.\n"
         )
         
+        if summary:
+            prompt += f"What you remember about them: {summary}\n"
         if history_str:
             prompt += f"What you know: {history_str}\n"
+        if memories_str:
+            prompt += f"Related memories: {memories_str}\n"
         
         prompt += (
             "\nYour goal is to help them relax and calm down:\n"
@@ -293,8 +533,13 @@ def generate_assistance(user_name: str, context_info: dict) -> str:
             f"They just said: \"{current_msg}\"\n"
         )
         
+        if summary:
+            prompt += f"\nWhat you remember from earlier conversations: {summary}\n"
         if history_str:
             prompt += f"\nFor context, here's their recent conversation history with timestamps:\n{history_str}\n"
+        if memories_str:
+            prompt += f"\nOlder memories that may be relevant to what they said:\n{memories_str}\n"
+        if history_str or memories_str:
             prompt += "\nNOTE: Messages marked [STRESS EPISODE] were during past dementia episodes. Don't assume current stress unless their current message indicates it.\n"
         
         prompt += (
@@ -309,31 +554,43 @@ def generate_assistance(user_name: str, context_info: dict) -> str:
             "Your response:"
         )
     
-    text = _call_llm(prompt, max_tokens=50, return_json=False)
-    
-    # Better fallback if generation fails - make it context-aware
-    if not text or "error" in text.lower() or "couldn't" in text.lower():
-        # Create a conversational fallback based on what they said
-        if "daughter" in current_msg.lower() or "son" in current_msg.lower() or "family" in current_msg.lower():
-            return f"That's wonderful, {user_name}. Family is so important. Tell me more about them!"
-        elif "key" in current_msg.lower() and ("find" in current_msg.lower() or "lost" in current_msg.lower() or "where" in current_msg.lower()):
-            return f"Let's find those keys together, {user_name}. Have you checked your usual spots?"
-        elif "lost" in current_msg.lower() or "can't find" in current_msg.lower():
-            return f"Don't worry, {user_name}. We'll figure this out together. Where did you last see it?"
-        else:
-            return f"I'm listening, {user_name}. How can I help you today?"
+    return prompt
+
+
+def fallback_reply(user_name: str, current_msg: str) -> str:
+    """Conversational fallback based on what they said, used when generation fails or there's no time for it."""
+    fallbacks.inc(kind="reply")
+    return fallback_phrase(user_name, current_msg)
+
+
+def fallback_phrase(user_name: str, current_msg: str) -> str:
+    """The fallback_phrases entry `fallback_reply` would pick, without counting a fallback."""
+    if "daughter" in current_msg.lower() or "son" in current_msg.lower() or "family" in current_msg.lower():
+        return FALLBACK_REPLIES["family"].format(user_name=user_name)
+    elif "key" in current_msg.lower() and ("find" in current_msg.lower() or "lost" in current_msg.lower() or "where" in current_msg.lower()):
+        return FALLBACK_REPLIES["keys"].format(user_name=user_name)
+    elif "lost" in current_msg.lower() or "can't find" in current_msg.lower():
+        return FALLBACK_REPLIES["lost"].format(user_name=user_name)
+    else:
+        return FALLBACK_REPLIES["default"].format(user_name=user_name)
+
+
+def _is_failed_generation(text: str) -> bool:
+    return not text or "error" in text.lower() or "couldn't" in text.lower()
+
+
+def _clean_for_speech(text: str, strip_prefixes: bool = True) -> str:
+    """Strip markdown (and optionally AI response prefixes) for natural speech."""
+    # Remove markdown formatting
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)  # Remove bold **text**
+    text = re.sub(r'\*(.+?)\*', r'\1', text)      # Remove italic *text*
+    text = re.sub(r'#+\s*', '', text)             # Remove headers
+    text = re.sub(r'\n+', ' ', text)              # Replace newlines with spaces
+    text = re.sub(r'\s+', ' ', text)              # Collapse multiple spaces
+    text = re.sub(r'^\s*[-•]\s*', '', text)       # Remove bullet points
+    text = text.strip()
     
-    # Clean up formatting for natural speech
-    if text:
-        # Remove markdown formatting
-        text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)  # Remove bold **text**
-        text = re.sub(r'\*(.+?)\*', r'\1', text)      # Remove italic *text*
-        text = re.sub(r'#+\s*', '', text)             # Remove headers
-        text = re.sub(r'\n+', ' ', text)              # Replace newlines with spaces
-        text = re.sub(r'\s+', ' ', text)              # Collapse multiple spaces
-        text = re.sub(r'^\s*[-•]\s*', '', text)       # Remove bullet points
-        text = text.strip()
-        
+    if strip_prefixes:
         # Remove common AI response prefixes
         prefixes_to_remove = [
             "Here's what I'd say:",
@@ -347,4 +604,349 @@ def generate_assistance(user_name: str, context_info: dict) -> str:
             if text.lower().startswith(prefix.lower()):
                 text = text[len(prefix):].strip()
     
-    return (text or f"I'm here to help you, {user_name}.").strip()
+    return text
+
+
+def _finalize_assistance(text: str, user_name: str, current_msg: str) -> str:
+    """Apply the fallback and speech cleanup to raw model output."""
+    # Better fallback if generation fails - make it context-aware
+    if _is_failed_generation(text):
+        return fallback_reply(user_name, current_msg)
+    
+    # Clean up formatting for natural speech
+    text = _clean_for_speech(text)
+    
+    return (text or FALLBACK_REPLIES["empty"].format(user_name=user_name)).strip()
+
+
+def _use_session() -> bool:
+    # With Ollama's circuit open, replies take the normal path so they can fail over
+    return OLLAMA_SESSION_MODE and not USE_COHERE and llm_router.available("ollama")
+
+
+def _session_instructions(user_name: str, active_stress: bool) -> str:
+    """Fixed opening of a session - identical on every turn for a user and mode.
+
+    Everything that changes per turn goes after it, so Ollama can reuse the
+    evaluated prefix even when a session has to be restarted.
+    """
+    if active_stress:
+        return (
+            f"You are helping {user_name}, an elderly person with severe short-term and long-term memory loss who is experiencing a distressing dementia episode.\n"
+            "Their vitals show they are highly stressed and confused.\n"
+            "Each turn gives you the time, any new lines of their conversation history, and what they just said.\n\n"
+            "Your goal is to help them relax and calm down:\n"
+            "- Use their name and speak slowly with a reassuring, gentle tone\n"
+            "- Ground them in reality: remind them they're safe at home\n"
+            "- If they're asking a question, answer it briefly while also reassuring them\n"
+            "- Validate their feelings without arguing or correcting harshly\n"
+            "- Help reduce their anxiety with simple, comforting words\n"
+            "- Keep sentences very short and simple due to their memory impairment\n\n"
+            "CRITICAL: Every response MUST be under 25 words total. Maximum 2 sentences."
+        )
+    return (
+        f"You are a caring companion speaking to {user_name}, an elderly person with memory challenges.\n"
+        "Each turn gives you the time, any new lines of their conversation history, and what they just said.\n"
+        "History lines marked [STRESS EPISODE] were during past dementia episodes. Don't assume current stress unless their current message indicates it.\n\n"
+        "Respond naturally and warmly:\n"
+        "- If they're asking about something from their history, reference it specifically\n"
+        "- If they're just chatting normally, respond conversationally without mentioning history\n"
+        "- Be engaged and natural - let the conversation flow\n"
+        "- Don't summarize unless they explicitly ask\n"
+        "- Pay attention to times - old stress episodes are NOT current issues\n"
+        "- Use natural speech only - no formatting\n\n"
+        "CRITICAL: Every response MUST be under 30 words total. Maximum 2-3 short sentences."
+    )
+
+
+def _event_text(event: dict) -> str:
+    info = event.get("info", {})
+    return info.get("raw") or info.get("notes") or info.get("original_message", "")
+
+
+def _absolute_history_line(event: dict) -> str:
+    info = event.get("info", {})
+    raw_msg = _event_text(event)
+    timestamp = event.get("ts")
+    stress_marker = " STRESS EPISODE" if info.get("stress_detected", False) else ""
+    when = timestamp.strftime("%a %H:%M") if timestamp else "earlier"
+    return f"[{when}{stress_marker}] {raw_msg}"
+
+
+def _session_turn(context_info: dict, seen_texts: set):
+    """Text for one session turn and the updated set of messages the session has seen.
+
+    A message is sent once, as history or as "They just said"; the model keeps
+    it in its context after that. An empty `seen_texts` means a new session.
+    History uses absolute times (not "5 minutes ago") so earlier turns stay valid.
+    """
+    current_msg = context_info.get("current_message", "")
+    new_session = not seen_texts
+    # The current turn is sent below; its saved copy must not come back as history
+    seen_texts = seen_texts | {current_msg}
+    new_lines = []
+    for event in context_info.get("recent_events", []):
+        raw_msg = _event_text(event)
+        if raw_msg and raw_msg not in seen_texts:
+            seen_texts.add(raw_msg)
+            new_lines.append(_absolute_history_line(event))
+    new_lines = fit_lines(new_lines, CONTEXT_TOKEN_BUDGET)
+    new_lines.reverse()  # oldest first
+    memory_lines = []
+    for event in context_info.get("memories", []):
+        raw_msg = _event_text(event)
+        if raw_msg and raw_msg not in seen_texts:
+            seen_texts.add(raw_msg)
+            memory_lines.append(_absolute_history_line(event))
+    memory_lines = fit_lines(memory_lines, MEMORY_TOKEN_BUDGET) if memory_lines else []
+
+    turn = ""
+    summary = clip_to_budget(context_info.get("summary", ""), SUMMARY_TOKEN_BUDGET)
+    if summary and new_session:
+        turn += f"What you remember from earlier conversations: {summary}\n"
+    if new_lines:
+        history_str = "\n".join(new_lines)
+        if log.wants("history"):
+            log.debug("history", f"📚 New history for session:\n{history_str}")
+        turn += f"Conversation history (UTC):\n{history_str}\n"
+    if memory_lines:
+        turn += "Older memories that may be relevant (UTC):\n" + "\n".join(memory_lines) + "\n"
+    turn += f"Time now: {datetime.utcnow():%a %H:%M} UTC\n"
+    turn += f"They just said: \"{current_msg}\"\n"
+    turn += "Your calming response:" if is_active_stress(context_info) else "Your response:"
+    return turn, seen_texts
+
+
+def _session_request(user_name: str, context_info: dict):
+    """(session key, prompt, context, seen messages, turn number) for a session reply."""
+    active_stress = is_active_stress(context_info)
+    key = session_key(user_name, active_stress)
+    session = ollama_sessions.get(key)
+    if session is None:
+        turn, seen = _session_turn(context_info, set())
+        return key, _session_instructions(user_name, active_stress) + "\n\n" + turn, [], seen, 1
+    turn, seen = _session_turn(context_info, session["seen"])
+    return key, turn, session["context"], seen, session["turns"] + 1
+
+
+def _remember_session(key: str, context: list, seen: set, turns: int):
+    if context:
+        ollama_sessions.save(key, context, seen, turns)
+
+
+def _session_failed(e: Exception):
+    log.warning("llm", f"⚠️  Ollama session reply failed, answering without the session: {e!r}")
+
+
+def _call_ollama_session(user_name: str, context_info: dict, max_tokens: int) -> str:
+    """`_call_llm` for a reply, continuing the user's session.
+
+    Goes through llm_router (limits, breaker, coalescing); if Ollama can't
+    answer, the reply is generated statelessly so it can fail over.
+    """
+    key, prompt, context, seen, turns = _session_request(user_name, context_info)
+    try:
+        text, context = llm_router.call(prompt, max_tokens, False, context=context)
+    except Exception as e:
+        _session_failed(e)
+        return _call_llm(_build_assistance_prompt(user_name, context_info), max_tokens, False)
+    _remember_session(key, context, seen, turns)
+    return text
+
+
+async def _call_ollama_session_async(user_name: str, context_info: dict, max_tokens: int) -> str:
+    """Async twin of `_call_ollama_session`."""
+    key, prompt, context, seen, turns = _session_request(user_name, context_info)
+    try:
+        text, context = await llm_router.acall(prompt, max_tokens, False, context=context)
+    except Exception as e:
+        _session_failed(e)
+        return await _call_llm_async(_build_assistance_prompt(user_name, context_info), max_tokens, False)
+    _remember_session(key, context, seen, turns)
+    return text
+
+
+async def _stream_ollama_session(user_name: str, context_info: dict, max_tokens: int):
+    """Token stream for a reply, continuing the user's session (stateless if that fails up front)."""
+    key, prompt, context, seen, turns = _session_request(user_name, context_info)
+    started = False
+    try:
+        async for token in llm_router.astream(
+            prompt, max_tokens, context=context, on_context=lambda new: _remember_session(key, new, seen, turns),
+        ):
+            started = True
+            yield token
+        return
+    except Exception as e:
+        if started:
+            raise
+        _session_failed(e)
+    async for token in _stream_llm(_build_assistance_prompt(user_name, context_info), max_tokens):
+        yield token
+
+
+async def warm_ollama(user_name: str):
+    """Load the model and evaluate the fixed session prefix so the first turn is fast."""
+    if USE_COHERE:
+        return
+    prompt = _session_instructions(user_name, False) if OLLAMA_SESSION_MODE else ""
+    payload = _ollama_payload(prompt, 1)
+    if not prompt:
+        del payload["prompt"]  # an empty request just loads the model
+    try:
+        response = await get_async_client("ollama").post(f"{OLLAMA_BASE_URL}/api/generate", json=payload)
+        if response.status_code == 200:
+            log.info("llm", f"🔥 Ollama model {OLLAMA_MODEL} loaded (keep_alive={OLLAMA_KEEP_ALIVE or 'default'})")
+        else:
+            log.warning("llm", f"⚠️  Ollama warm-up failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        log.warning("llm", f"⚠️  Ollama warm-up failed: {e}")
+
+
+def generate_assistance(user_name: str, context_info: dict) -> str:
+    """Produce a short, calm assistance message using context_info."""
+    if _use_session():
+        text = _call_ollama_session(user_name, context_info, max_tokens=50)
+    else:
+        prompt = _build_assistance_prompt(user_name, context_info)
+        text = _call_llm(prompt, max_tokens=50, return_json=False)
+    return _finalize_assistance(text, user_name, context_info.get("current_message", ""))
+
+
+async def generate_assistance_async(user_name: str, context_info: dict) -> str:
+    """Async version of `generate_assistance` for the /listen pipeline."""
+    if _use_session():
+        text = await _call_ollama_session_async(user_name, context_info, max_tokens=50)
+    else:
+        prompt = _build_assistance_prompt(user_name, context_info)
+        text = await _call_llm_async(prompt, max_tokens=50, return_json=False)
+    return _finalize_assistance(text, user_name, context_info.get("current_message", ""))
+
+
+async def generate_assistance_stream(user_name: str, context_info: dict):
+    """Yield the reply sentence by sentence while the model is still generating.
+
+    Each sentence gets the same speech cleanup as `generate_assistance`; if the
+    model fails before producing anything, the keyword fallback is yielded instead.
+    """
+    current_msg = context_info.get("current_message", "")
+    if _use_session():
+        tokens = _stream_ollama_session(user_name, context_info, max_tokens=50)
+    else:
+        tokens = _stream_llm(_build_assistance_prompt(user_name, context_info), max_tokens=50)
+    spoken = 0
+    try:
+        async for sentence in _split_sentences(tokens):
+            if spoken == 0 and _is_failed_generation(sentence):
+                break
+            sentence = _clean_for_speech(sentence, strip_prefixes=(spoken == 0))
+            if sentence:
+                spoken += 1
+                yield sentence
+    except Exception as e:
+        log.error("llm", f"❌ Streaming generation failed: {e}")
+    if spoken == 0:
+        yield fallback_reply(user_name, current_msg)
+
+
+async def summarize_history_async(user_name: str, previous: str, events: list):
+    """Rolling-summary update: `previous` summary plus `events` (oldest first).
+
+    Returns the new summary, or None if generation failed.
+    """
+    lines = [_absolute_history_line(e) for e in events]
+    prompt = (
+        f"You keep a short memory summary for {user_name}, an elderly person with memory challenges.\n"
+        f"Current summary: {previous or 'none yet'}\n\n"
+        "New conversation lines (oldest first, UTC):\n"
+        + "\n".join(lines)
+        + "\n\nRewrite the summary to include anything worth remembering from the new lines: "
+        "people, where things were put, appointments, worries, and stress episodes. "
+        "Drop small talk. Plain sentences, under 80 words.\n"
+        "Updated summary:"
+    )
+    try:
+        # Straight to the router: the patient-facing error text must not become a summary
+        text = await llm_router.acall(prompt, 160, False)
+    except Exception as e:
+        log.warning("summary", f"⚠️  Summary generation failed: {e!r}")
+        return None
+    if _is_failed_generation(text):
+        return None
+    return clip_to_budget(_clean_for_speech(text), SUMMARY_TOKEN_BUDGET)
+
+
+def _build_combined_prompt(user_name: str, context_info: dict) -> str:
+    """Reply prompt plus extraction instructions, answered as one JSON envelope."""
+    reply_prompt = _build_assistance_prompt(user_name, context_info)
+    # Drop the trailing "Your response:" cue - the reply goes inside the JSON instead
+    reply_prompt = reply_prompt.rsplit("\n", 1)[0]
+    return (
+        reply_prompt
+        + "\n\nAlso extract key information from what they just said.\n"
+        "Fields to extract (if present):\n"
+        "- intent: what they need (help, reminder, information, etc)\n"
+        "- concern: any worry or problem mentioned\n"
+        "- people: names of people mentioned\n"
+        "- location: places mentioned (home, store, address, etc)\n"
+        "- time: time or date references\n"
+        "- items: objects they're looking for or need\n"
+        "- emotion: how they seem to be feeling\n"
+        "- notes: brief summary\n\n"
+        "Return ONLY valid JSON, no other text, in exactly this shape:\n"
+        '{"extracted": {<fields above>}, "reply": "<your spoken response>"}'
+    )
+
+
+def _parse_combined(text: str, message: str):
+    """Return (extracted, raw_reply) from a combined response, or None if unusable."""
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        # Fenced or prefixed envelopes (the text is normally _extract_json output already)
+        parsed = find_json_object(text)
+    if not isinstance(parsed, dict) or "error" in parsed:
+        return None
+    extracted = parsed.get("extracted")
+    reply = parsed.get("reply")
+    if not isinstance(extracted, dict) or not isinstance(reply, str) or not reply.strip():
+        return None
+    return _parse_extraction(json.dumps(extracted), message), reply
+
+
+def extract_and_reply(user_name: str, context_info: dict):
+    """Extraction and reply from a single LLM call; (extracted, reply).
+
+    Falls back to extract_important_info + generate_assistance if the combined
+    response can't be parsed.
+    """
+    current_msg = context_info.get("current_message", "")
+    text = _call_llm(_build_combined_prompt(user_name, context_info), max_tokens=350, return_json=True)
+    combined = _parse_combined(text, current_msg)
+    if combined is not None:
+        extracted, reply = combined
+        _remember_extraction(current_msg, extracted)
+        return extracted, _finalize_assistance(reply, user_name, current_msg)
+
+    log.warning("llm", "⚠️  Combined response unparseable - falling back to two calls")
+    json_stats.incr("combined_fallback")
+    extracted = extract_important_info(current_msg)
+    context_info = dict(context_info, extracted=extracted)
+    return extracted, generate_assistance(user_name, context_info)
+
+
+async def extract_and_reply_async(user_name: str, context_info: dict):
+    """Async version of `extract_and_reply` for the /listen pipeline."""
+    current_msg = context_info.get("current_message", "")
+    text = await _call_llm_async(_build_combined_prompt(user_name, context_info), max_tokens=350, return_json=True)
+    combined = _parse_combined(text, current_msg)
+    if combined is not None:
+        extracted, reply = combined
+        _remember_extraction(current_msg, extracted)
+        return extracted, _finalize_assistance(reply, user_name, current_msg)
+
+    log.warning("llm", "⚠️  Combined response unparseable - falling back to two calls")
+    json_stats.incr("combined_fallback")
+    extracted = await extract_important_info_async(current_msg)
+    context_info = dict(context_info, extracted=extracted)
+    return extracted, await generate_assistance_async(user_name, context_info)
@@ -0,0 +1,77 @@
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One pooled keep-alive client per upstream host (elevenlabs, ollama, cohere),
+# so each host gets its own connection limit and handshakes are paid once.
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_MAX_KEEPALIVE_PER_HOST = int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Default (connect, read) timeouts in seconds, overridable per upstream with
+# <NAME>_CONNECT_TIMEOUT / <NAME>_READ_TIMEOUT, e.g. ELEVENLABS_READ_TIMEOUT=20
+DEFAULT_TIMEOUTS = {
+    "elevenlabs": (5.0, 30.0),
+    "ollama": (5.0, 60.0),
+    "cohere": (5.0, 30.0),
+}
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def timeout_for(name: str) -> httpx.Timeout:
+    connect, read = DEFAULT_TIMEOUTS.get(name, (5.0, 30.0))
+    prefix = name.upper()
+    connect = float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", connect))
+    read = float(os.getenv(f"{prefix}_READ_TIMEOUT", read))
+    return httpx.Timeout(read, connect=connect, pool=connect)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_client(name: str) -> httpx.Client:
+    """Shared blocking client for upstream `name` (used by sync code paths)."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = httpx.Client(timeout=timeout_for(name), limits=_limits())
+                _clients[name] = client
+    return client
+
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+    """Shared async client for upstream `name` (used by the FastAPI handlers)."""
+    client = _async_clients.get(name)
+    if client is None:
+        with _lock:
+            client = _async_clients.get(name)
+            if client is None:
+                client = httpx.AsyncClient(timeout=timeout_for(name), limits=_limits())
+                _async_clients[name] = client
+    return client
+
+
+async def aclose_all():
+    """Close every pooled client - call on server shutdown."""
+    with _lock:
+        clients = list(_clients.values())
+        async_clients = list(_async_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+    for client in clients:
+        client.close()
+    for client in async_clients:
+        await client.aclose()
@@ -0,0 +1,210 @@
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+from dotenv import load_dotenv
+from logger import log
+from context_assembler import time_ago
+
+load_dotenv()
+
+# Inverted index over extracted fields: item -> where it was last put,
+# person -> latest mentions. Updated on every saved event and rebuilt from the
+# events collection at startup, so "where are my keys" needs no LLM call.
+ITEM_INDEX_ENABLED = os.getenv("ITEM_INDEX_ENABLED", "false").lower() == "true"
+ITEM_INDEX_MAX_LOCATIONS = int(os.getenv("ITEM_INDEX_MAX_LOCATIONS", "3"))
+ITEM_INDEX_MAX_MENTIONS = int(os.getenv("ITEM_INDEX_MAX_MENTIONS", "5"))
+
+_DETERMINERS = re.compile(r"^(my|the|a|an|his|her|their|our|your|some)\s+")
+_WHERE_IS = re.compile(
+    r"^(?:do you know |can you tell me |have you seen )?"
+    r"(?:where(?:'s| is| are| did i (?:put|leave|last see)| have i (?:put|left)| would i have put)"
+    r"|have you seen|i can'?t find|i cannot find|i lost)\s+(?P<thing>[a-z' ]+?)\s*"
+    r"(?:again|now|today|this time)?$"
+)
+_LOOKUP_SUFFIX = re.compile(r"\s+(?:at|go|gone|went|put|placed|left|is|are|be)$")
+_PREPOSITION = re.compile(r"^(in|on|under|at|by|next to|behind|inside|beside|near|upstairs|downstairs|home)\b")
+_SURFACES = {"table", "nightstand", "counter", "desk", "shelf", "couch", "sofa", "chair", "bed", "dresser",
+             "windowsill", "floor", "mantel", "bench", "stove", "sink"}
+# Questions and searches mention items without saying where they are
+_QUESTION = re.compile(r"\?|^(where|have you|did i|can you|do you|what|who|when|i can'?t find|i cannot find|i lost)\b")
+
+
+def normalize_name(value: str) -> str:
+    """'My Keys' -> 'key'; used for both index keys and lookups."""
+    name = re.sub(r"[^a-z' ]+", " ", value.lower().replace("’", "'")).strip()
+    name = _DETERMINERS.sub("", name)
+    name = re.sub(r"\s+", " ", name)
+    if len(name) > 3 and name.endswith("s") and not name.endswith("ss"):
+        name = name[:-1]
+    return name
+
+
+def _as_list(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [str(value)]
+
+
+def _message(info: dict) -> str:
+    return info.get("raw") or info.get("notes") or info.get("original_message", "")
+
+
+def _place(location: str) -> str:
+    """'kitchen' -> 'in the kitchen', 'table' -> 'on the table'; 'by the sink' stays as it is."""
+    location = location.strip()
+    if _PREPOSITION.match(location.lower()):
+        return location
+    on_or_in = "on" if location.lower().split()[-1] in _SURFACES else "in"
+    if _DETERMINERS.match(location.lower()):
+        return f"{on_or_in} {location}"
+    return f"{on_or_in} the {location}"
+
+
+class ItemIndex:
+    def __init__(self, max_locations: int, max_mentions: int):
+        self.max_locations = max_locations
+        self.max_mentions = max_mentions
+        self._lock = threading.Lock()
+        # user -> name -> newest-first list of entries
+        self._items = defaultdict(dict)
+        self._people = defaultdict(dict)
+        self._rebuild_lock = threading.Lock()
+        self._added_during_rebuild = None
+        self.answered = 0
+
+    def add(self, doc: dict):
+        """Index one stored event (needs user, info, ts; _id makes re-adds no-ops)."""
+        with self._lock:
+            self._index(doc, self._items, self._people)
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append(doc)
+
+    def _index(self, doc: dict, items: dict, people: dict):
+        info = doc.get("info") or {}
+        user = doc.get("user", "")
+        entry = {"id": doc.get("_id"), "ts": doc.get("ts"), "message": _message(info)}
+        locations = _as_list(info.get("location"))
+        # Only statements place an item ("I put my keys in the drawer"), not searches
+        placing = locations and info.get("intent") != "help" and not _QUESTION.search(entry["message"].lower().strip())
+        if placing:
+            for item in _as_list(info.get("items")):
+                self._insert(items[user], normalize_name(item),
+                             dict(entry, location=", ".join(locations), item=item), self.max_locations)
+        for person in _as_list(info.get("people")):
+            self._insert(people[user], normalize_name(person), dict(entry, person=person), self.max_mentions)
+
+    @staticmethod
+    def _insert(index: dict, name: str, entry: dict, limit: int):
+        if not name:
+            return
+        entries = index.setdefault(name, [])
+        if entry["id"] is not None and any(e["id"] == entry["id"] for e in entries):
+            return
+        entries.append(entry)
+        # Rebuilds can add out of order; keep newest first
+        entries.sort(key=lambda e: e["ts"] or datetime.min, reverse=True)
+        del entries[limit:]
+
+    def rebuild(self, user: str = None, batch_size: int = 500):
+        """Re-index stored events - everyone's at startup, one user's after edits or deletes (blocking).
+
+        The new entries replace the old ones in one step, so lookups keep working meanwhile.
+        """
+        from db import events
+        fields = {"user": 1, "ts": 1, "info.items": 1, "info.location": 1, "info.people": 1,
+                  "info.intent": 1, "info.raw": 1, "info.notes": 1, "info.original_message": 1}
+        with self._rebuild_lock:
+            with self._lock:
+                self._added_during_rebuild = []
+            items, people = defaultdict(dict), defaultdict(dict)
+            try:
+                count = 0
+                query = {} if user is None else {"user": user}
+                for doc in events.find(query, fields).sort("ts", 1).batch_size(batch_size):
+                    self._index(doc, items, people)
+                    count += 1
+            except Exception as e:
+                log.warning("items", f"⚠️  Could not rebuild item index: {e}")
+                with self._lock:
+                    self._added_during_rebuild = None
+                return
+            with self._lock:
+                if user is None:
+                    self._items, self._people = items, people
+                else:
+                    self._items[user] = items[user]
+                    self._people[user] = people[user]
+                # Events saved while the collection was being read
+                for doc in self._added_during_rebuild:
+                    if user is None or doc.get("user", "") == user:
+                        self._index(doc, self._items, self._people)
+                self._added_during_rebuild = None
+            log.info("items", f"🗂️  Item index rebuilt from {count} events" + (f" for {user}" if user else ""))
+
+    def _find(self, index: dict, thing: str):
+        """Entries for the closest indexed name: exact, then whole-word containment."""
+        if thing in index:
+            return index[thing]
+        words = set(thing.split())
+        matches = [
+            entries for name, entries in index.items()
+            if words & set(name.split()) and (name in thing or thing in name)
+        ]
+        if not matches:
+            return None
+        return max(matches, key=lambda entries: entries[0]["ts"] or datetime.min)
+
+    def lookup(self, user: str, message: str):
+        """("item"|"person", entries) for a "where is X" question, or None."""
+        text = re.sub(r"[^a-z' ]+", " ", message.lower().replace("’", "'")).strip()
+        text = re.sub(r"\s+", " ", text)
+        match = _WHERE_IS.match(text)
+        if not match:
+            return None
+        thing = normalize_name(_LOOKUP_SUFFIX.sub("", match.group("thing")))
+        if not thing:
+            return None
+        with self._lock:
+            entries = self._find(self._items.get(user, {}), thing)
+            if entries:
+                return "item", [dict(e) for e in entries]
+            entries = self._find(self._people.get(user, {}), thing)
+            if entries:
+                return "person", [dict(e) for e in entries]
+        return None
+
+    def answer(self, user: str, user_name: str, message: str):
+        """Spoken answer to a "where is X" question straight from the index, or None."""
+        found = self.lookup(user, message)
+        if found is None:
+            return None
+        kind, entries = found
+        latest = entries[0]
+        when = time_ago(latest["ts"]) if latest["ts"] else "earlier"
+        if kind == "item":
+            item = _DETERMINERS.sub("", latest["item"].lower())
+            were, they = ("were", "they") if item.endswith("s") else ("was", "it")
+            text = f"{user_name}, the last time you told me, your {item} {were} {_place(latest['location'])}. That was {when}."
+            if len(entries) > 1 and entries[1]["location"] != latest["location"]:
+                text += f" Before that {they} {were} {_place(entries[1]['location'])}."
+        else:
+            text = f"{user_name}, the last time you mentioned {latest['person']} was {when}. You said: {latest['message']}"
+        self.answered += 1
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": sum(len(i) for i in self._items.values()),
+                "people": sum(len(p) for p in self._people.values()),
+                "answered": self.answered,
+            }
+
+
+item_index = None
+if ITEM_INDEX_ENABLED:
+    item_index = ItemIndex(ITEM_INDEX_MAX_LOCATIONS, ITEM_INDEX_MAX_MENTIONS)
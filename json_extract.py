@@ -0,0 +1,101 @@
+import json
+import threading
+
+
+class JSONObjectScanner:
+    """Single-pass scanner that pulls complete top-level JSON objects out of text.
+
+    Tracks brace depth outside of string literals, so nesting depth is
+    unlimited and each character is normally looked at once. Text can be fed
+    in chunks as it streams in; `feed` returns every object completed so far
+    and `finish` whatever the end of the input still allows. A candidate that
+    isn't valid JSON, or never closes (a stray "{" in prose), is rescanned from
+    the character after its opening brace, so an object inside it is still found.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def _restart(self) -> list:
+        """Give up on the current candidate's opening brace and rescan what followed it."""
+        rest = "".join(self._buffer[1:])
+        self._reset()
+        return self.feed(rest)
+
+    def feed(self, chunk: str) -> list:
+        found = []
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == "{":
+                    self._buffer = [ch]
+                    self._depth = 1
+                continue
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads("".join(self._buffer))
+                    except json.JSONDecodeError:
+                        found += self._restart()
+                        continue
+                    self._buffer = []
+                    found.append(obj)
+        return found
+
+    def finish(self) -> list:
+        """Call at the end of the input: objects that were inside a candidate that never closed."""
+        found = []
+        while self._depth > 0:
+            found += self._restart()
+        return found
+
+
+def find_json_object(text: str):
+    """First complete JSON object in `text`, or None."""
+    scanner = JSONObjectScanner()
+    found = scanner.feed(text) + scanner.finish()
+    return found[0] if found else None
+
+
+class ParseStats:
+    """Counters for how model JSON output was recovered."""
+
+    FIELDS = ("native", "scanned", "failed", "fallback", "combined_fallback")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {field: 0 for field in self.FIELDS}
+
+    def incr(self, field: str):
+        with self._lock:
+            self.counts[field] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+# native   - the response was valid JSON as-is (JSON mode worked)
+# scanned  - JSON had to be dug out of surrounding text
+# failed   - no JSON object could be recovered
+# fallback - extraction fell back to {"raw", "intent": "note"}
+# combined_fallback - a combined call was unusable and redone as two calls
+json_stats = ParseStats()
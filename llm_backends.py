@@ -0,0 +1,402 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from metrics import span
+from logger import log
+
+load_dotenv()
+
+# Registry of LLM backends (ollama, cohere, ...). Every call goes through a
+# per-backend concurrency limit and circuit breaker; identical in-flight
+# prompts share one call; failures fail over to the next backend in order.
+#   LLM_FALLBACK       - backend tried after the primary fails ("" = none)
+#   LLM_HEDGE_AFTER    - seconds before also asking the fallback and taking
+#                        whichever answers first (0 = no hedging)
+#   <NAME>_MAX_CONCURRENCY - parallel calls per backend, e.g. OLLAMA_MAX_CONCURRENCY=2
+LLM_FALLBACK = os.getenv("LLM_FALLBACK", "").lower()
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_SINGLEFLIGHT = os.getenv("LLM_SINGLEFLIGHT", "true").lower() == "true"
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds open before a trial call
+
+DEFAULT_CONCURRENCY = {"ollama": 2, "cohere": 8}
+
+
+class LLMError(Exception):
+    """A backend answered, but not with usable text."""
+
+
+class BackendUnavailable(LLMError):
+    """No backend could take the call (all failed or circuits open)."""
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors; lets one trial call through after `cooldown`."""
+
+    def __init__(self, name: str, failures: int, cooldown: float):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # Half-open: one caller probes. Restarting the clock means a probe
+                # that never reports back (cancelled) just delays the next one.
+                self._trial = True
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                if self._opened_at is None:
+                    log.warning("llm", f"🔌 LLM circuit for {self.name} opened after {self._consecutive} failure(s)")
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._trial else "open"
+
+
+class Backend:
+    """One LLM provider: blocking `call`, async `acall` and optional async `astream`.
+
+    `call`/`acall` take (prompt, max_tokens, return_json) and `astream` takes
+    (prompt, max_tokens); all of them raise on failure. A backend registered
+    with `sessions=True` also accepts `context=` (tokens of an earlier exchange,
+    [] to start one): `call`/`acall` then return (text, new context) and
+    `astream` reports the new context to its `on_context=` callback.
+    """
+
+    def __init__(self, name: str, call, acall, astream=None, concurrency: int = 4, sessions: bool = False):
+        self.name = name
+        self.call = call
+        self.acall = acall
+        self.astream = astream
+        self.sessions = sessions
+        self.breaker = CircuitBreaker(name, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        self._sync_slots = threading.BoundedSemaphore(concurrency)
+        self._async_slots = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _failed(self, e: Exception):
+        self.failures += 1
+        self.breaker.record_failure()
+        log.error("llm", f"❌ LLM backend {self.name} failed: {e!r}")
+
+    def invoke(self, prompt: str, max_tokens: int, return_json: bool, **options):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise BackendUnavailable(f"{self.name} circuit open")
+        with self._sync_slots, span(f"llm.{self.name}"):
+            self.calls += 1
+            try:
+                text = self.call(prompt, max_tokens, return_json, **options)
+            except Exception as e:
+                self._failed(e)
+                raise
+        self.breaker.record_success()
+        return text
+
+    async def ainvoke(self, prompt: str, max_tokens: int, return_json: bool, **options):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise BackendUnavailable(f"{self.name} circuit open")
+        async with self._async_slots:
+            self.calls += 1
+            try:
+                with span(f"llm.{self.name}"):
+                    text = await self.acall(prompt, max_tokens, return_json, **options)
+            except asyncio.CancelledError:
+                raise  # lost a hedge race - not the backend's fault
+            except Exception as e:
+                self._failed(e)
+                raise
+        self.breaker.record_success()
+        return text
+
+    async def astream_tokens(self, prompt: str, max_tokens: int, **options):
+        if self.astream is None:
+            raise BackendUnavailable(f"{self.name} cannot stream")
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise BackendUnavailable(f"{self.name} circuit open")
+        async with self._async_slots:
+            self.calls += 1
+            try:
+                async for token in self.astream(prompt, max_tokens, **options):
+                    yield token
+            except Exception as e:
+                self._failed(e)
+                raise
+        self.breaker.record_success()
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state(),
+            "concurrency": self.concurrency,
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class SingleFlight:
+    """Identical concurrent calls share the first caller's result.
+
+    An async call is cancelled once every caller waiting on it has been
+    cancelled, so it gives its backend slot back instead of running on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> concurrent.futures.Future (blocking callers)
+        self._tasks = {}   # key -> asyncio.Task (async callers)
+        self._waiters = {}  # key -> async callers still waiting on that task
+        self.shared = 0
+        self.abandoned = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result()
+
+    async def ado(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        self._waiters[key] += 1
+        try:
+            # Shielded so one caller's cancellation doesn't cancel everyone's call
+            return await asyncio.shield(task)
+        finally:
+            if self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+                if not self._waiters[key] and not task.done():
+                    # Nobody wants the answer any more (e.g. a request deadline passed)
+                    self.abandoned += 1
+                    task.cancel()
+                    self._forget(key, task)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            del self._waiters[key]
+
+
+class LLMRouter:
+    def __init__(self, hedge_after: float = 0, singleflight: bool = True):
+        self.backends = {}
+        self.order = []
+        self.hedge_after = hedge_after
+        self.singleflight = SingleFlight() if singleflight else None
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def register(self, backend: Backend):
+        self.backends[backend.name] = backend
+
+    def set_order(self, names: list):
+        """Primary first, then fallbacks; unknown or duplicate names are dropped."""
+        self.order = [n for i, n in enumerate(names) if n in self.backends and n not in names[:i]]
+
+    def backend(self, name: str):
+        return self.backends.get(name)
+
+    def _chain(self, options: dict) -> list:
+        # A session continuation only makes sense to backends that keep sessions
+        return [self.backends[n] for n in self.order if "context" not in options or self.backends[n].sessions]
+
+    @staticmethod
+    def _options(context) -> dict:
+        return {} if context is None else {"context": context}
+
+    @staticmethod
+    def _key(prompt, max_tokens, return_json, options) -> tuple:
+        context = options.get("context")
+        return (prompt, max_tokens, return_json, None if context is None else tuple(context))
+
+    def call(self, prompt: str, max_tokens: int = 256, return_json: bool = False, context=None):
+        """Blocking call with failover (no hedging). Raises if every backend fails.
+
+        With `context` only session backends are tried and the result is
+        (text, new context) - see `Backend`.
+        """
+        options = self._options(context)
+        if self.singleflight is None:
+            return self._call(prompt, max_tokens, return_json, options)
+        key = self._key(prompt, max_tokens, return_json, options)
+        return self.singleflight.do(key, lambda: self._call(prompt, max_tokens, return_json, options))
+
+    def _call(self, prompt, max_tokens, return_json, options):
+        last_error = None
+        for i, backend in enumerate(self._chain(options)):
+            if i:
+                self.failovers += 1
+            try:
+                return backend.invoke(prompt, max_tokens, return_json, **options)
+            except Exception as e:
+                last_error = e
+        raise last_error or BackendUnavailable("no LLM backend configured")
+
+    async def acall(self, prompt: str, max_tokens: int = 256, return_json: bool = False, context=None):
+        """Async call with failover and optional hedging. Raises if every backend fails.
+
+        `context` works as in `call`.
+        """
+        options = self._options(context)
+        if self.singleflight is None:
+            return await self._acall(prompt, max_tokens, return_json, options)
+        key = self._key(prompt, max_tokens, return_json, options)
+        return await self.singleflight.ado(key, lambda: self._acall(prompt, max_tokens, return_json, options))
+
+    async def _acall(self, prompt, max_tokens, return_json, options):
+        chain = self._chain(options)
+        if not chain:
+            raise BackendUnavailable("no LLM backend configured")
+        if self.hedge_after > 0 and len(chain) > 1:
+            return await self._hedged(chain, prompt, max_tokens, return_json, options)
+        last_error = None
+        for i, backend in enumerate(chain):
+            if i:
+                self.failovers += 1
+            try:
+                return await backend.ainvoke(prompt, max_tokens, return_json, **options)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _hedged(self, chain, prompt, max_tokens, return_json, options):
+        """Start the primary; after `hedge_after` (or on its failure) start the next one too.
+
+        The first successful answer wins and the other request is cancelled.
+        """
+        pending = {}
+        remaining = list(chain)
+        last_error = None
+
+        def launch():
+            backend = remaining.pop(0)
+            task = asyncio.ensure_future(backend.ainvoke(prompt, max_tokens, return_json, **options))
+            pending[task] = backend
+
+        launch()
+        try:
+            while pending:
+                timeout = self.hedge_after if remaining else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    log.info("llm", f"⏱️  LLM hedge: {pending[next(iter(pending))].name} slow, also asking {remaining[0].name}")
+                    launch()
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        if backend is not chain[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                if not pending and remaining:
+                    self.failovers += 1
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, prompt: str, max_tokens: int = 256, context=None, on_context=None):
+        """Token stream from the first backend that produces a token.
+
+        Fails over only before the first token; a stream that breaks midway raises.
+        With `context` only session backends are tried and `on_context` gets the
+        new context once the stream is done.
+        """
+        options = self._options(context)
+        if context is not None:
+            options["on_context"] = on_context
+        last_error = None
+        for i, backend in enumerate(self._chain(options)):
+            if i:
+                self.failovers += 1
+            started = False
+            try:
+                async for token in backend.astream_tokens(prompt, max_tokens, **options):
+                    started = True
+                    yield token
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+        raise last_error or BackendUnavailable("no LLM backend configured")
+
+    def available(self, name: str) -> bool:
+        backend = self.backends.get(name)
+        return backend is not None and not backend.breaker.is_open()
+
+    def stats(self) -> dict:
+        return {
+            "order": self.order,
+            "backends": {name: b.stats() for name, b in self.backends.items()},
+            "coalesced": self.singleflight.shared if self.singleflight else 0,
+            "abandoned": self.singleflight.abandoned if self.singleflight else 0,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+def concurrency_for(name: str) -> int:
+    return int(os.getenv(f"{name.upper()}_MAX_CONCURRENCY", DEFAULT_CONCURRENCY.get(name, 4)))
+
+
+llm_router = LLMRouter(LLM_HEDGE_AFTER, LLM_SINGLEFLIGHT)
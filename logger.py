@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import threading
+import contextvars
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Structured, non-blocking logging. Request handlers only format-check and
+# enqueue; a background thread does the stdout writes, so a slow terminal or
+# log pipe never adds latency to a reply.
+#   LOG_LEVEL   - default level for every category (debug|info|warning|error|off)
+#   LOG_LEVELS  - per-category overrides, e.g. "history=debug,llm=warning"
+#   LOG_SAMPLE  - fraction of verbose debug payloads kept, e.g. "history=0.1"
+#   LOG_FORMAT  - "text" (human) or "json" (one object per line)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").lower()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Records beyond this are dropped (and counted) rather than blocking the caller
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100}
+
+# Set per HTTP request by main.py's middleware; "-" outside a request
+request_id = contextvars.ContextVar("request_id", default="-")
+
+
+def _parse_pairs(spec: str, convert) -> dict:
+    """'a=debug, b=warning' -> {"a": convert("debug"), "b": convert("warning")}."""
+    pairs = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pairs[name.strip()] = convert(value.strip().lower())
+    return pairs
+
+
+class Logger:
+    def __init__(self, level: str, levels: dict, samples: dict, fmt: str, queue_max: int, stream=None):
+        self._level = LEVELS.get(level, LEVELS["info"])
+        self._levels = {name: LEVELS.get(value, self._level) for name, value in levels.items()}
+        self._samples = samples
+        self.format = fmt
+        self._stream = stream
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def level_for(self, category: str) -> int:
+        return self._levels.get(category, self._level)
+
+    def enabled(self, category: str, level: str = "info") -> bool:
+        return LEVELS[level] >= self.level_for(category)
+
+    def wants(self, category: str) -> bool:
+        """True when a verbose debug payload for `category` should be built and logged.
+
+        Guard expensive formatting with it so the work is skipped when debug is off
+        or the record falls outside the LOG_SAMPLE fraction.
+        """
+        if not self.enabled(category, "debug"):
+            return False
+        rate = self._samples.get(category, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+    def log(self, level: str, category: str, message: str, **fields):
+        if LEVELS[level] < self.level_for(category):
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), level, category, request_id.get(), message, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, category: str, message: str, **fields):
+        self.log("debug", category, message, **fields)
+
+    def info(self, category: str, message: str, **fields):
+        self.log("info", category, message, **fields)
+
+    def warning(self, category: str, message: str, **fields):
+        self.log("warning", category, message, **fields)
+
+    def error(self, category: str, message: str, **fields):
+        self.log("error", category, message, **fields)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _format(self, record) -> str:
+        ts, level, category, rid, message, fields = record
+        if self.format == "json":
+            body = {"ts": round(ts, 3), "level": level, "cat": category, "rid": rid, "msg": message}
+            body.update(fields)
+            return json.dumps(body, default=str, ensure_ascii=False)
+        clock = datetime.fromtimestamp(ts).strftime("%H:%M:%S.%f")[:-3]
+        line = f"{clock} {level.upper():<7} {category:<10} [{rid}] {message}"
+        if fields:
+            line += " " + " ".join(f"{k}={v!r}" if isinstance(v, str) else f"{k}={v}" for k, v in fields.items())
+        return line
+
+    def _run(self):
+        stream = self._stream or sys.stdout
+        while True:
+            record = self._queue.get()
+            batch = [record]
+            # Write whatever else is already queued in the same syscall
+            while record is not None and len(batch) < 256:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(record)
+            stop = batch[-1] is None
+            lines = [self._format(r) for r in batch if r is not None]
+            try:
+                if lines:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                self.written += len(lines)
+            except Exception:
+                self.dropped += len(lines)
+            if stop:
+                return
+
+    def close(self, timeout: float = 2.0):
+        """Write everything queued so far and stop the writer thread (idempotent)."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+log = Logger(LOG_LEVEL, _parse_pairs(LOG_LEVELS, str), _parse_pairs(LOG_SAMPLE, float), LOG_FORMAT, LOG_QUEUE_MAX)
+atexit.register(log.close)
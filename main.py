@@ -1,23 +1,166 @@
-from fastapi import FastAPI
-from fastapi.responses import Response
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, PlainTextResponse
 from pydantic import BaseModel
-import requests
+from datetime import datetime
+import asyncio
 import os
 import json
+import uuid
 import uvicorn
 from dotenv import load_dotenv
-from db import save_event, get_context_for_user
-from gemini_client import extract_important_info, generate_assistance
+from db import (
+    save_event,
+    get_context_for_user,
+    ensure_indexes,
+    invalidate_context,
+    start_persistence,
+    stop_persistence,
+    close_persistence,
+    recent_context,
+    event_writer,
+    journal_replayer,
+    events_needing_enrichment,
+    enrich_event,
+)
+from tts import speak_response, speak_sentences_response, prewarm, cached_audio, has_cached_audio
+from tts_cache import audio_cache
+from http_client import aclose_all
+from extraction_cache import extraction_cache
+from reply_cache import REPLY_KEY_LOOKBACK, reply_cache, reply_key
+from rule_extractor import agreement_report
+from json_extract import json_stats
+from ollama_session import ollama_sessions
+from llm_backends import llm_router
+from context_assembler import rolling_summaries
+from memory_index import memory_index
+from item_index import item_index
+from logger import log, request_id
+from capture import CaptureMiddleware, traffic_capture
+from deadline import (
+    LISTEN_BUDGET,
+    DEADLINE_TTS_RESERVE,
+    DEADLINE_REPLY_RESERVE,
+    DEADLINE_MIN_STAGE,
+    annotate,
+    current_budget,
+    degrade,
+    read_timeout,
+    request_budget,
+    time_left,
+    too_late,
+    within,
+)
+import metrics
+from metrics import audio_bytes, register_source, span, timed, timed_response, traced
+from gemini_client import (
+    extract_important_info_async,
+    extract_with_model_async,
+    generate_assistance_async,
+    generate_assistance_stream,
+    extract_and_reply_async,
+    fallback_phrase,
+    fallback_phrases,
+    fallback_reply,
+    quick_extraction,
+    warm_ollama,
+    is_active_stress,
+    summarize_history_async,
+    COMBINED_LLM_CALL,
+)
 
 load_dotenv()
 
-print("API key loaded:", bool(os.getenv("ELEVENLABS_API_KEY")))
+log.info("startup", "API key loaded", elevenlabs=bool(os.getenv("ELEVENLABS_API_KEY")))
 
-app = FastAPI()
-
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-VOICE_ID = "TxGEqnHWrfWFTfGW9XjX"
 DEFAULT_USER = os.getenv("PRESAGE_USER", "alice")
+IS_THERE_PROMPT = "Are you still there? I can't see you."
+# Stream the /listen reply sentence by sentence, overlapping TTS with generation
+SENTENCE_PIPELINING = os.getenv("SENTENCE_PIPELINING", "false").lower() == "true"
+# Turns saved raw under deadline pressure are extracted this many seconds later, ENRICH_BATCH at a time
+ENRICH_DELAY = float(os.getenv("ENRICH_DELAY", "30"))
+ENRICH_BATCH = int(os.getenv("ENRICH_BATCH", "20"))
+
+# Fire-and-forget tasks (DB writes) must be referenced until done or asyncio may drop them
+_background_tasks = set()
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index creation is idempotent; run it off the event loop so a slow Mongo doesn't block startup
+    _spawn(asyncio.to_thread(ensure_indexes))
+    # Pre-warm the TTS cache with fixed phrases without delaying startup
+    _spawn(prewarm([IS_THERE_PROMPT] + fallback_phrases(DEFAULT_USER)))
+    # Load the model (and the fixed session prompt) before the first request needs it
+    _spawn(warm_ollama(DEFAULT_USER))
+    start_persistence()
+    if extraction_cache is not None:
+        _spawn(asyncio.to_thread(extraction_cache.load))
+    if rolling_summaries is not None:
+        _spawn(asyncio.to_thread(rolling_summaries.load, DEFAULT_USER))
+    if memory_index is not None:
+        _spawn(asyncio.to_thread(memory_index.load))
+    if item_index is not None:
+        _spawn(asyncio.to_thread(item_index.rebuild))
+    # Pick up raw-saved turns a previous run didn't get to
+    _schedule_enrichment()
+    yield
+    await asyncio.to_thread(stop_persistence)
+    await asyncio.to_thread(close_persistence)
+    if memory_index is not None:
+        await asyncio.to_thread(memory_index.close)
+    await aclose_all()
+    if traffic_capture is not None:
+        await asyncio.to_thread(traffic_capture.close)
+    await asyncio.to_thread(log.close)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _stats_source(component):
+    # Components switched off by their env flag are None and export nothing
+    return lambda: component.stats() if component is not None else None
+
+
+register_source("context_cache", _stats_source(recent_context))
+register_source("event_writer", _stats_source(event_writer))
+register_source("event_journal", _stats_source(journal_replayer))
+register_source("tts_cache", _stats_source(audio_cache))
+register_source("extraction_cache", _stats_source(extraction_cache))
+register_source("reply_cache", _stats_source(reply_cache))
+register_source("ollama_sessions", _stats_source(ollama_sessions))
+register_source("llm", _stats_source(llm_router))
+register_source("llm_json", json_stats.snapshot)
+register_source("rolling_summaries", _stats_source(rolling_summaries))
+register_source("memory_index", _stats_source(memory_index))
+register_source("item_index", _stats_source(item_index))
+register_source("log", log.stats)
+register_source("capture", _stats_source(traffic_capture))
+
+if traffic_capture is not None:
+    # Added before the request-id middleware so it runs inside it and sees the id
+    app.add_middleware(CaptureMiddleware, capture=traffic_capture)
+
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Tag every log line of a request (and its background tasks) with one id."""
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex[:12]
+    token = request_id.set(rid)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id.reset(token)
+    response.headers["X-Request-ID"] = rid
+    return response
 
 class Vitals(BaseModel):
     heart_rate: int = None
@@ -29,66 +172,107 @@ class VoiceData(BaseModel):
     text: str
     vitals: Vitals = None
 
+class ContextInvalidation(BaseModel):
+    user: str = None
+
 @app.get("/")
 def read_root():
     return {"status": "Server is ONLINE and ready for signals."}
 
+@app.post("/context/invalidate")
+def context_invalidate(data: ContextInvalidation):
+    """Hook for writes made outside this process (dashboard edit/delete).
+
+    Drops the cached recent context (and Ollama sessions) for `user`, or for everyone if omitted,
+    and re-indexes their memories and items.
+    """
+    invalidate_context(data.user)
+    # Sessions hold the old history inside the model context
+    ollama_sessions.reset(data.user)
+    if memory_index is not None:
+        # Deleted or edited events must stop coming back as memories
+        memory_index.invalidate(data.user)
+    if item_index is not None:
+        # ...and as "where is X" answers
+        item_index.rebuild(data.user)
+    return {"status": "ok"}
+
+@app.get("/rules/agreement")
+def rules_agreement():
+    """Per-field agreement of the rule extractor with the LLM (RULE_EXTRACTOR_MODE=shadow)."""
+    return agreement_report()
+
+@app.get("/llm/json-stats")
+def llm_json_stats():
+    """How model JSON output was recovered: native, scanned out of text, failed, fallbacks."""
+    return json_stats.snapshot()
+
+@app.get("/llm/backends")
+def llm_backends():
+    """Backend order, circuit states, concurrency and coalescing/failover/hedge counters."""
+    return llm_router.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage latency histograms (p50/p95/p99), error/fallback/audio counters and component stats."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/listennah")
 def receive_voice(data: VoiceData):
-    print("------------------------------------------------")
-    print(f"🎤 IPHONE SAID: {data.text}")
-    print("------------------------------------------------")
+    log.info("listen", f"🎤 IPHONE SAID: {data.text}")
 
     stress_detected = False
     if data.vitals and data.vitals.stress_detected:
         stress_detected = True
-        print("                     ⚠️  STRESS/DEMENTIA EPISODE DETECTED - Using calming approach")
-        print("                 ")
-        print("------------------------------------------------")
+        log.warning("listen", "⚠️  STRESS/DEMENTIA EPISODE DETECTED - Using calming approach")
 
 @app.post("/listenold")
-def receive_voice(data: VoiceData):
-    print("------------------------------------------------")
-    print(f"🎤 IPHONE SAID: {data.text}")
-    print("------------------------------------------------")
+async def receive_voice(data: VoiceData):
+    log.info("listen", f"🎤 IPHONE SAID: {data.text}")
 
     # 1. Ask ElevenLabs to speak the user's text (Echo)
     # You can change 'data.text' to any response string you want the AI to say
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}"
-    
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": ELEVENLABS_API_KEY
-    }
-    
-    payload = {
-        "text": f"You said: {data.text}", # Adding prefix so you know it's working
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5}
-    }
+    def on_error(status_code, error_text):
+        log.error("tts", f"❌ ElevenLabs Error: {error_text}")
+        return {"status": "error", "message": "Failed to generate audio"}
 
-    print("🗣️ Generating Audio with ElevenLabs...")
-    response = requests.post(url, json=payload, headers=headers)
+    log.info("tts", "🗣️ Generating Audio with ElevenLabs...")
+    # Adding prefix so you know it's working
+    return await speak_response(f"You said: {data.text}", on_error)
 
-    if response.status_code == 200:
-        print("✅ Audio received! Streaming to iPhone...")
-        return Response(content=response.content, media_type="audio/mpeg")
-    else:
-        print(f"❌ ElevenLabs Error: {response.text}")
-        return {"status": "error", "message": "Failed to generate audio"}
+def _save_event_logged(user: str, info: dict):
+    """save_event wrapper for background use - failures are reported, never raised."""
+    try:
+        doc_id = save_event(user, info)
+        log.info("db", "✅ Saved to database", id=str(doc_id))
+        return doc_id
+    except Exception as e:
+        log.error("db", f"❌ Database save failed: {e}")
+        # Continue even if DB save fails
+        return None
 
-@app.post("/listen")
-def receive_voice(data: VoiceData):
-    print("------------------------------------------------")
-    print(f"🎤 IPHONE SAID: {data.text}")
-    print("------------------------------------------------")
-
-    # 1. Send to Gemini to extract important info and create bullet points
-    print("🧠 Processing with Gemini...")
-    extracted_info = extract_important_info(data.text)
-    print(f"📊 EXTRACTED INFO: {extracted_info}")
-    
+
+def _search_memories(user: str, message: str) -> list:
+    """Older events relevant to `message` from the memory index ([] when it is off)."""
+    if memory_index is None:
+        return []
+    try:
+        return memory_index.search(user, message)
+    except Exception as e:
+        log.warning("memory", f"⚠️  Memory search failed: {e}")
+        return []
+
+
+def _get_context_safe(user: str, limit: int) -> list:
+    try:
+        return get_context_for_user(user, limit=limit)
+    except Exception as e:
+        log.warning("db", f"⚠️  Could not retrieve context from DB: {e}")
+        return []  # Use empty context if DB fails
+
+
+def _record_event(data: VoiceData, extracted_info: dict) -> dict:
+    """Add the dashboard fields to extracted_info and save it in the background."""
     # Add original_message to extracted_info so frontend can access it
     extracted_info["original_message"] = data.text
     
@@ -99,113 +283,423 @@ def receive_voice(data: VoiceData):
     else:
         extracted_info["stress_detected"] = False
     
-    # 2. Save the extracted info to MongoDB
-    try:
-        print("💾 Saving to MongoDB...")
-        doc_id = save_event(DEFAULT_USER, extracted_info)
-        print(f"✅ Saved to database with ID: {doc_id}")
-    except Exception as e:
-        print(f"❌ Database save failed: {e}")
-        # Continue even if DB save fails
-    
-    # 3. Generate a summary response using Gemini
-    print("✨ Generating Gemini response...")
-    # Get recent context for more informed responses
-    try:
-        context = get_context_for_user(DEFAULT_USER, limit=5)
-    except Exception as e:
-        print(f"⚠️  Could not retrieve context from DB: {e}")
-        context = []  # Use empty context if DB fails
-    
-    # Check if user is experiencing stress/dementia episode
-    stress_detected = False
-    if data.vitals and data.vitals.stress_detected:
-        stress_detected = True
-        print("                     ⚠️  STRESS/DEMENTIA EPISODE DETECTED - Using calming approach")
-        print("                 ")
-        print("------------------------------------------------")
-        
-    
-    context_info = {
+    # Save the extracted info to MongoDB in the background - the reply doesn't wait on it
+    _spawn(asyncio.to_thread(_save_event_logged, DEFAULT_USER, dict(extracted_info)))
+    _note_event()
+    return extracted_info
+
+
+async def _record_fast_path_event(data: VoiceData):
+    """Extract and save a turn that was answered without the LLM reply."""
+    _record_event(data, await extract_important_info_async(data.text))
+
+
+def _note_event():
+    """Refresh the rolling summary in the background every SUMMARY_REFRESH_EVERY events."""
+    if rolling_summaries is not None and rolling_summaries.note_event(DEFAULT_USER):
+        _spawn(rolling_summaries.refresh(
+            DEFAULT_USER, lambda previous, events: summarize_history_async(DEFAULT_USER, previous, events)
+        ))
+
+
+def _build_context_info(data: VoiceData, context: list, extracted_info: dict, stress_detected: bool,
+                        memories: list = None) -> dict:
+    return {
         "user": DEFAULT_USER,
         "recent_events": context,
+        "memories": memories or [],
         "total_events": len(context),
+        "summary": rolling_summaries.get(DEFAULT_USER) if rolling_summaries is not None else "",
         "current_message": data.text,
         "extracted": extracted_info,
         "stress_detected": stress_detected,
         "vitals": data.vitals.dict() if data.vitals else None
     }
-    
-    gemini_message = generate_assistance(DEFAULT_USER, context_info)
-    print(f"💬 GEMINI SAYS: {gemini_message}")
-    
-    # 4. Send Gemini's response to ElevenLabs for TTS
-    print("🗣️ Generating Audio with ElevenLabs...")
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}"
-    
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": ELEVENLABS_API_KEY
-    }
-    
-    payload = {
-        "text": gemini_message,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5}
-    }
 
-    response = requests.post(url, json=payload, headers=headers)
 
-    if response.status_code == 200:
-        print("✅ Audio received! Streaming to iPhone...")
-        return Response(content=response.content, media_type="audio/mpeg")
+def _listen_tts_error(status_code, error_details):
+    log.error("tts", f"❌ ElevenLabs Error (Status {status_code}): {error_details}")
+    # Return error with more details for debugging
+    return Response(
+        content=json.dumps({
+            "status": "error",
+            "message": "Failed to generate audio",
+            "elevenlabs_status": status_code,
+            "elevenlabs_error": error_details
+        }),
+        media_type="application/json",
+        status_code=500
+    )
+
+
+# Past events the reply prompt sees; the reply-cache key looks further back, past repeats
+PROMPT_HISTORY = 4
+HISTORY_READ = max(PROMPT_HISTORY, REPLY_KEY_LOOKBACK) if reply_cache is not None else PROMPT_HISTORY
+
+
+def _reply_key(context_info: dict, history: list):
+    """Reply-cache key for this turn (`history` newest first), or None when the cache is off."""
+    if reply_cache is None:
+        return None
+    return reply_key(
+        DEFAULT_USER,
+        context_info["current_message"],
+        is_active_stress(context_info),
+        history,
+    )
+
+
+def _remember_reply(key, message: str, reply: str):
+    # Fallback lines mean generation failed - don't pin them for the whole TTL
+    if key is not None and reply not in fallback_phrases(DEFAULT_USER):
+        reply_cache.put(key, message, reply)
+
+
+def _cached_fallback_audio(message: str):
+    """Pre-warmed audio of a fallback phrase, or None if none is cached."""
+    # The phrase matching the message first, then any other one that's cached
+    preferred = fallback_phrase(DEFAULT_USER, message)
+    for phrase in sorted(fallback_phrases(DEFAULT_USER), key=lambda phrase: phrase != preferred):
+        audio = cached_audio(phrase)
+        if audio is not None:
+            log.info("reply", f"💬 Out of time - saying: {phrase}")
+            audio_bytes.inc(len(audio), source="tts_cache")
+            return audio
+    return None
+
+
+def _fallback_audio(message: str):
+    """Fallback audio response for when synthesis can't finish in time."""
+    audio = _cached_fallback_audio(message)
+    if audio is not None:
+        return Response(content=audio, media_type="audio/mpeg")
+    degrade("tts", "no_audio")
+    return Response(
+        content=json.dumps({"status": "error", "message": "Ran out of time to generate audio"}),
+        media_type="application/json",
+        status_code=504
+    )
+
+
+async def _speak_reply(reply: str, key, message: str):
+    """TTS the reply within the deadline; buffered audio is kept with the cached reply for next time."""
+    # Cached audio is served at once, so only real synthesis is bounded
+    timeout = None if has_cached_audio(reply) else time_left()
+    response = await _within_budget("tts", lambda: speak_response(reply, _listen_tts_error), timeout, None)
+    if response is None:
+        return _fallback_audio(message)
+    if key is not None and type(response) is Response and response.media_type == "audio/mpeg":
+        reply_cache.attach_audio(key, response.body)
+    return response
+
+
+async def _cached_reply_response(key, message: str):
+    """Response for a repeated question within the reply-cache window, or None."""
+    entry = reply_cache.get(key) if key is not None else None
+    if entry is None:
+        return None
+    log.info("reply", f"⚡ Repeat question - reusing reply: {entry['text']}")
+    if entry["audio"] is not None:
+        audio_bytes.inc(len(entry["audio"]), source="reply_cache")
+        return Response(content=entry["audio"], media_type="audio/mpeg")
+    return await _speak_reply(entry["text"], key, message)
+
+
+async def _collect_reply(sentences, key, message: str):
+    """Pass sentences through and cache the joined reply once the stream completes."""
+    spoken = []
+    async for sentence in sentences:
+        spoken.append(sentence)
+        yield sentence
+    _remember_reply(key, message, " ".join(spoken))
+
+
+def _raw_extraction(message: str) -> dict:
+    """What is saved when extraction is skipped: the text, flagged for _enrich_pending."""
+    return {"raw": message, "intent": "note", "needs_enrichment": True}
+
+
+async def _within_budget(stage: str, start, timeout, fallback):
+    """Run the /listen stage `start()` within `timeout` (None = no deadline); `fallback` if time runs short.
+
+    `start` makes the coroutine, so a stage skipped outright is never created.
+    """
+    if too_late(timeout):
+        degrade(stage, "budget")
+        return fallback
+    try:
+        return await within(start(), timeout)
+    except asyncio.TimeoutError:
+        degrade(stage, "timeout")
+        return fallback
+
+
+async def _extract_within(message: str, timeout) -> dict:
+    """Extraction for /listen, or the raw text flagged for later enrichment when time runs short."""
+    # Cached and rule-based extractions cost nothing, so they never count as skipping.
+    # Looked up once here, so the model call below doesn't record a second cache miss.
+    quick = quick_extraction(message)
+    if quick is not None:
+        return quick
+    extracted = await _within_budget(
+        "extract", lambda: traced("listen.extract", extract_with_model_async(message)), timeout, None
+    )
+    if extracted is None:
+        _schedule_enrichment()
+        return _raw_extraction(message)
+    return extracted
+
+
+async def _generate_within(context_info: dict, timeout) -> str:
+    """Reply for /listen, or the keyword fallback (whose audio is pre-warmed) when time runs short."""
+    with span("listen.generate"):
+        reply = await _within_budget(
+            "generate", lambda: generate_assistance_async(DEFAULT_USER, context_info), timeout, None
+        )
+    return reply if reply is not None else fallback_reply(DEFAULT_USER, context_info["current_message"])
+
+
+def _pipelined_tts_timeout(budget, message: str):
+    """on_timeout for speak_sentences_response: record it; fallback audio if nothing was said yet."""
+    def on_timeout(spoken: int):
+        degrade("tts", "timeout", budget)
+        if spoken:
+            return None
+        audio = _cached_fallback_audio(message)
+        if audio is None:
+            degrade("tts", "no_audio", budget)
+        return audio
+    return on_timeout
+
+
+async def _primed(chunks):
+    """Wait for the first chunk of a stream, so what degraded on the way is in the headers."""
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def stream():
+        try:
+            if first is not None:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            await chunks.aclose()
+    return stream()
+
+
+async def _sentences_within(sentences, budget, message: str):
+    """Pipelined reply cut off where the deadline leaves only DEADLINE_TTS_RESERVE.
+
+    A first sentence that doesn't arrive in time becomes the keyword fallback.
+    The budget is passed in because the stream outlives the request handler.
+    """
+    spoken = 0
+    try:
+        while True:
+            timeout = budget.remaining() - DEADLINE_TTS_RESERVE
+            sentence, reason = None, "budget"
+            if timeout >= DEADLINE_MIN_STAGE:
+                try:
+                    sentence = await asyncio.wait_for(sentences.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    reason = "timeout"
+            if sentence is None:
+                if spoken == 0:
+                    degrade("generate", reason, budget)
+                    yield fallback_reply(DEFAULT_USER, message)
+                else:
+                    degrade("generate", "truncated", budget)
+                return
+            spoken += 1
+            yield sentence
+    finally:
+        await sentences.aclose()
+
+
+_enrichment = None
+_enrichment_wanted = False
+
+
+def _schedule_enrichment():
+    """Run _enrich_pending in ENRICH_DELAY seconds (again, if a run is already going)."""
+    global _enrichment, _enrichment_wanted
+    _enrichment_wanted = True
+    if _enrichment is None or _enrichment.done():
+        _enrichment = _spawn(_enrich_pending())
+
+
+async def _enrich_pending():
+    """Wait ENRICH_DELAY, enrich, and repeat while turns keep being degraded."""
+    global _enrichment_wanted
+    while _enrichment_wanted:
+        _enrichment_wanted = False
+        await asyncio.sleep(ENRICH_DELAY)
+        await _enrich_batches()
+
+
+async def _enrich_batches():
+    """Extract the events degraded /listen turns saved raw, once the LLM has time again."""
+    while True:
+        try:
+            pending = await asyncio.to_thread(events_needing_enrichment, ENRICH_BATCH)
+        except Exception as e:
+            log.warning("db", f"⚠️  Could not load events to enrich: {e}")
+            return
+        enriched = 0
+        for doc in pending:
+            info = doc.get("info") or {}
+            message = info.get("original_message") or info.get("raw", "")
+            extracted = await extract_important_info_async(message)
+            if extracted == {"raw": message, "intent": "note"}:
+                extracted = None  # the model failed again - count the attempt, retry next run
+            try:
+                await asyncio.to_thread(enrich_event, doc, extracted)
+            except Exception as e:
+                log.warning("db", f"⚠️  Could not store enrichment: {e}")
+                return
+            enriched += extracted is not None
+        if pending:
+            log.info("extraction", f"🧩 Enriched {enriched}/{len(pending)} raw-saved event(s)")
+        if len(pending) < ENRICH_BATCH or not enriched:
+            return
+
+
+@app.post("/listen")
+@timed("listen")
+@timed_response("listen.total")
+async def receive_voice(data: VoiceData):
+    # Every stage below sees the time left of one end-to-end budget (LISTEN_BUDGET)
+    with request_budget(LISTEN_BUDGET) as budget:
+        return annotate(await _listen(data), budget)
+
+
+async def _listen(data: VoiceData):
+    log.info("listen", f"🎤 IPHONE SAID: {data.text}")
+
+    # Check if user is experiencing stress/dementia episode
+    stress_detected = False
+    if data.vitals and data.vitals.stress_detected:
+        stress_detected = True
+        log.warning("listen", "⚠️  STRESS/DEMENTIA EPISODE DETECTED - Using calming approach")
+
+    if item_index is not None and not stress_detected:
+        # "Where are my keys?" - answered straight from the item index when it knows
+        with span("listen.item_index"):
+            answer = item_index.answer(DEFAULT_USER, DEFAULT_USER, data.text)
+        if answer is not None:
+            log.info("reply", f"🗂️  Answered from the item index: {answer}")
+            _spawn(_record_fast_path_event(data))
+            with span("listen.tts"):
+                return await _speak_reply(answer, None, data.text)
+
+    if COMBINED_LLM_CALL:
+        # 1-3. One Gemini call returns both the extracted info and the reply,
+        # so the history has to be loaded first. The current turn goes on top.
+        # The reads are cheap (cached), so they get a fixed slice instead of sharing the reserves
+        context, memories = await asyncio.gather(
+            _within_budget("context", lambda: traced(
+                "listen.context", asyncio.to_thread(_get_context_safe, DEFAULT_USER, HISTORY_READ)), read_timeout(), []),
+            _within_budget("memories", lambda: traced(
+                "listen.memories", asyncio.to_thread(_search_memories, DEFAULT_USER, data.text)), read_timeout(), []),
+        )
+        history, context = context, context[:PROMPT_HISTORY]
+        current_event = {"info": {"raw": data.text, "stress_detected": stress_detected}, "ts": datetime.utcnow()}
+        context_info = _build_context_info(data, [current_event] + context, {}, stress_detected, memories)
+        key = _reply_key(context_info, history)
+        cached = await _cached_reply_response(key, data.text)
+        if cached is not None:
+            # Repeat question: the (usually cached) extraction and the event are done in the background
+            _spawn(_record_fast_path_event(data))
+            return cached
+        log.debug("listen", "🧠 Extracting and replying with one Gemini call...")
+        with span("listen.combined"):
+            combined = await _within_budget(
+                "combined", lambda: extract_and_reply_async(DEFAULT_USER, context_info),
+                time_left(DEADLINE_TTS_RESERVE), None,
+            )
+        if combined is not None:
+            extracted_info, gemini_message = combined
+        else:
+            extracted_info = quick_extraction(data.text)
+            if extracted_info is None:
+                extracted_info = _raw_extraction(data.text)
+                _schedule_enrichment()
+            gemini_message = fallback_reply(DEFAULT_USER, data.text)
+        if log.wants("extraction"):
+            log.debug("extraction", "📊 EXTRACTED INFO", info=dict(extracted_info))
+        _record_event(data, extracted_info)
     else:
-        error_details = response.text
-        print(f"❌ ElevenLabs Error (Status {response.status_code}): {error_details}")
-        # Return error with more details for debugging
-        return Response(
-            content=json.dumps({
-                "status": "error",
-                "message": "Failed to generate audio",
-                "elevenlabs_status": response.status_code,
-                "elevenlabs_error": error_details
-            }),
-            media_type="application/json",
-            status_code=500
+        # 1. Extract important info with Gemini while the recent context loads from MongoDB.
+        # The current turn isn't in the DB yet, so fetch one fewer and prepend it below.
+        # With a deadline, extraction must leave time for the reply and its audio; the
+        # cheap (cached) reads get a fixed slice instead of sharing those reserves.
+        log.debug("listen", "🧠 Processing with Gemini...")
+        extracted_info, context, memories = await asyncio.gather(
+            _extract_within(data.text, time_left(DEADLINE_REPLY_RESERVE + DEADLINE_TTS_RESERVE)),
+            _within_budget("context", lambda: traced(
+                "listen.context", asyncio.to_thread(_get_context_safe, DEFAULT_USER, HISTORY_READ)), read_timeout(), []),
+            _within_budget("memories", lambda: traced(
+                "listen.memories", asyncio.to_thread(_search_memories, DEFAULT_USER, data.text)), read_timeout(), []),
         )
+        if log.wants("extraction"):
+            log.debug("extraction", "📊 EXTRACTED INFO", info=dict(extracted_info))
+        
+        # 2. Save the extracted info to MongoDB (in the background)
+        _record_event(data, extracted_info)
+        history, context = context, context[:PROMPT_HISTORY]
+        context = [{"info": extracted_info, "ts": datetime.utcnow()}] + context
+        
+        # 3. Generate a summary response using Gemini (unless this question was just answered)
+        context_info = _build_context_info(data, context, extracted_info, stress_detected, memories)
+        key = _reply_key(context_info, history)
+        cached = await _cached_reply_response(key, data.text)
+        if cached is not None:
+            return cached
+        log.debug("listen", "✨ Generating Gemini response...")
+        
+        if SENTENCE_PIPELINING:
+            log.debug("listen", "🗣️ Pipelining Gemini sentences into ElevenLabs...")
+            sentences = generate_assistance_stream(DEFAULT_USER, context_info)
+            if key is not None:
+                sentences = _collect_reply(sentences, key, data.text)
+            budget = current_budget()
+            if budget is None:
+                return speak_sentences_response(sentences)
+            # Outside _collect_reply, so a cut-off reply is never cached
+            sentences = _sentences_within(sentences, budget, data.text)
+            response = speak_sentences_response(sentences, budget.remaining, _pipelined_tts_timeout(budget, data.text))
+            # Headers go out with the first audio, so a late first sentence shows in X-Degraded
+            response.body_iterator = await _primed(response.body_iterator)
+            return response
+
+        gemini_message = await _generate_within(context_info, time_left(DEADLINE_TTS_RESERVE))
+    log.info("reply", f"💬 GEMINI SAYS: {gemini_message}")
+    _remember_reply(key, data.text, gemini_message)
+    
+    # 4. Send Gemini's response to ElevenLabs for TTS
+    log.debug("tts", "🗣️ Generating Audio with ElevenLabs...")
+    with span("listen.tts"):
+        return await _speak_reply(gemini_message, key, data.text)
 
 @app.post("/is-there")
-def is_there():
+@timed("is_there")
+async def is_there():
     """Checks if user is present (triggered by face loss)."""
-    print("\n------------------------------------------------")
-    print("⚠️  FACE LOST DETECTED - Checking in...")
-    print("------------------------------------------------")
+    log.info("presence", "⚠️  FACE LOST DETECTED - Checking in...")
     
-    text_to_say = "Are you still there? I can't see you."
+    text_to_say = IS_THERE_PROMPT
     
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}"
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": ELEVENLABS_API_KEY
-    }
-    payload = {
-        "text": text_to_say,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5}
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 200:
-        print("✅ sending 'Are you there' audio...")
-        return Response(content=response.content, media_type="audio/mpeg")
-    
-    return {"status": "error"}
+    log.debug("presence", "✅ sending 'Are you there' audio...")
+    return await speak_response(text_to_say, lambda status_code, error_text: {"status": "error"})
 
 @app.post("/speak")
-def speak(data: VoiceData):
+@timed("speak")
+async def speak(data: VoiceData):
     # Write data.text to MongoDB database
     # Normalize schema: use same structure as /listen endpoint
     event_data = {
@@ -214,38 +708,17 @@ def speak(data: VoiceData):
         "intent": "speak",
         "stress_detected": False  # Always include stress_detected for consistency
     }
-    save_event(DEFAULT_USER, event_data)
-    print(f"💾 Saved to DB: {data.text[:50]}...")
-    
-    response = requests.post(
-        f"https://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}",
-        headers={
-            "xi-api-key": ELEVENLABS_API_KEY,
-            "Content-Type": "application/json",
-            "Accept": "audio/mpeg"
-        },
-        json={
-            "text": data.text,
-            "model_id": "eleven_multilingual_v2", 
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
-        }
-    )
+    # Saved in the background like /listen - the audio doesn't wait on MongoDB
+    _spawn(asyncio.to_thread(_save_event_logged, DEFAULT_USER, event_data))
+    log.info("speak", f"💾 Saving to DB: {data.text[:50]}...")
+    _note_event()
 
-    if response.status_code != 200:
-        print("ElevenLabs status:", response.status_code)
-        print("ElevenLabs error:", response.text)
-        return {"error": response.text}
+    def on_error(status_code, error_text):
+        log.error("tts", f"❌ ElevenLabs Error (Status {status_code}): {error_text}")
+        return {"error": error_text}
 
-    return Response(
-        content=response.content,
-        media_type="audio/mpeg",
-        headers={
-            "Content-Length": str(len(response.content))
-        }
-    )
+    with span("speak.tts"):
+        return await speak_response(data.text, on_error)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,324 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from dotenv import load_dotenv
+from http_client import get_client
+from logger import log
+
+load_dotenv()
+
+# Embedding index over stored events so the reply prompt can include the few
+# older memories relevant to what the patient just asked, not only the latest turns.
+MEMORY_INDEX_ENABLED = os.getenv("MEMORY_INDEX_ENABLED", "false").lower() == "true"
+MEMORY_INDEX_PATH = os.getenv("MEMORY_INDEX_PATH", "memory_index.npz")
+# "hashing" runs offline with no model; "ollama" uses OLLAMA_EMBED_MODEL via /api/embed
+MEMORY_EMBEDDINGS = os.getenv("MEMORY_EMBEDDINGS", "hashing").lower()
+MEMORY_HASH_DIM = int(os.getenv("MEMORY_HASH_DIM", "256"))
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.2"))
+# Snapshot to disk after this many new events (and on shutdown)
+MEMORY_SNAPSHOT_EVERY = int(os.getenv("MEMORY_SNAPSHOT_EVERY", "100"))
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+_STOP_WORDS = {
+    "a", "an", "the", "i", "i'm", "me", "my", "mine", "you", "your", "we", "our", "it", "it's", "is", "are",
+    "was", "were", "be", "been", "am", "do", "did", "does", "to", "of", "in", "on", "at", "for", "and",
+    "or", "but", "so", "that", "this", "there", "here", "what", "where", "when", "who", "how", "can",
+    "could", "would", "will", "just", "have", "has", "had", "with", "about", "please", "oh", "um",
+}
+
+
+def _stem(word: str) -> str:
+    # Crude plural folding: keys/key, pills/pill
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word pairs - no model, no network."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, text: str) -> list:
+        words = [_stem(w) for w in _TOKEN.findall(text.lower().replace("’", "'")) if w not in _STOP_WORDS]
+        return [(w, 1.0) for w in words] + [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                matrix[row, h % self.dim] += weight if h >> 63 else -weight
+        return _normalize(matrix)
+
+
+class OllamaEmbedder:
+    """Embeddings from the local Ollama server (e.g. nomic-embed-text)."""
+
+    def __init__(self, base_url: str, model: str):
+        self.url = f"{base_url}/api/embed"
+        self.model = model
+        self.name = f"ollama:{model}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        response = get_client("ollama").post(self.url, json={"model": self.model, "input": texts})
+        response.raise_for_status()
+        return _normalize(np.asarray(response.json()["embeddings"], dtype=np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def event_text(doc: dict) -> str:
+    info = doc.get("info") or {}
+    return info.get("raw") or info.get("notes") or info.get("original_message", "")
+
+
+def _epoch(ts) -> float:
+    return ts.replace(tzinfo=timezone.utc).timestamp() if ts else 0.0
+
+
+class MemoryIndex:
+    """Row-per-event matrix of unit vectors; search is one matrix-vector product."""
+
+    def __init__(self, embedder, path: str, snapshot_every: int):
+        self.embedder = embedder
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._count = 0
+        self._ids = []
+        self._id_set = set()
+        self._users = np.zeros(0, dtype=object)
+        self._meta = []      # per row: {"text", "ts", "stress"}
+        self._unsaved = 0
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        # Embedding can be an HTTP call, so saved events are indexed off the save path
+        self._indexer = ThreadPoolExecutor(max_workers=1)
+        self._save_lock = threading.Lock()
+        self.ready = False
+
+    def _grow(self, needed: int, dim: int):
+        capacity = self._vectors.shape[0]
+        if self._vectors.shape[1] != dim:
+            if self._count:
+                raise ValueError(f"embedding size changed from {self._vectors.shape[1]} to {dim}")
+            self._vectors = np.zeros((max(needed, 64), dim), dtype=np.float32)
+            self._users = np.zeros(self._vectors.shape[0], dtype=object)
+            return
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        vectors = np.zeros((new_capacity, dim), dtype=np.float32)
+        vectors[:self._count] = self._vectors[:self._count]
+        users = np.zeros(new_capacity, dtype=object)
+        users[:self._count] = self._users[:self._count]
+        self._vectors, self._users = vectors, users
+
+    def add_many(self, docs: list) -> int:
+        """Index stored event documents (with _id, user, info, ts); returns how many were new."""
+        docs = [d for d in docs if str(d["_id"]) not in self._id_set and event_text(d)]
+        if not docs:
+            return 0
+        vectors = self.embedder.embed([event_text(d) for d in docs])
+        with self._lock:
+            added = 0
+            self._grow(self._count + len(docs), vectors.shape[1])
+            for doc, vector in zip(docs, vectors):
+                doc_id = str(doc["_id"])
+                if doc_id in self._id_set:
+                    continue
+                self._vectors[self._count] = vector
+                self._users[self._count] = doc.get("user", "")
+                self._ids.append(doc_id)
+                self._id_set.add(doc_id)
+                info = doc.get("info") or {}
+                self._meta.append({
+                    "text": event_text(doc),
+                    "ts": _epoch(doc.get("ts")),
+                    "stress": bool(info.get("stress_detected", False)),
+                })
+                self._count += 1
+                added += 1
+            self._unsaved += added
+            due = self._unsaved >= self.snapshot_every
+        if due:
+            self._writer.submit(self.save)
+        return added
+
+    def add(self, doc: dict):
+        """Index one saved event in the background."""
+        self._indexer.submit(self._add_logged, doc)
+
+    def _add_logged(self, doc: dict):
+        try:
+            self.add_many([doc])
+        except Exception as e:
+            log.warning("memory", f"⚠️  Could not index event for memory search: {e}")
+
+    def invalidate(self, user: str = None):
+        """Re-index one user's events (or everyone's) after edits or deletes made outside this process."""
+        self._indexer.submit(self._reindex, user)
+
+    def _reindex(self, user: str = None):
+        with self._lock:
+            n = self._count
+            keep = [i for i in range(n) if user is not None and self._users[i] != user]
+            self._vectors[:len(keep)] = self._vectors[keep]
+            self._users[:len(keep)] = self._users[keep]
+            self._ids = [self._ids[i] for i in keep]
+            self._id_set = set(self._ids)
+            self._meta = [self._meta[i] for i in keep]
+            self._count = len(keep)
+        try:
+            self._index_events({"user": user} if user is not None else {})
+        except Exception as e:
+            log.warning("memory", f"⚠️  Could not re-index memories: {e}")
+            return
+        self.save()
+        log.info("memory", f"🧠 Memory index re-indexed {user or 'all users'}: {self._count} events")
+
+    def search(self, user: str, query: str, k: int = MEMORY_TOP_K, min_score: float = MEMORY_MIN_SCORE) -> list:
+        """Up to `k` of `user`'s events most similar to `query`, as context events (best first).
+
+        Repeats of the same sentence count once.
+        """
+        if not self.ready or not query.strip():
+            return []
+        q = self.embedder.embed([query])[0]
+        with self._lock:
+            n = self._count
+            if n == 0 or self._vectors.shape[1] != q.shape[0]:
+                return []
+            scores = self._vectors[:n] @ q
+            scores[self._users[:n] != user] = -1.0
+            # Over-fetch so repeated sentences don't crowd out distinct memories
+            candidates = min(k * 4, n)
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            hits = []
+            texts = set()
+            for i in top:
+                if scores[i] < min_score or len(hits) == k:
+                    break
+                if self._meta[i]["text"] not in texts:
+                    texts.add(self._meta[i]["text"])
+                    hits.append((float(scores[i]), self._meta[i]))
+        return [
+            {
+                "info": {"raw": meta["text"], "stress_detected": meta["stress"]},
+                "ts": datetime.fromtimestamp(meta["ts"], timezone.utc).replace(tzinfo=None) if meta["ts"] else None,
+                "score": round(score, 3),
+            }
+            for score, meta in hits
+        ]
+
+    def save(self):
+        """Write a snapshot (atomic rename) - safe to call from any thread."""
+        with self._save_lock:
+            self._save()
+
+    def _save(self):
+        with self._lock:
+            n = self._count
+            vectors = self._vectors[:n].copy()
+            meta = {
+                "embedder": self.embedder.name,
+                "ids": list(self._ids),
+                "users": list(self._users[:n]),
+                "rows": list(self._meta),
+            }
+            self._unsaved = 0
+        tmp_path = self.path + ".tmp.npz"
+        try:
+            np.savez(tmp_path, vectors=vectors, meta=np.array(json.dumps(meta)))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning("memory", f"⚠️  Could not save memory index snapshot: {e}")
+
+    def load(self):
+        """Load the snapshot, or rebuild from the events collection if there is none
+        (or it was built with a different embedder). Blocking; run at startup."""
+        try:
+            if os.path.exists(self.path):
+                with np.load(self.path, allow_pickle=False) as snapshot:
+                    meta = json.loads(str(snapshot["meta"]))
+                    vectors = snapshot["vectors"]
+                if meta["embedder"] == self.embedder.name:
+                    with self._lock:
+                        self._grow(len(meta["ids"]), vectors.shape[1] if vectors.size else 1)
+                        for i, doc_id in enumerate(meta["ids"]):
+                            if doc_id in self._id_set:
+                                continue
+                            self._vectors[self._count] = vectors[i]
+                            self._users[self._count] = meta["users"][i]
+                            self._ids.append(doc_id)
+                            self._id_set.add(doc_id)
+                            self._meta.append(meta["rows"][i])
+                            self._count += 1
+                    # Events saved after the last snapshot (up to MEMORY_SNAPSHOT_EVERY - 1 of them)
+                    newest = max((row["ts"] for row in meta["rows"]), default=0.0)
+                    since = datetime.fromtimestamp(newest, timezone.utc).replace(tzinfo=None)
+                    caught_up = self._index_events({"ts": {"$gte": since}} if newest else {})
+                    self.ready = True
+                    log.info("memory", f"🧠 Memory index loaded: {self._count} events "
+                                       f"({caught_up} newer than the snapshot, {self.embedder.name})")
+                    return
+                log.info("memory", f"🧠 Memory index snapshot uses {meta['embedder']}, rebuilding for {self.embedder.name}")
+            self.rebuild()
+        except Exception as e:
+            log.warning("memory", f"⚠️  Could not load memory index: {e}")
+
+    def _index_events(self, query: dict, batch_size: int = 256) -> int:
+        """Index the stored events matching `query`; returns how many were new."""
+        from db import events
+        cursor = events.find(query, {"user": 1, "info.raw": 1, "info.notes": 1, "info.original_message": 1,
+                                     "info.stress_detected": 1, "ts": 1}).sort("ts", 1)
+        added = 0
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                added += self.add_many(batch)
+                batch = []
+        if batch:
+            added += self.add_many(batch)
+        return added
+
+    def rebuild(self):
+        """Index every stored event (idempotent - already indexed _ids are skipped)."""
+        self._index_events({})
+        self.ready = True
+        self.save()
+        log.info("memory", f"🧠 Memory index rebuilt: {self._count} events ({self.embedder.name})")
+
+    def close(self):
+        """Finish queued indexing and write a final snapshot - call on shutdown."""
+        self._indexer.shutdown(wait=True)
+        self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"events": self._count, "embedder": self.embedder.name, "ready": self.ready}
+
+
+def _make_embedder():
+    if MEMORY_EMBEDDINGS == "ollama":
+        return OllamaEmbedder(os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"), OLLAMA_EMBED_MODEL)
+    return HashingEmbedder(MEMORY_HASH_DIM)
+
+
+memory_index = None
+if MEMORY_INDEX_ENABLED:
+    memory_index = MemoryIndex(_make_embedder(), MEMORY_INDEX_PATH, MEMORY_SNAPSHOT_EVERY)
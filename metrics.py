@@ -0,0 +1,264 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from logger import log
+
+load_dotenv()
+
+# Per-stage latency histograms and counters, rendered in the Prometheus text
+# format by GET /metrics together with the stats() of the caches and queues.
+#   METRICS_WINDOW - most recent samples per stage used for p50/p95/p99
+METRICS_PREFIX = "presage_"
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = METRICS_PREFIX + name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_label_text(self.labels, key)} {_number(v)}" for key, v in values]
+        return lines
+
+
+class Histogram:
+    """Fixed buckets for Prometheus, plus a window of recent samples for quantiles."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS,
+                 window: int = METRICS_WINDOW):
+        self.name = METRICS_PREFIX + name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.window = window
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> {"counts", "sum", "count", "recent"}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "counts": [0] * len(self.buckets), "sum": 0.0, "count": 0, "recent": deque(maxlen=self.window),
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+            series["recent"].append(value)
+
+    def quantiles(self, **labels) -> dict:
+        """{0.5: ..., 0.95: ..., 0.99: ...} over the recent window ({} before any sample)."""
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            recent = sorted(series["recent"]) if series else []
+        return _quantiles(recent)
+
+    def render(self) -> list:
+        with self._lock:
+            series = {k: (list(s["counts"]), s["sum"], s["count"], sorted(s["recent"]))
+                      for k, s in sorted(self._series.items())}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count, _) in series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        # Quantiles are per process and over the last METRICS_WINDOW samples only
+        recent_name = self.name.replace("_seconds", "_recent_seconds")
+        lines += [f"# HELP {recent_name} {self.help} (last {self.window} samples)",
+                  f"# TYPE {recent_name} summary"]
+        for key, (_, _, _, recent) in series.items():
+            for q, v in _quantiles(recent).items():
+                quantile = f'quantile="{q}"'
+                lines.append(f"{recent_name}{_label_text(self.labels, key, quantile)} {_number(v)}")
+            lines.append(f"{recent_name}_sum{_label_text(self.labels, key)} {_number(sum(recent))}")
+            lines.append(f"{recent_name}_count{_label_text(self.labels, key)} {len(recent)}")
+        return lines
+
+
+def _quantiles(ordered: list) -> dict:
+    if not ordered:
+        return {}
+    return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+stage_seconds = Histogram("stage_seconds", "Latency of each request stage (a streamed reply's endpoint stage "
+                          "ends when the response starts; <stage>.total ends at its last byte)", ("stage",))
+errors = Counter("errors_total", "Stage failures (exceptions, upstream error replies)", ("stage",))
+fallbacks = Counter("fallbacks_total", "Canned or degraded answers used instead of model output", ("kind",))
+audio_bytes = Counter("audio_bytes_total", "Bytes of MP3 audio returned to the iPhone", ("source",))
+degradations = Counter("degradations_total", "Stages skipped or cut short to meet the request deadline",
+                       ("stage", "reason"))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block into stage_seconds{stage}; exceptions also count in errors_total.
+
+    Takes no awaits itself, so `with span(...)` works inside async code too.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        errors.inc(stage=stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage: str):
+    """Decorator form of `span` for plain and async functions."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_response(stage: str):
+    """Like `timed` for an async endpoint, but a streamed response is timed to its last chunk.
+
+    `timed` stops when the handler returns, which for a StreamingResponse is
+    before most of the body has been produced.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            response = await fn(*args, **kwargs)
+            body = getattr(response, "body_iterator", None)
+            if body is None:
+                stage_seconds.observe(time.perf_counter() - start, stage=stage)
+                return response
+
+            async def timed_body():
+                try:
+                    async for chunk in body:
+                        yield chunk
+                finally:
+                    stage_seconds.observe(time.perf_counter() - start, stage=stage)
+            response.body_iterator = timed_body()
+            return response
+        return wrapper
+    return decorate
+
+
+async def traced(stage: str, awaitable):
+    """Await `awaitable` inside a span - for work handed to asyncio.gather."""
+    with span(stage):
+        return await awaitable
+
+
+# name -> callable returning a stats() dict (or None when that component is off)
+_sources = {}
+
+
+def register_source(name: str, stats):
+    """Export a component's stats() dict as presage_<name>_<key> gauges."""
+    _sources[name] = stats
+
+
+def _flatten(prefix: str, stats: dict, labels: tuple = ()):
+    """Numbers become samples; nested dicts add a `key` label; strings are skipped."""
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, dict):
+            if all(isinstance(v, dict) for v in value.values()):
+                for child, child_stats in value.items():
+                    yield from _flatten(f"{prefix}_{key}", child_stats, labels + (child,))
+            else:
+                yield from _flatten(f"{prefix}_{key}", value, labels)
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}_{key}", labels, value
+
+
+def _render_sources() -> list:
+    samples = {}
+    for name, stats in sorted(_sources.items()):
+        try:
+            values = stats()
+        except Exception as e:
+            log.warning("metrics", f"⚠️  Metrics source {name} failed: {e}")
+            errors.inc(stage=f"metrics.{name}")
+            continue
+        if not values:
+            continue
+        for metric, labels, value in _flatten(METRICS_PREFIX + name, values):
+            samples.setdefault(metric, []).append((labels, value))
+    lines = []
+    for metric, values in sorted(samples.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        for labels, value in values:
+            label_text = _label_text(("key",), ("/".join(labels),)) if labels else ""
+            lines.append(f"{metric}{label_text} {_number(value)}")
+    return lines
+
+
+def render() -> str:
+    """Everything in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in (stage_seconds, errors, fallbacks, audio_bytes, degradations):
+        lines += metric.render()
+    lines += _render_sources()
+    return "\n".join(lines) + "\n"
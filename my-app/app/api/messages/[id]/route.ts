@@ -1,6 +1,7 @@
 import { type NextRequest, NextResponse } from "next/server"
 import clientPromise from "@/lib/mongodb"
 import { ObjectId } from "mongodb"
+import { notifyContextChanged } from "@/lib/backend"
 
 // DELETE endpoint - Delete a message by ID
 export async function DELETE(
@@ -19,12 +20,13 @@ export async function DELETE(
     const eventsCollection = db.collection("events")
 
     // Delete the event by _id
-    const result = await eventsCollection.deleteOne({ _id: new ObjectId(id) })
+    const deleted = await eventsCollection.findOneAndDelete({ _id: new ObjectId(id) })
 
-    if (result.deletedCount === 0) {
+    if (!deleted) {
       return NextResponse.json({ error: "Message not found" }, { status: 404 })
     }
 
+    await notifyContextChanged(deleted.user)
     console.log(`[API] Deleted message with ID: ${id}`)
     return NextResponse.json({ success: true, message: "Message deleted" })
   } catch (error: any) {
@@ -82,6 +84,7 @@ export async function PATCH(
       return NextResponse.json({ error: "Message not found" }, { status: 404 })
     }
 
+    await notifyContextChanged(existingEvent.user)
     console.log(`[API] Updated message with ID: ${id}`)
     
     // Return the updated message
@@ -0,0 +1,20 @@
+// Give up on an unreachable voice server instead of holding the dashboard request open
+const NOTIFY_TIMEOUT_MS = 2000
+
+// Tell the Python voice server that events changed outside of it, so it drops
+// its cached recent context. Best-effort: the dashboard write already succeeded.
+export async function notifyContextChanged(user?: string) {
+  const baseUrl = process.env.VOICE_SERVER_URL
+  if (!baseUrl) return
+
+  try {
+    await fetch(`${baseUrl}/context/invalidate`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(user ? { user } : {}),
+      signal: AbortSignal.timeout(NOTIFY_TIMEOUT_MS),
+    })
+  } catch (error) {
+    console.error("[API] Could not invalidate voice server context:", error)
+  }
+}
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-user Ollama conversation sessions. Each reply returns Ollama's `context`
+# (the evaluated tokens of that exchange); the next turn sends it back with only
+# the new message, so the instructions and history are not re-evaluated.
+OLLAMA_SESSION_MODE = os.getenv("OLLAMA_SESSION_MODE", "false").lower() == "true"
+# Start a fresh session after this many turns so the context stays inside num_ctx
+OLLAMA_SESSION_MAX_TURNS = int(os.getenv("OLLAMA_SESSION_MAX_TURNS", "6"))
+OLLAMA_SESSION_TTL = float(os.getenv("OLLAMA_SESSION_TTL", "1800"))  # seconds idle
+OLLAMA_SESSION_MAX_USERS = int(os.getenv("OLLAMA_SESSION_MAX_USERS", "100"))
+
+
+class SessionStore:
+    """LRU of session key -> {"context", "seen", "turns", "updated"}."""
+
+    def __init__(self, max_sessions: int, max_turns: int, ttl: float):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.started = 0
+
+    def get(self, key: str):
+        """Live session for `key`, or None if there is none or it is spent."""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            if session["turns"] >= self.max_turns or time.time() - session["updated"] >= self.ttl:
+                del self._sessions[key]
+                return None
+            self._sessions.move_to_end(key)
+            return {"context": session["context"], "seen": set(session["seen"]), "turns": session["turns"]}
+
+    def save(self, key: str, context: list, seen: set, turns: int):
+        with self._lock:
+            if turns == 1:
+                self.started += 1
+            else:
+                self.reused += 1
+            self._sessions.pop(key, None)
+            self._sessions[key] = {"context": context, "seen": seen, "turns": turns, "updated": time.time()}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def reset(self, user: str = None):
+        """Forget the sessions for `user` (all modes), or every session if omitted."""
+        with self._lock:
+            if user is None:
+                self._sessions.clear()
+                return
+            for key in [k for k in self._sessions if k.rsplit(":", 1)[0] == user]:
+                del self._sessions[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "started": self.started, "reused": self.reused}
+
+
+def session_key(user: str, active_stress: bool) -> str:
+    # Calming and normal replies use different instructions, so they can't share a context
+    return f"{user}:{'stress' if active_stress else 'normal'}"
+
+
+ollama_sessions = SessionStore(OLLAMA_SESSION_MAX_USERS, OLLAMA_SESSION_MAX_TURNS, OLLAMA_SESSION_TTL)
@@ -0,0 +1,112 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from extraction_cache import normalize_message
+
+load_dotenv()
+
+# Short-window cache of full replies (text + synthesized audio) for questions
+# the patient repeats within minutes.
+REPLY_CACHE_ENABLED = os.getenv("REPLY_CACHE_ENABLED", "true").lower() == "true"
+REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "200"))
+REPLY_CACHE_TTL = float(os.getenv("REPLY_CACHE_TTL", "600"))  # seconds
+# Replies to time-of-day questions get a much shorter life and never cross an hour boundary
+REPLY_CACHE_TIME_TTL = float(os.getenv("REPLY_CACHE_TIME_TTL", "60"))
+# The key covers the newest REPLY_KEY_HISTORY messages that aren't repeats of the
+# question, looking back up to REPLY_KEY_LOOKBACK events to find them
+REPLY_KEY_HISTORY = int(os.getenv("REPLY_KEY_HISTORY", "4"))
+REPLY_KEY_LOOKBACK = int(os.getenv("REPLY_KEY_LOOKBACK", "12"))
+
+_TIME_SENSITIVE = re.compile(
+    r"\b(time|clock|today|tonight|tomorrow|yesterday|now|morning|afternoon|evening|night|"
+    r"day|date|week|month|year|late|early|breakfast|lunch|dinner|medication|medicine|pills?)\b"
+)
+
+
+def is_time_sensitive(message: str) -> bool:
+    return bool(_TIME_SENSITIVE.search(normalize_message(message)))
+
+
+def history_digest(recent_events: list, current_msg: str, limit: int = REPLY_KEY_HISTORY) -> str:
+    """Digest of the newest `limit` distinct messages (events newest first) other than the current one.
+
+    Repeats of the current question are skipped rather than counted, so asking
+    the same thing again neither changes the key nor pushes older history out of it.
+    """
+    current = normalize_message(current_msg)
+    messages = []
+    for event in recent_events:
+        info = event.get("info", {})
+        raw_msg = info.get("raw") or info.get("notes") or info.get("original_message", "")
+        normalized = normalize_message(raw_msg) if raw_msg else ""
+        if normalized and normalized != current and normalized not in messages:
+            messages.append(normalized)
+            if len(messages) == limit:
+                break
+    return hashlib.sha256("\n".join(sorted(messages)).encode("utf-8")).hexdigest()
+
+
+def reply_key(user: str, current_msg: str, active_stress: bool, recent_events: list) -> str:
+    material = "\x1f".join([
+        user,
+        normalize_message(current_msg),
+        "stress" if active_stress else "normal",
+        history_digest(recent_events, current_msg),
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ReplyCache:
+    def __init__(self, max_entries: int, ttl: float, time_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.time_ttl = time_ttl
+        self._entries = OrderedDict()  # key -> {"text", "audio", "expires"}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expiry(self, message: str) -> float:
+        now = time.time()
+        if not is_time_sensitive(message):
+            return now + self.ttl
+        next_hour = (now // 3600 + 1) * 3600
+        return min(now + self.time_ttl, next_hour)
+
+    def get(self, key: str):
+        """{"text", "audio"} for a fresh entry (audio may be None), else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["expires"] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {"text": entry["text"], "audio": entry["audio"]}
+
+    def put(self, key: str, message: str, text: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {"text": text, "audio": None, "expires": self._expiry(message)}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def attach_audio(self, key: str, audio: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["audio"] = audio
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+reply_cache = None
+if REPLY_CACHE_ENABLED:
+    reply_cache = ReplyCache(REPLY_CACHE_SIZE, REPLY_CACHE_TTL, REPLY_CACHE_TIME_TTL)
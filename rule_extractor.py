@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Rule/lexicon extractor that answers short, unambiguous messages without the LLM.
+#   off    - always use the LLM
+#   on     - use the rules when confident, escalate to the LLM otherwise
+#   shadow - always use the LLM, but score the rules against it (see agreement_report)
+RULE_EXTRACTOR_MODE = os.getenv("RULE_EXTRACTOR_MODE", "off").lower()
+RULE_EXTRACTOR_THRESHOLD = float(os.getenv("RULE_EXTRACTOR_THRESHOLD", "0.7"))
+
+
+def _alternation(words) -> str:
+    # Longest first so "living room" wins over "room"
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+# (intent, pattern) - first match wins
+INTENT_PATTERNS = [
+    ("help", re.compile(r"\b(where (is|are|did|do)|can'?t find|cannot find|lost|looking for|misplaced|help me find)\b")),
+    ("reminder", re.compile(r"\b(remind me|don'?t let me forget|remember to|i need to|i have to|appointment)\b")),
+    ("information", re.compile(r"\b(what (time|day|date|year|month) is it|what'?s the (time|date|day)|who is|who'?s|when is|when'?s|what is|what'?s)\b")),
+    ("note", re.compile(r"\b(i put|i left|i placed|i moved|i gave|i took|i hid|is in the|are in the|is on the|are on the)\b")),
+    ("help", re.compile(r"\b(help|i need|can you)\b")),
+    ("conversation", re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening|night)|thank you|thanks|how are you)\b")),
+]
+
+ITEMS = [
+    "keys", "key", "glasses", "reading glasses", "sunglasses", "wallet", "purse", "handbag", "bag",
+    "phone", "cell phone", "remote", "tv remote", "medication", "medicine", "pills", "pill box",
+    "hearing aid", "hearing aids", "cane", "walker", "book", "coat", "jacket", "shoes", "slippers",
+    "hat", "watch", "ring", "dentures", "umbrella", "mail", "letter", "cup", "mug", "charger",
+    "photo", "photos", "album", "scarf", "gloves", "blanket", "money", "card", "checkbook",
+]
+
+RELATIONS = [
+    "daughter", "son", "wife", "husband", "grandson", "granddaughter", "grandchildren", "grandkids",
+    "doctor", "nurse", "neighbor", "neighbour", "friend", "sister", "brother", "mother", "father",
+    "mom", "dad", "caregiver", "niece", "nephew", "family",
+]
+
+LOCATIONS = [
+    "kitchen", "bedroom", "bathroom", "living room", "dining room", "garage", "garden", "yard", "car",
+    "drawer", "table", "kitchen table", "nightstand", "couch", "sofa", "desk", "closet", "shelf",
+    "counter", "fridge", "hallway", "porch", "basement", "attic", "store", "pharmacy", "hospital",
+    "church", "park", "home", "upstairs", "downstairs", "bed", "chair", "coat pocket", "pocket",
+    "cabinet", "door", "front door", "mailbox",
+]
+
+TIME_WORDS = [
+    "today", "tonight", "tomorrow", "yesterday", "this morning", "this afternoon", "this evening",
+    "morning", "afternoon", "evening", "night", "last night", "last week", "next week", "now",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "weekend",
+    "breakfast", "lunch", "dinner", "bedtime",
+]
+
+# word -> emotion label
+EMOTIONS = {
+    "worried": "anxious", "anxious": "anxious", "nervous": "anxious", "scared": "anxious",
+    "afraid": "anxious", "frightened": "anxious", "panicking": "anxious",
+    "sad": "sad", "lonely": "sad", "miss": "sad", "crying": "sad", "upset": "upset",
+    "confused": "confused", "forgot": "confused", "don't remember": "confused", "can't remember": "confused",
+    "happy": "happy", "glad": "happy", "great": "happy", "wonderful": "happy", "excited": "happy",
+    "angry": "frustrated", "frustrated": "frustrated", "annoyed": "frustrated", "mad": "frustrated",
+    "tired": "tired", "exhausted": "tired", "sleepy": "tired",
+}
+
+_ITEM_RE = re.compile(rf"\b(?:my |the |a |an )?({_alternation(ITEMS)})\b")
+_RELATION_RE = re.compile(rf"\b(?:my |the )?({_alternation(RELATIONS)})\b")
+_LOCATION_RE = re.compile(rf"\b({_alternation(LOCATIONS)})\b")
+_TIME_RE = re.compile(
+    rf"\b({_alternation(TIME_WORDS)}|\d{{1,2}}(:\d{{2}})? ?(am|pm|o'?clock))\b"
+)
+_EMOTION_RE = re.compile(rf"\b({_alternation(EMOTIONS)})\b")
+# Capitalized words not at the start of a sentence are probably names
+_NAME_RE = re.compile(r"(?<![.!?]\s)(?<!^)\b([A-Z][a-z]{1,})\b")
+_NOT_NAMES = {"I", "I'm", "I've", "OK", "Okay", "Mom", "Dad", "God", "TV"} | {
+    d.capitalize() for d in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+}
+# Connectives and hedges that make a message too complex to trust the rules with
+_COMPLEX_RE = re.compile(r"\b(because|although|though|but|unless|if|and then|which|whether|maybe|think)\b")
+
+
+def _unique(matches) -> list:
+    seen = []
+    for m in matches:
+        if m not in seen:
+            seen.append(m)
+    return seen
+
+
+def extract(message: str):
+    """Return (fields, confidence) for `message`; fields use the LLM schema."""
+    text = message.strip()
+    lower = text.lower().replace("’", "'")
+    fields = {}
+    confidence = 0.0
+
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(lower):
+            fields["intent"] = intent
+            confidence += 0.5
+            break
+
+    items = _unique(m.group(1) for m in _ITEM_RE.finditer(lower))
+    people = _unique(m.group(1) for m in _RELATION_RE.finditer(lower))
+    people += [n for n in _unique(m.group(1) for m in _NAME_RE.finditer(text)) if n not in _NOT_NAMES]
+    locations = _unique(m.group(1) for m in _LOCATION_RE.finditer(lower))
+    times = _unique(m.group(0) for m in _TIME_RE.finditer(lower))
+    emotions = _unique(EMOTIONS[m.group(1)] for m in _EMOTION_RE.finditer(lower))
+
+    if items:
+        fields["items"] = items
+    if people:
+        fields["people"] = people
+    if locations:
+        fields["location"] = locations[0] if len(locations) == 1 else locations
+    if times:
+        fields["time"] = times[0] if len(times) == 1 else times
+    if emotions:
+        fields["emotion"] = emotions[0]
+
+    if fields.get("intent") == "help" and items:
+        fields["concern"] = f"can't find {', '.join(items)}"
+    elif emotions and emotions[0] in ("anxious", "sad", "confused", "upset", "frustrated"):
+        fields["concern"] = f"feeling {emotions[0]}"
+    fields["notes"] = text
+
+    slots = sum(1 for k in ("items", "people", "location", "time", "emotion") if k in fields)
+    words = len(lower.split())
+    if slots:
+        confidence += 0.2
+    if words <= 12:
+        confidence += 0.2
+    elif words > 20:
+        confidence -= 0.3
+    if _COMPLEX_RE.search(lower):
+        confidence -= 0.3
+    # Every capitalized word we guessed as a name is a guess
+    if any(n not in _NOT_NAMES for n in people if n[:1].isupper()):
+        confidence -= 0.1
+
+    return fields, round(max(0.0, min(1.0, confidence)), 2)
+
+
+def _tokens(value) -> set:
+    if value is None:
+        return set()
+    if isinstance(value, (list, tuple)):
+        return set().union(*(_tokens(v) for v in value)) if value else set()
+    return set(re.findall(r"[a-z0-9']+", str(value).lower()))
+
+
+COMPARED_FIELDS = ("intent", "items", "people", "location", "time", "emotion")
+
+
+class AgreementStats:
+    """How often the rules agree with the LLM, per field (shadow mode)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.confident_samples = 0
+        self.agree = {f: 0 for f in COMPARED_FIELDS}
+        self.confident_agree = {f: 0 for f in COMPARED_FIELDS}
+
+    def record(self, rule_fields: dict, confidence: float, llm_fields: dict, threshold: float):
+        confident = confidence >= threshold
+        with self._lock:
+            self.samples += 1
+            if confident:
+                self.confident_samples += 1
+            for field in COMPARED_FIELDS:
+                ours, theirs = _tokens(rule_fields.get(field)), _tokens(llm_fields.get(field))
+                # Both empty, or any overlap, counts as agreement
+                agreed = (not ours and not theirs) or bool(ours & theirs)
+                if agreed:
+                    self.agree[field] += 1
+                    if confident:
+                        self.confident_agree[field] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            def rates(counts, n):
+                return {f: (counts[f] / n if n else None) for f in COMPARED_FIELDS}
+            return {
+                "samples": self.samples,
+                "confident_samples": self.confident_samples,
+                "agreement": rates(self.agree, self.samples),
+                "confident_agreement": rates(self.confident_agree, self.confident_samples),
+            }
+
+
+agreement = AgreementStats()
+
+
+def agreement_report() -> dict:
+    return agreement.report()
@@ -0,0 +1,4 @@
+import os
+
+# Tests stub every database call; never resolve or reach the configured cluster
+os.environ["MONGO_URI"] = "mongodb://localhost:27017"
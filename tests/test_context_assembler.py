@@ -0,0 +1,43 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import db
+from context_assembler import RollingSummaries
+
+
+def test_refresh_summarizes_a_long_backlog_oldest_page_first(monkeypatch):
+    start = datetime(2026, 1, 1)
+    stored = [{"info": {"raw": f"message {i}"}, "ts": start + timedelta(minutes=i)} for i in range(25)]
+    saved = []
+
+    def events_after(user, ts, limit):
+        return [e for e in stored if ts is None or e["ts"] > ts][:limit]
+
+    async def summarize(previous, events):
+        return previous + "".join(f"[{e['info']['raw']}]" for e in events)
+
+    monkeypatch.setattr(db, "events_after", events_after)
+    monkeypatch.setattr(db, "save_summary", lambda user, summary, through_ts: saved.append(through_ts))
+    summaries = RollingSummaries(refresh_every=5, max_events=10)
+    asyncio.run(summaries.refresh("alice", summarize))
+
+    assert summaries.get("alice") == "".join(f"[message {i}]" for i in range(25))
+    assert saved == [stored[9]["ts"], stored[19]["ts"], stored[24]["ts"]]
+
+
+def test_failed_page_keeps_the_watermark_of_the_pages_before_it(monkeypatch):
+    start = datetime(2026, 1, 1)
+    stored = [{"info": {"raw": f"message {i}"}, "ts": start + timedelta(minutes=i)} for i in range(15)]
+    saved = []
+
+    async def summarize(previous, events):
+        return None if previous else "first page"
+
+    monkeypatch.setattr(db, "events_after", lambda user, ts, limit: [e for e in stored if ts is None or e["ts"] > ts][:limit])
+    monkeypatch.setattr(db, "save_summary", lambda user, summary, through_ts: saved.append(through_ts))
+    summaries = RollingSummaries(refresh_every=5, max_events=10)
+    asyncio.run(summaries.refresh("alice", summarize))
+
+    assert summaries.get("alice") == "first page"
+    assert saved == [stored[9]["ts"]]
+    assert summaries.stats()["failures"] == 1
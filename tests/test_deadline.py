@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+import deadline
+from deadline import annotate, current_budget, degrade, request_budget, time_left, too_late, within
+
+
+def _app(seconds: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/turn")
+    async def turn():
+        with request_budget(seconds) as budget:
+            try:
+                await within(asyncio.sleep(1), time_left())
+                text = "full reply"
+            except asyncio.TimeoutError:
+                degrade("reply", "timeout")
+                text = "fallback"
+            if too_late(time_left()):
+                degrade("tts", "no_time")
+            return annotate(Response(text), budget)
+
+    return app
+
+
+def test_degraded_stages_are_reported_in_header():
+    response = TestClient(_app(0.05)).get("/turn")
+    assert response.text == "fallback"
+    assert response.headers["X-Degraded"] == "reply:timeout,tts:no_time"
+
+
+def test_no_budget_means_no_deadline_and_no_header():
+    response = TestClient(_app(0)).get("/turn")
+    assert response.text == "full reply"
+    assert "X-Degraded" not in response.headers
+
+
+def test_budget_is_scoped_to_the_request():
+    assert current_budget() is None and time_left() is None
+    with request_budget(5) as budget:
+        assert current_budget() is budget
+        assert 4 < time_left() <= 5
+        assert 2 < time_left(reserve=2) <= 3
+        assert not too_late(time_left())
+        assert too_late(time_left(reserve=5))
+    assert current_budget() is None
+
+
+def test_degrade_counts_even_without_a_budget():
+    before = deadline.degradations.value(stage="extract", reason="no_time")
+    degrade("extract", "no_time")
+    assert deadline.degradations.value(stage="extract", reason="no_time") == before + 1
+
+
+@pytest.fixture
+def listen(monkeypatch):
+    """main with every external call stubbed; returns (client, calls)."""
+    import main
+    import tts
+
+    calls = {"context": [], "generate_delay": 0, "tts_delay": 0}
+    history = [{"info": {"raw": f"earlier message {i}"}} for i in range(5)]
+
+    async def extract(message):
+        return {"raw": message, "intent": "note"}
+
+    async def generate(user, context_info):
+        calls["context"].append(context_info["recent_events"])
+        return "Your keys are on the hook."
+
+    async def stream(user, context_info):
+        calls["context"].append(context_info["recent_events"])
+        await asyncio.sleep(calls["generate_delay"])
+        yield "Your keys are on the hook."
+        yield "By the door."
+
+    async def synthesize(text):
+        await asyncio.sleep(calls["tts_delay"])
+        return b"MP3"
+
+    monkeypatch.setattr(main, "reply_cache", None)
+    monkeypatch.setattr(main, "item_index", None)
+    monkeypatch.setattr(main, "memory_index", None)
+    monkeypatch.setattr(main, "COMBINED_LLM_CALL", False)
+    monkeypatch.setattr(main, "_get_context_safe", lambda user, limit: history[:limit])
+    monkeypatch.setattr(main, "_record_event", lambda data, info: info)
+    monkeypatch.setattr(main, "extract_with_model_async", extract)
+    monkeypatch.setattr(main, "generate_assistance_async", generate)
+    monkeypatch.setattr(main, "generate_assistance_stream", stream)
+    monkeypatch.setattr(main, "cached_audio", lambda text: b"FALLBACK")
+    monkeypatch.setattr(tts, "synthesize_bytes", synthesize)
+    return main, TestClient(main.app), calls
+
+
+def test_small_budget_still_reads_context(listen, monkeypatch):
+    main, client, calls = listen
+    monkeypatch.setattr(main, "LISTEN_BUDGET", 3)
+    monkeypatch.setattr(main, "SENTENCE_PIPELINING", False)
+    monkeypatch.setattr(main, "speak_response", lambda text, on_error: asyncio.sleep(0, Response(b"MP3")))
+    response = client.post("/listen", json={"text": "Where are my keys?"})
+    # Extraction can't fit next to the reserves, but the cached reads still can
+    assert response.headers["X-Degraded"] == "extract:budget"
+    assert len(calls["context"][0]) == 1 + main.PROMPT_HISTORY
+
+
+def test_pipelined_first_sentence_timeout_is_in_header(listen, monkeypatch):
+    main, client, calls = listen
+    monkeypatch.setattr(main, "LISTEN_BUDGET", main.DEADLINE_TTS_RESERVE + 0.5)
+    monkeypatch.setattr(main, "SENTENCE_PIPELINING", True)
+    calls["generate_delay"] = 2
+    response = client.post("/listen", json={"text": "Where are my keys?"})
+    assert response.headers["X-Degraded"].split(",")[-1] == "generate:timeout"
+    assert response.content == b"MP3"  # the keyword fallback, synthesized
+
+
+def test_pipelined_tts_timeout_falls_back_to_cached_audio(listen, monkeypatch):
+    main, client, calls = listen
+    monkeypatch.setattr(main, "LISTEN_BUDGET", 1)
+    monkeypatch.setattr(main, "DEADLINE_REPLY_RESERVE", 0)
+    monkeypatch.setattr(main, "DEADLINE_TTS_RESERVE", 0.2)
+    monkeypatch.setattr(main, "SENTENCE_PIPELINING", True)
+    calls["tts_delay"] = 2
+    response = client.post("/listen", json={"text": "Where are my keys?"})
+    assert response.headers["X-Degraded"] == "tts:timeout"
+    assert response.content == b"FALLBACK"
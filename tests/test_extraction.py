@@ -0,0 +1,26 @@
+import asyncio
+
+import gemini_client
+from extraction_cache import ExtractionCache
+
+
+def test_listen_extraction_checks_the_cache_once(monkeypatch):
+    import main
+
+    cache = ExtractionCache(10, 600)
+    calls = []
+
+    async def llm(prompt, max_tokens=256, return_json=False):
+        calls.append(prompt)
+        return '{"intent": "find", "items": ["keys"]}'
+
+    monkeypatch.setattr(gemini_client, "extraction_cache", cache)
+    monkeypatch.setattr(gemini_client, "_call_llm_async", llm)
+
+    first = asyncio.run(main._extract_within("Where are my keys?", None))
+    assert first["items"] == ["keys"] and len(calls) == 1
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    second = asyncio.run(main._extract_within("where are my keys", None))
+    assert second["items"] == ["keys"] and len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,49 @@
+from json_extract import JSONObjectScanner, find_json_object
+
+
+def test_object_wrapped_in_prose():
+    text = 'Sure! Here is the JSON: {"intent": "find", "items": ["keys"]} Hope that helps.'
+    assert find_json_object(text) == {"intent": "find", "items": ["keys"]}
+
+
+def test_nested_objects_and_braces_inside_strings():
+    text = '{"a": {"b": {"c": 1}}, "note": "a } and a { in text", "q": "say \\"hi\\" }"}'
+    assert find_json_object(text) == {"a": {"b": {"c": 1}}, "note": "a } and a { in text", "q": 'say "hi" }'}
+
+
+def test_invalid_candidate_is_skipped():
+    assert find_json_object('{not json} then {"ok": true}') == {"ok": True}
+
+
+def test_no_object():
+    assert find_json_object("no json here") is None
+    assert find_json_object('{"unterminated": 1') is None
+
+
+def test_chunked_feed_returns_objects_as_they_complete():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('noise {"a": "x}') == []
+    assert scanner.feed('y", "b": {"c": 2}') == []
+    assert scanner.feed('} more {"d": 3}') == [{"a": "x}y", "b": {"c": 2}}, {"d": 3}]
+
+
+def test_stray_open_brace_in_prose_before_the_object():
+    text = 'I think {the user means their keys. Here you go: {"intent": "find", "items": ["keys"]}'
+    assert find_json_object(text) == {"intent": "find", "items": ["keys"]}
+
+
+def test_object_inside_a_candidate_that_fails_to_parse():
+    text = 'Answer {see below: {"ok": true} thanks}'
+    assert find_json_object(text) == {"ok": True}
+
+
+def test_stray_quote_after_a_stray_brace():
+    text = '{ she said "hi\n{"ok": 1}'
+    assert find_json_object(text) == {"ok": 1}
+
+
+def test_finish_rescans_an_unclosed_candidate_in_a_stream():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('oops { {"a": 1}') == []
+    assert scanner.feed(' {"b": 2}') == []
+    assert scanner.finish() == [{"a": 1}, {"b": 2}]
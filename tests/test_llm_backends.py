@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+import llm_backends
+from llm_backends import CircuitBreaker, SingleFlight
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_backends.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failures=3, cooldown=30)
+    breaker.record_failure()
+    breaker.record_success()  # resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state() == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state() == "open"
+    assert breaker.is_open() and not breaker.allow()
+
+
+def test_breaker_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker("test", failures=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state() == "half-open"
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state() == "closed" and breaker.allow()
+
+
+def test_breaker_failed_trial_reopens(clock):
+    breaker = CircuitBreaker("test", failures=3, cooldown=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()  # a single failed probe is enough
+    assert breaker.state() == "open" and not breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_singleflight_shares_one_call():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.ado("k", fetch) for _ in range(3)))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["answer"] * 3
+    assert calls == 1 and flight.shared == 2
+    assert not flight._tasks and not flight._waiters
+
+
+def test_singleflight_call_survives_one_waiter_being_cancelled():
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.ado("k", lambda: asyncio.sleep(0.05, "answer")))
+        second = asyncio.ensure_future(flight.ado("k", lambda: asyncio.sleep(0.05, "other")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "answer"
+        assert first.cancelled()
+        return flight
+
+    assert asyncio.run(main()).abandoned == 0
+
+
+def test_singleflight_cancels_call_once_every_waiter_is_cancelled():
+    async def main():
+        flight = SingleFlight()
+        stopped = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        waiters = [asyncio.ensure_future(flight.ado("k", slow)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(stopped.wait(), 1)
+        return flight
+
+    flight = asyncio.run(main())
+    assert flight.abandoned == 1
+    assert not flight._tasks and not flight._waiters
@@ -0,0 +1,75 @@
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from reply_cache import ReplyCache, reply_key
+
+
+def _events(*messages):
+    return [{"info": {"raw": message}} for message in messages]
+
+
+def test_key_is_a_fixed_sha256_digest():
+    # Not Python's per-process hash(): keys must match across restarts and workers
+    key = reply_key("alice", "Where are my keys?", False, _events("I had tea", "where are my keys"))
+    assert key == "a3a2dc56e02181bac2e6574e739690786aa8c9340188dc3d90fef499cbdc5b11"
+
+
+def test_key_ignores_history_order_repeats_and_message_formatting():
+    key = reply_key("alice", "Where are my keys?", False, _events("I had tea", "Went for a walk"))
+    assert reply_key("alice", "where are my keys", False, _events("Went for a walk", "I had tea")) == key
+    assert reply_key("alice", "Where are my keys?", False,
+                     _events("where are my keys?", "I had tea", "Went for a walk", "I had tea")) == key
+
+
+def test_key_changes_with_user_mode_and_history():
+    key = reply_key("alice", "Where are my keys?", False, _events("I had tea"))
+    assert reply_key("bob", "Where are my keys?", False, _events("I had tea")) != key
+    assert reply_key("alice", "Where are my keys?", True, _events("I had tea")) != key
+    assert reply_key("alice", "Where are my keys?", False, _events("I had coffee")) != key
+
+
+def test_repeats_dont_push_older_history_out_of_the_key():
+    history = _events("I had tea", "Went for a walk", "Called Sam", "Fed the cat", "Watered plants")
+    key = reply_key("alice", "Where are my keys?", False, history)
+    for _ in range(3):
+        history = _events("Where are my keys?") + history
+        assert reply_key("alice", "Where are my keys?", False, history) == key
+
+
+def test_listen_serves_a_repeated_question_from_the_cache(monkeypatch):
+    import main
+
+    stored = _events("I had tea", "Went for a walk", "Called Sam", "Fed the cat", "Watered plants")
+    generated = []
+
+    def record_event(data, extracted_info):
+        stored.insert(0, {"info": dict(extracted_info, raw=data.text)})  # saved before the next turn
+        return extracted_info
+
+    async def extract(message):
+        return {"raw": message, "intent": "find", "items": ["keys"]}
+
+    async def generate(user, context_info):
+        generated.append(context_info["current_message"])
+        return "Your keys are on the hook by the door."
+
+    async def speak(text, on_error):
+        return Response(content=b"MP3", media_type="audio/mpeg")
+
+    monkeypatch.setattr(main, "reply_cache", ReplyCache(10, 600, 60))
+    monkeypatch.setattr(main, "item_index", None)
+    monkeypatch.setattr(main, "memory_index", None)
+    monkeypatch.setattr(main, "COMBINED_LLM_CALL", False)
+    monkeypatch.setattr(main, "SENTENCE_PIPELINING", False)
+    monkeypatch.setattr(main, "_get_context_safe", lambda user, limit: stored[:limit])
+    monkeypatch.setattr(main, "_record_event", record_event)
+    monkeypatch.setattr(main, "extract_with_model_async", extract)
+    monkeypatch.setattr(main, "generate_assistance_async", generate)
+    monkeypatch.setattr(main, "speak_response", speak)
+
+    client = TestClient(main.app)
+    for _ in range(4):
+        response = client.post("/listen", json={"text": "Where are my keys?"})
+        assert response.status_code == 200 and response.content == b"MP3"
+    assert generated == ["Where are my keys?"]
+    assert main.reply_cache.stats()["hits"] == 3
@@ -0,0 +1,222 @@
+import os
+import asyncio
+import httpx
+from fastapi.responses import Response, StreamingResponse
+from dotenv import load_dotenv
+from tts_cache import audio_cache, cache_key
+from http_client import get_async_client
+from metrics import audio_bytes, errors, span
+from logger import log
+
+load_dotenv()
+
+# ElevenLabs configuration shared by every endpoint that talks back to the iPhone
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+VOICE_ID = "TxGEqnHWrfWFTfGW9XjX"
+MODEL_ID = "eleven_multilingual_v2"
+VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.5}
+
+# Streaming mode: forward MP3 chunks as ElevenLabs produces them instead of
+# buffering the whole clip. The patient hears the first words much sooner.
+ELEVENLABS_STREAMING = os.getenv("ELEVENLABS_STREAMING", "false").lower() == "true"
+# 0-4, higher trades a little quality for lower time-to-first-audio (stream endpoint only)
+ELEVENLABS_STREAM_LATENCY = os.getenv("ELEVENLABS_STREAM_LATENCY", "2")
+# Longest streamed clip that is copied into the TTS cache
+TTS_CACHE_STREAM_MAX_BYTES = int(os.getenv("TTS_CACHE_STREAM_MAX_BYTES", str(512 * 1024)))
+
+
+def _headers() -> dict:
+    return {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+
+
+def _payload(text: str) -> dict:
+    return {
+        "text": text,
+        "model_id": MODEL_ID,
+        "voice_settings": VOICE_SETTINGS
+    }
+
+
+async def synthesize(text: str) -> httpx.Response:
+    """Buffered TTS - returns the full ElevenLabs response."""
+    url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{VOICE_ID}"
+    return await get_async_client("elevenlabs").post(url, json=_payload(text), headers=_headers())
+
+
+async def open_stream(text: str):
+    """Start a streaming TTS request.
+
+    Returns the response with the body still unread; the caller must
+    `aclose()` it so the pooled connection is released.
+    """
+    url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{VOICE_ID}/stream"
+    client = get_async_client("elevenlabs")
+    request = client.build_request(
+        "POST",
+        url,
+        params={"optimize_streaming_latency": ELEVENLABS_STREAM_LATENCY},
+        json=_payload(text),
+        headers=_headers(),
+    )
+    return await client.send(request, stream=True)
+
+
+def audio_key(text: str) -> str:
+    return cache_key(text, VOICE_ID, MODEL_ID, VOICE_SETTINGS)
+
+
+def cached_audio(text: str):
+    """Return cached MP3 bytes for `text`, or None."""
+    if audio_cache is None:
+        return None
+    return audio_cache.get(audio_key(text))
+
+
+def has_cached_audio(text: str) -> bool:
+    """True when `text` would be served from the TTS cache (without counting a lookup)."""
+    return audio_cache is not None and audio_key(text) in audio_cache
+
+
+async def synthesize_bytes(text: str):
+    """Return MP3 bytes for `text` from cache or ElevenLabs; None on failure."""
+    audio = cached_audio(text)
+    if audio is not None:
+        return audio
+    with span("tts.synthesize"):
+        response = await synthesize(text)
+    if response.status_code != 200:
+        log.error("tts", f"❌ ElevenLabs Error (Status {response.status_code}): {response.text}")
+        errors.inc(stage="tts")
+        return None
+    if audio_cache is not None:
+        audio_cache.put(audio_key(text), response.content)
+    return response.content
+
+
+async def prewarm(phrases):
+    """Synthesize fixed phrases ahead of time so their first use is a cache hit."""
+    if audio_cache is None:
+        return
+    warmed = 0
+    for phrase in phrases:
+        if audio_key(phrase) in audio_cache:
+            continue
+        try:
+            if await synthesize_bytes(phrase) is not None:
+                warmed += 1
+        except Exception as e:
+            log.warning("tts", f"⚠️  TTS pre-warm failed for {phrase!r}: {e}")
+    log.info("tts", f"🔥 TTS cache pre-warmed {warmed} phrase(s)")
+
+
+async def speak_response(text: str, on_error):
+    """Synthesize `text` and return the HTTP response for the iPhone.
+
+    `on_error(status_code, error_text)` builds the endpoint-specific error reply.
+    Cached audio is served without calling ElevenLabs. In streaming mode audio
+    chunks are forwarded as they arrive; a complete stream is stored in the cache.
+    """
+    audio = cached_audio(text)
+    if audio is not None:
+        log.info("tts", "⚡ Audio served from TTS cache")
+        audio_bytes.inc(len(audio), source="tts_cache")
+        return Response(content=audio, media_type="audio/mpeg")
+
+    if ELEVENLABS_STREAMING:
+        with span("tts.open_stream"):
+            response = await open_stream(text)
+        if response.status_code != 200:
+            await response.aread()
+            error_text = response.text
+            await response.aclose()
+            errors.inc(stage="tts")
+            return on_error(response.status_code, error_text)
+
+        async def audio_chunks():
+            # Tee the stream into the cache, but give up on clips too long to be worth holding
+            parts = [] if audio_cache is not None else None
+            teed = 0
+            try:
+                async for chunk in response.aiter_bytes():
+                    audio_bytes.inc(len(chunk), source="stream")
+                    if parts is not None:
+                        parts.append(chunk)
+                        teed += len(chunk)
+                        if teed > TTS_CACHE_STREAM_MAX_BYTES:
+                            parts = None
+                    yield chunk
+                if parts is not None:
+                    audio_cache.put(audio_key(text), b"".join(parts))
+            finally:
+                await response.aclose()
+
+        log.info("tts", "✅ Audio stream opened! Streaming to iPhone...")
+        return StreamingResponse(audio_chunks(), media_type="audio/mpeg")
+
+    with span("tts.synthesize"):
+        response = await synthesize(text)
+    if response.status_code != 200:
+        errors.inc(stage="tts")
+        return on_error(response.status_code, response.text)
+
+    if audio_cache is not None:
+        audio_cache.put(audio_key(text), response.content)
+    log.info("tts", "✅ Audio received! Sending to iPhone...")
+    audio_bytes.inc(len(response.content), source="elevenlabs")
+    return Response(content=response.content, media_type="audio/mpeg")
+
+
+async def _pipelined_audio(sentences, time_left=None, on_timeout=None):
+    """Start TTS for each sentence as soon as it exists and yield the audio in order.
+
+    Synthesis of sentence N overlaps generation of sentence N+1, so speech
+    starts after the first sentence instead of after the whole reply.
+    `time_left()` bounds the wait for each sentence's audio (None = unbounded);
+    when it runs out the stream ends with whatever `on_timeout(spoken)` returns.
+    """
+    pending = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for sentence in sentences:
+                log.info("reply", f"💬 SENTENCE: {sentence}")
+                await pending.put(asyncio.ensure_future(synthesize_bytes(sentence)))
+        finally:
+            await pending.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    spoken = 0
+    try:
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            timeout = time_left() if time_left is not None else None
+            try:
+                audio = await (task if timeout is None else asyncio.wait_for(task, timeout))
+            except asyncio.TimeoutError:
+                audio = on_timeout(spoken) if on_timeout is not None else None
+                if audio:
+                    yield audio
+                return
+            if audio:
+                spoken += 1
+                audio_bytes.inc(len(audio), source="pipelined")
+                yield audio
+        await producer
+    finally:
+        producer.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
+
+
+def speak_sentences_response(sentences, time_left=None, on_timeout=None) -> StreamingResponse:
+    """Stream MP3 audio for an async iterator of sentences (see `_pipelined_audio`)."""
+    return StreamingResponse(_pipelined_audio(sentences, time_left, on_timeout), media_type="audio/mpeg")